@@ -0,0 +1,41 @@
+# Production server configuration:
+#
+#   gunicorn -c gunicorn.conf.py 'src.main:create_app()'
+#
+# The app is built once in the master (preload_app) and workers are forked
+# from it, so imported code and the catalog of compiled objects are shared
+# copy-on-write between workers. Database connections are never shared: the
+# app disposes inherited engine pools in each child after fork.
+#
+# Streaming endpoints (Server-Sent Events) keep connections open for minutes,
+# so workers are gevent by default and each one holds thousands of them.
+# With GUNICORN_WORKER_CLASS=sync (and one thread) a single open stream would
+# take a whole worker, so streams are switched off and answered with 503.
+import gc
+import os
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+if worker_class == 'gevent':
+    # Patch before the app (and ssl, via stripe) is imported in the master
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+if worker_class == 'sync' and threads == 1:
+    os.environ['STREAMS_ENABLED'] = 'False'  # Read by create_app()
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 2000))  # gevent: open connections per worker
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+max_requests = 5000
+max_requests_jitter = 500
+
+
+def when_ready(server):
+    # Load lazily imported heavy modules once in the master so every worker shares them
+    import stripe  # noqa: F401
+
+    # Move everything allocated so far out of the GC's reach; otherwise the
+    # first collection in each worker touches (and copies) every shared page
+    gc.freeze()
@@ -0,0 +1,215 @@
+from datetime import timedelta
+from src.database import db
+from src.models.analytics import SalesDailyRollup, OrderDailyRollup
+from src.models.archive import ArchivedOrder
+from src.models.order import Order, OrderItem
+from src.models.product import Product
+from src.models.user import User
+
+# Incremental maintenance of the daily sales rollups.
+#
+# Every order contributes to exactly one (day, status, payment_status) bucket.
+# record_order() adds it when the order is created, record_transition() moves
+# it between buckets when the status or payment status changes. Both run in
+# the caller's transaction, so the rollups commit (or roll back) together with
+# the order itself. backfill() rebuilds a date range from scratch, from the
+# orders table and the archive (src/archive.py).
+#
+# The same two hooks keep each customer's lifetime aggregates on the users
+# row (order count, spend on paid orders, last order date) for the admin
+# customer directory.
+
+
+def _insert(table):
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def _upsert(model, key, deltas):
+    """Add `deltas` to the counters of the rollup row identified by `key`"""
+    table = model.__table__
+    stmt = _insert(table).values(**key, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(model.KEY_COLUMNS),
+        set_={name: table.c[name] + stmt.excluded[name] for name in deltas}
+    )
+    db.session.execute(stmt)
+
+
+def _apply(order, status, payment_status, sign):
+    day = order.created_at.date()
+    items = list(order.items)
+
+    categories = {}
+    product_ids = {item.product_id for item in items}
+    if product_ids:
+        categories = dict(
+            db.session.query(Product.id, Product.category).filter(Product.id.in_(product_ids))
+        )
+
+    for item in items:
+        _upsert(SalesDailyRollup, {
+            'day': day,
+            'product_id': item.product_id,
+            'variant_id': item.variant_id or 0,
+            'status': status,
+            'payment_status': payment_status,
+            'category': categories.get(item.product_id)
+        }, {
+            'line_count': sign,
+            'units': sign * item.quantity,
+            'revenue': sign * item.price_at_purchase * item.quantity
+        })
+
+    _upsert(OrderDailyRollup, {
+        'day': day,
+        'status': status,
+        'payment_status': payment_status
+    }, {
+        'order_count': sign,
+        'subtotal': sign * (order.subtotal or 0),
+        'tax': sign * (order.tax or 0),
+        'shipping': sign * (order.shipping or 0),
+        'total': sign * (order.total or 0)
+    })
+
+
+def _add_customer_totals(user_id, **values):
+    # Relative UPDATE: concurrent orders of one customer don't overwrite each other
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(**values).execution_options(synchronize_session=False)
+    )
+
+
+def record_order(order):
+    """Add a newly created (and flushed) order to the rollups"""
+    _apply(order, order.status or 'pending', order.payment_status or 'pending', 1)
+    if order.user_id:
+        _add_customer_totals(order.user_id, order_count=User.order_count + 1,
+                             total_spent=User.total_spent + (order.total if order.payment_status == 'paid' else 0),
+                             last_order_at=order.created_at)
+
+
+def record_transition(order, old_status, old_payment_status):
+    """Move an order between rollup buckets after a status/payment change"""
+    old_status = old_status or 'pending'
+    old_payment_status = old_payment_status or 'pending'
+    new_status = order.status or 'pending'
+    new_payment_status = order.payment_status or 'pending'
+
+    if (old_status, old_payment_status) == (new_status, new_payment_status):
+        return
+
+    _apply(order, old_status, old_payment_status, -1)
+    _apply(order, new_status, new_payment_status, 1)
+
+    if order.user_id and (old_payment_status == 'paid') != (new_payment_status == 'paid'):
+        sign = 1 if new_payment_status == 'paid' else -1
+        _add_customer_totals(order.user_id, total_spent=User.total_spent + sign * (order.total or 0))
+
+
+def backfill(start=None, end=None):
+    """Rebuild the rollups for orders placed between `start` and `end` (inclusive dates)"""
+    sales = SalesDailyRollup.__table__
+    daily = OrderDailyRollup.__table__
+    order_day = db.func.date(Order.created_at)
+
+    order_filters = []
+    sales_filters = []
+    daily_filters = []
+    if start:
+        order_filters.append(Order.created_at >= start)
+        sales_filters.append(sales.c.day >= start)
+        daily_filters.append(daily.c.day >= start)
+    if end:
+        order_filters.append(Order.created_at < end + timedelta(days=1))
+        sales_filters.append(sales.c.day <= end)
+        daily_filters.append(daily.c.day <= end)
+
+    db.session.execute(sales.delete().where(*sales_filters))
+    db.session.execute(daily.delete().where(*daily_filters))
+
+    status = db.func.coalesce(Order.status, 'pending')
+    payment_status = db.func.coalesce(Order.payment_status, 'pending')
+    variant_id = db.func.coalesce(OrderItem.variant_id, 0)
+
+    sales_select = db.select(
+        order_day, OrderItem.product_id, variant_id, Product.category, status, payment_status,
+        db.func.count(OrderItem.id),
+        db.func.sum(OrderItem.quantity),
+        db.func.sum(OrderItem.price_at_purchase * OrderItem.quantity)
+    ).select_from(OrderItem).join(Order, OrderItem.order_id == Order.id).outerjoin(
+        Product, OrderItem.product_id == Product.id
+    ).where(*order_filters).group_by(
+        order_day, OrderItem.product_id, variant_id, Product.category, status, payment_status
+    )
+    db.session.execute(sales.insert().from_select(
+        ['day', 'product_id', 'variant_id', 'category', 'status', 'payment_status',
+         'line_count', 'units', 'revenue'],
+        sales_select
+    ))
+
+    daily_select = db.select(
+        order_day, status, payment_status,
+        db.func.count(Order.id),
+        db.func.sum(Order.subtotal),
+        db.func.sum(db.func.coalesce(Order.tax, 0)),
+        db.func.sum(db.func.coalesce(Order.shipping, 0)),
+        db.func.sum(Order.total)
+    ).where(*order_filters).group_by(order_day, status, payment_status)
+    db.session.execute(daily.insert().from_select(
+        ['day', 'status', 'payment_status', 'order_count', 'subtotal', 'tax', 'shipping', 'total'],
+        daily_select
+    ))
+
+    _backfill_archived(start, end)
+    db.session.commit()
+
+
+def _backfill_archived(start, end):
+    """Add the archived orders placed between `start` and `end` to the freshly rebuilt rollups"""
+    query = db.session.query(ArchivedOrder.created_at, ArchivedOrder.data).filter(ArchivedOrder.created_at.isnot(None))
+    if start:
+        query = query.filter(ArchivedOrder.created_at >= start)
+    if end:
+        query = query.filter(ArchivedOrder.created_at < end + timedelta(days=1))
+
+    # Summed in memory per bucket: archived orders are immutable
+    sales = {}
+    daily = {}
+    for created_at, order in query.execution_options(yield_per=1000):
+        status = order.get('status') or 'pending'
+        payment_status = order.get('payment_status') or 'pending'
+        day = created_at.date()
+
+        for item in order.get('items', []):
+            key = (day, item['product_id'], item.get('variant_id') or 0, status, payment_status)
+            line = sales.setdefault(key, [0, 0, 0.0])
+            line[0] += 1
+            line[1] += item['quantity']
+            line[2] += item['price_at_purchase'] * item['quantity']
+
+        bucket = daily.setdefault((day, status, payment_status), [0, 0.0, 0.0, 0.0, 0.0])
+        bucket[0] += 1
+        for i, name in enumerate(('subtotal', 'tax', 'shipping', 'total'), 1):
+            bucket[i] += order.get(name) or 0
+
+    categories = dict(db.session.query(Product.id, Product.category).filter(
+        Product.id.in_({key[1] for key in sales}))) if sales else {}
+    for (day, product_id, variant_id, status, payment_status), (lines, units, revenue) in sales.items():
+        _upsert(SalesDailyRollup, {
+            'day': day,
+            'product_id': product_id,
+            'variant_id': variant_id,
+            'status': status,
+            'payment_status': payment_status,
+            'category': categories.get(product_id)
+        }, {'line_count': lines, 'units': units, 'revenue': revenue})
+
+    for (day, status, payment_status), (count, subtotal, tax, shipping, total) in daily.items():
+        _upsert(OrderDailyRollup, {'day': day, 'status': status, 'payment_status': payment_status}, {
+            'order_count': count, 'subtotal': subtotal, 'tax': tax, 'shipping': shipping, 'total': total
+        })
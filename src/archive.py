@@ -0,0 +1,133 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import exists, func
+from sqlalchemy.orm import Session, selectinload
+from src.database import db
+from src.models.archive import ArchivedOrder
+from src.models.order import Order, OrderItem, CustomOrder
+
+# Hot/cold order storage.
+#
+# `flask orders-archive` moves orders in a terminal status (delivered,
+# cancelled) that are older than ORDER_ARCHIVE_DAYS out of orders/order_items
+# into archived_orders in a separate database (the 'archive' bind,
+# ARCHIVE_DATABASE_URL), so the hot tables and their indexes only hold the
+# working set. Each archived row keeps the order's full to_dict() output
+# (items included) plus the columns used for lookups.
+#
+# Each batch is removed from the primary first, in a transaction that stays
+# open until the archive copies of exactly the removed orders are
+# committed. An order is only removed if it is still archivable and
+# unchanged (same version) since it was read, so the archive never holds a
+# stale copy or an order that is also still hot. If the process dies
+# between the two commits, the primary rolls back and the next run replaces
+# the archive copies. Orders referenced by a custom order request stay hot.
+# Lookups (find_order) check the hot table first and fall back to the
+# archive.
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+
+
+def _archivable(cutoff):
+    return db.and_(
+        Order.status.in_(ARCHIVABLE_STATUSES),
+        Order.created_at < cutoff,
+        ~exists().where(CustomOrder.order_id == Order.id)
+    )
+
+
+def archive_orders(days, batch_size=500, limit=None):
+    """Move archivable orders older than `days` to the archive; returns the number moved"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = 0
+
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        orders = Order.query.options(selectinload(Order.items)).filter(
+            _archivable(cutoff)
+        ).order_by(Order.id).limit(size).all()
+        if not orders:
+            break
+
+        copies = {order.id: ArchivedOrder(
+            id=order.id,
+            order_number=order.order_number,
+            user_id=order.user_id,
+            status=order.status,
+            payment_status=order.payment_status,
+            total=order.total,
+            data=order.to_dict(),
+            created_at=order.created_at,
+            updated_at=order.updated_at
+        ) for order in orders}
+        unchanged = db.and_(
+            db.tuple_(Order.id, Order.version).in_([(order.id, order.version) for order in orders]),
+            _archivable(cutoff)
+        )
+        db.session.expunge_all()
+
+        # 1. Remove from the hot tables the orders that are still archivable and
+        # unchanged. The rows are locked (PostgreSQL) or the database is (SQLite,
+        # from the first DELETE) until the commit below, so both DELETEs match
+        # the same orders.
+        db.session.query(Order.id).filter(unchanged).with_for_update().all()
+        OrderItem.query.filter(
+            OrderItem.order_id.in_(db.session.query(Order.id).filter(unchanged))
+        ).delete(synchronize_session=False)
+        removed = db.session.execute(
+            db.delete(Order).where(unchanged).returning(Order.id).execution_options(synchronize_session=False)
+        ).scalars().all()
+
+        # 2. Archive exactly those (replacing copies left by an interrupted run),
+        # then let the primary commit. Copies are matched on id and order number,
+        # so a different order that once had the same id is never replaced; its
+        # id clash fails the batch instead.
+        try:
+            with Session(bind=db.engines['archive']) as archive:
+                archive.execute(db.delete(ArchivedOrder).where(db.tuple_(ArchivedOrder.id, ArchivedOrder.order_number).in_(
+                    [(order_id, copies[order_id].order_number) for order_id in removed]
+                )))
+                archive.add_all(copies[order_id] for order_id in removed)
+                archive.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        db.session.commit()
+
+        moved += len(removed)
+
+    return moved
+
+
+def find_order(order_id=None, order_number=None):
+    """The live Order, else its ArchivedOrder, else None"""
+    if order_id is not None:
+        order = Order.query.get(order_id)
+        return order or ArchivedOrder.query.get(order_id)
+
+    order = Order.query.filter_by(order_number=order_number).first()
+    return order or ArchivedOrder.query.filter_by(order_number=order_number).first()
+
+
+def archived_totals():
+    """Order count and paid revenue held in the archive"""
+    count, revenue = db.session.query(
+        func.count(ArchivedOrder.id),
+        func.sum(db.case((ArchivedOrder.payment_status == 'paid', ArchivedOrder.total), else_=0))
+    ).one()
+    return count, float(revenue or 0)
+
+
+def export_archive(output, start=None, end=None):
+    """Write archived orders (created between start and end) to `output` as JSON lines"""
+    query = ArchivedOrder.query.order_by(ArchivedOrder.id)
+    if start:
+        query = query.filter(ArchivedOrder.created_at >= start)
+    if end:
+        query = query.filter(ArchivedOrder.created_at < end)
+
+    count = 0
+    for archived in query.yield_per(1000):
+        output.write(json.dumps(archived.to_dict()) + '\n')
+        count += 1
+    return count
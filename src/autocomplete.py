@@ -0,0 +1,169 @@
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+from src.models.analytics import SalesDailyRollup
+from src.models.product import Product
+
+# Search-box autocomplete.
+#
+# Each worker process keeps a sorted array of (term, product_id) pairs for
+# the active catalog: the product name and every word suffix of it ("black
+# tee" and "tee" for "Classic Black Tee"), the category and each variant SKU,
+# lowercased. A prefix lookup is a bisect into that array followed by a short
+# scan, and matches are ranked by units sold over the last POPULARITY_DAYS
+# (from the sales rollups), so answering a keystroke never touches the
+# database.
+#
+# The index is loaded on the first lookup and then kept current from the
+# EventBus: a product.changed event re-indexes just that product, and the
+# whole index (popularity included) is rebuilt at most every
+# AUTOCOMPLETE_REFRESH_SECONDS when events arrive. Every change swaps in a
+# new immutable IndexState, so lookups read it without locking; each state
+# also memoizes its answers, since typeahead traffic repeats the same short
+# prefixes.
+
+POPULARITY_DAYS = 90
+MAX_LIMIT = 20
+MAX_SCAN = 5000  # Matching terms examined for a (very short) prefix
+MAX_CACHED = 4096  # Memoized answers per index state
+
+
+def _normalize(text):
+    return ' '.join(str(text).lower().split())
+
+
+def _terms(product):
+    name = _normalize(product.name)
+    words = name.split(' ')
+    terms = {' '.join(words[i:]) for i in range(len(words))}
+    terms.add(_normalize(product.category))
+    terms.update(_normalize(v.sku) for v in product.variants if v.sku)
+    terms.discard('')
+    return sorted((term, product.id) for term in terms)
+
+
+def _entry(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'category': product.category,
+        'base_price': product.base_price,
+        'image_url': product.image_url
+    }
+
+
+class IndexState:
+    """One immutable version of the index"""
+
+    def __init__(self, products, popularity, terms=None):
+        self.products = products  # product_id -> (entry, terms)
+        self.popularity = popularity  # product_id -> units sold
+        self.terms = terms if terms is not None else sorted(t for _, ts in products.values() for t in ts)
+        # Ranking key per product: best sellers first, then by name
+        self.rank = {pid: (-popularity.get(pid, 0), entry['name']) for pid, (entry, _) in products.items()}
+        self.cache = {}
+
+    def search(self, prefix, limit):
+        key = (prefix, limit)
+        result = self.cache.get(key)
+        if result is None:
+            terms = self.terms
+            matches = set()
+            i = bisect_left(terms, (prefix,))
+            end = min(len(terms), i + MAX_SCAN)
+            while i < end and terms[i][0].startswith(prefix):
+                matches.add(terms[i][1])
+                i += 1
+            result = [self.products[pid][0] for pid in heapq.nsmallest(limit, matches, key=self.rank.__getitem__)]
+            if len(self.cache) >= MAX_CACHED:
+                self.cache.clear()
+            self.cache[key] = result
+        return result
+
+
+class ProductIndex:
+    """Per-process prefix index over the active catalog"""
+
+    def __init__(self, bus, refresh_seconds):
+        self.bus = bus
+        self.refresh_seconds = refresh_seconds
+        self._state = IndexState({}, {})
+        self._loaded_at = 0
+        self._lock = threading.Lock()  # Serializes writers
+        self._load_lock = threading.Lock()
+        self._pid = None
+
+    def search(self, prefix, limit=8):
+        """Up to `limit` active products with a term starting with `prefix`, most popular first"""
+        self._ensure_loaded()
+        prefix = _normalize(prefix)
+        if not prefix or limit < 1:
+            return []
+        return self._state.search(prefix, limit)
+
+    def _ensure_loaded(self):
+        if self._pid == os.getpid():
+            return
+        with self._load_lock:
+            if self._pid != os.getpid():
+                self.bus.add_listener(self.apply, setup=self._load)
+                self._pid = os.getpid()
+
+    def _load(self):
+        cutoff = date.today() - timedelta(days=POPULARITY_DAYS)
+        with Session(bind=self.bus.engine) as session:
+            catalog = session.query(Product).options(selectinload(Product.variants)).filter(
+                Product.is_active.is_(True)).all()
+            popularity = dict(session.query(SalesDailyRollup.product_id, func.sum(SalesDailyRollup.units)).filter(
+                SalesDailyRollup.day >= cutoff,
+                SalesDailyRollup.status != 'cancelled'
+            ).group_by(SalesDailyRollup.product_id).all())
+
+            products = {p.id: (_entry(p), _terms(p)) for p in catalog}
+
+        state = IndexState(products, {pid: int(units or 0) for pid, units in popularity.items()})
+        with self._lock:
+            self._state = state
+            self._loaded_at = time.monotonic()
+
+    def _reindex(self, product_id):
+        with Session(bind=self.bus.engine) as session:
+            product = session.query(Product).options(selectinload(Product.variants)).filter(
+                Product.id == product_id, Product.is_active.is_(True)).first()
+            indexed = (_entry(product), _terms(product)) if product else None
+
+        with self._lock:
+            terms = list(self._state.terms)
+            products = dict(self._state.products)
+            old = products.pop(product_id, None)
+            for term in old[1] if old else ():
+                i = bisect_left(terms, term)
+                if i < len(terms) and terms[i] == term:
+                    del terms[i]
+            if indexed:
+                products[product_id] = indexed
+                for term in indexed[1]:
+                    insort(terms, term)
+            self._state = IndexState(products, self._state.popularity, terms)
+
+    def apply(self, event):
+        """EventBus listener: keep the index in step with the catalog"""
+        if time.monotonic() - self._loaded_at > self.refresh_seconds:
+            self._load()
+        elif event['kind'] == 'product.changed':
+            self._reindex(event['payload']['product_id'])
+
+
+def get_product_index():
+    return current_app.extensions['autocomplete']
+
+
+def init_autocomplete(app):
+    """Create the process's product index (loaded on the first lookup)"""
+    app.extensions['autocomplete'] = ProductIndex(app.extensions['events'], app.config['AUTOCOMPLETE_REFRESH_SECONDS'])
@@ -0,0 +1,225 @@
+from datetime import datetime
+import click
+from src.database import db
+
+
+def register_cli(app):
+    """Register maintenance commands (run with `flask --app src.main <command>`)"""
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        """Create missing tables/columns/indexes and run pending data migrations"""
+        from src.migrations import upgrade_database
+
+        upgrade_database()
+        click.echo('✅ Database is up to date')
+
+    @app.cli.command('sync-replicas')
+    def sync_replicas():
+        """Copy the primary SQLite database onto each configured replica (local testing)"""
+        import sqlite3
+        from src.database import REPLICA_PREFIX
+
+        primary = db.engines[None]
+        for key, engine in db.engines.items():
+            if not key or not key.startswith(REPLICA_PREFIX):
+                continue
+            if primary.dialect.name != 'sqlite' or engine.dialect.name != 'sqlite':
+                raise click.ClickException('sync-replicas only supports SQLite; use real replication elsewhere')
+
+            engine.dispose()
+            source = sqlite3.connect(primary.url.database)
+            target = sqlite3.connect(engine.url.database)
+            with target:
+                source.backup(target)
+            source.close()
+            target.close()
+            click.echo(f'✅ Copied primary to {key} ({engine.url.database})')
+
+    @app.cli.command('seed')
+    def seed():
+        """Seed the product catalog if it is empty"""
+        from src.models.product import Product
+        from src.seed import seed_products
+
+        if Product.query.count() == 0:
+            seed_products()
+        else:
+            click.echo('Products already exist, skipping')
+
+        from src.snapshots import rebuild_catalog_snapshots
+        rebuild_catalog_snapshots()
+
+    @app.cli.command('catalog-snapshot')
+    def catalog_snapshot():
+        """Rebuild the prebuilt product listings (after catalog changes made outside the API)"""
+        from src.snapshots import build_catalog_snapshots
+
+        names = build_catalog_snapshots()
+        click.echo(f"✅ Wrote {len(names)} listing(s): {', '.join(names)}")
+
+    @app.cli.command('create-admin')
+    @click.option('--email', default='admin@prodesign.com', show_default=True)
+    @click.password_option(default='admin123', show_default=False)
+    def create_admin_command(email, password):
+        """Create an admin user"""
+        from src.seed import create_admin
+
+        if not create_admin(email, password):
+            click.echo(f'{email} already exists')
+
+    @app.cli.command('analytics-backfill')
+    @click.option('--start', help='First order date to rebuild (YYYY-MM-DD)')
+    @click.option('--end', help='Last order date to rebuild (YYYY-MM-DD)')
+    def analytics_backfill(start, end):
+        """Rebuild the daily sales rollups from the orders tables and the archive"""
+        from src import analytics
+
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+        end = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+
+        db.create_all()
+        analytics.backfill(start, end)
+        click.echo(f"✅ Rebuilt sales rollups ({start or 'beginning'} → {end or 'today'})")
+
+    @app.cli.command('jobs-worker')
+    @click.option('--queue', 'queues', multiple=True, help='Queue(s) to process (default: all)')
+    @click.option('--batch-size', default=50, show_default=True)
+    @click.option('--poll-interval', default=2.0, show_default=True, help='Seconds to sleep when idle')
+    @click.option('--once', is_flag=True, help='Exit when no jobs are due')
+    def jobs_worker(queues, batch_size, poll_interval, once):
+        """Process background jobs (order emails)"""
+        from src.jobs import run_worker
+        import src.notifications  # noqa: F401 - registers the mail handler
+
+        click.echo('Job worker started')
+        run_worker(list(queues) or None, batch_size, poll_interval, once)
+
+    @app.cli.command('events-prune')
+    @click.option('--days', default=7, show_default=True, help='Delete domain events older than this')
+    def events_prune(days):
+        """Delete old domain events (streams only replay recent ones)"""
+        from datetime import timedelta
+        from src.events import prune_events
+
+        removed = prune_events(timedelta(days=days))
+        click.echo(f'✅ Removed {removed} event(s)')
+
+    @app.cli.command('outbox-relay')
+    @click.option('--consumer', 'consumers', multiple=True, help='Consumer(s) to feed (default: all registered)')
+    @click.option('--batch-size', default=100, show_default=True)
+    @click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to sleep when caught up')
+    @click.option('--once', is_flag=True, help='Exit when every consumer is caught up')
+    def outbox_relay(consumers, batch_size, poll_interval, once):
+        """Deliver domain events to the outbox consumers"""
+        from src.outbox import CONSUMERS, load_consumer_modules, run_relay
+
+        load_consumer_modules(app)
+        unknown = set(consumers) - set(CONSUMERS)
+        if unknown:
+            raise click.BadParameter(f"unknown consumer(s): {', '.join(sorted(unknown))}", param_hint='--consumer')
+
+        def report(stats):
+            click.echo('  ' + ', '.join(f"{name}: {s['events']} events ({s['per_second']}/s)" for name, s in stats.items()))
+
+        click.echo(f"Outbox relay started ({', '.join(consumers or sorted(CONSUMERS))})")
+        run_relay(list(consumers) or None, batch_size, poll_interval, once, report)
+
+    @app.cli.command('outbox-forget')
+    @click.argument('consumer')
+    def outbox_forget(consumer):
+        """Drop a retired consumer's cursor so events-prune stops keeping events for it"""
+        from src.models.event import OutboxCursor
+
+        removed = OutboxCursor.query.filter_by(consumer=consumer).delete()
+        db.session.commit()
+        click.echo(f'✅ Removed cursor for {consumer}' if removed else f'No cursor named {consumer}')
+
+    @app.cli.command('orders-archive')
+    @click.option('--days', type=int, help='Archive orders older than this (default: ORDER_ARCHIVE_DAYS)')
+    @click.option('--batch-size', default=500, show_default=True)
+    @click.option('--limit', type=int, help='Stop after this many orders')
+    def orders_archive(days, batch_size, limit):
+        """Move old delivered/cancelled orders to the archive database"""
+        from src.archive import archive_orders
+
+        days = days if days is not None else app.config['ORDER_ARCHIVE_DAYS']
+        db.create_all(bind_key='archive')
+        moved = archive_orders(days, batch_size, limit)
+        click.echo(f'✅ Archived {moved} order(s) older than {days} days')
+
+    @app.cli.command('orders-export-archive')
+    @click.option('--output', type=click.File('w'), default='-', help='JSON lines file (default: stdout)')
+    @click.option('--start', help='Orders created on or after this date (YYYY-MM-DD)')
+    @click.option('--end', help='Orders created before this date (YYYY-MM-DD)')
+    def orders_export_archive(output, start, end):
+        """Export archived orders as JSON lines"""
+        from src.archive import export_archive
+
+        start = datetime.strptime(start, '%Y-%m-%d') if start else None
+        end = datetime.strptime(end, '%Y-%m-%d') if end else None
+        count = export_archive(output, start, end)
+        click.echo(f'✅ Exported {count} archived order(s)', err=True)
+
+    @app.cli.command('traffic-replay')
+    @click.argument('capture', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--target', help='Base URL of a running server (default: this app via the test client)')
+    @click.option('--speed', default=1.0, show_default=True, help='Pace multiplier; 0 sends as fast as possible')
+    @click.option('--concurrency', default=8, show_default=True)
+    @click.option('--limit', type=int, help='Replay only the first N requests')
+    @click.option('--email', help='Account used for requests that were authenticated')
+    @click.option('--password')
+    @click.option('--output', type=click.File('w'), default='-', help='Results as JSON lines (default: stdout)')
+    def traffic_replay(capture, target, speed, concurrency, limit, email, password, output):
+        """Replay captured traffic (writes go to the target's database: use a scratch copy)"""
+        import json
+        from src.traffic import client_sender, http_sender, read_capture, replay, summarize
+
+        token = None
+        if email:
+            credentials = {'email': email, 'password': password}
+            if target:
+                import requests
+                token = requests.post(target.rstrip('/') + '/api/auth/login', json=credentials,
+                                      timeout=30).json().get('access_token')
+            else:
+                token = app.test_client().post('/api/auth/login', json=credentials).get_json().get('access_token')
+            if not token:
+                raise click.ClickException(f'Could not log in as {email}')
+
+        entries = read_capture(capture, limit)
+        send = http_sender(target, token) if target else client_sender(app, token)
+        results = replay(entries, send, speed, concurrency)
+        for result in results:
+            output.write(json.dumps(result) + '\n')
+
+        for route, stats in sorted(summarize(results).items()):
+            click.echo(f"{stats['count']:6d}  p50 {stats['p50']:8.2f}ms  p95 {stats['p95']:8.2f}ms  "
+                       f"errors {stats['errors']:4d}  {route}", err=True)
+
+    @app.cli.command('traffic-compare')
+    @click.argument('base', type=click.Path(exists=True, dir_okay=False))
+    @click.argument('new', type=click.Path(exists=True, dir_okay=False))
+    def traffic_compare(base, new):
+        """Compare per-route latency of two traffic-replay outputs"""
+        from src.traffic import compare, read_capture
+
+        def fmt(value):
+            return f'{value:+7.1f}%' if value is not None else '      - '
+
+        click.echo(f"{'base p50':>9} {'new p50':>9} {'change':>8}  {'base p95':>9} {'new p95':>9} {'change':>8}  route")
+        for route, b, n, p50, p95 in compare(read_capture(base), read_capture(new)):
+            click.echo(f"{b['p50'] if b else '-':>9} {n['p50'] if n else '-':>9} {fmt(p50)}  "
+                       f"{b['p95'] if b else '-':>9} {n['p95'] if n else '-':>9} {fmt(p95)}  {route}")
+
+    @app.cli.command('uploads-cleanup')
+    @click.option('--hours', default=24, show_default=True, help='Remove sessions idle for longer than this')
+    @click.option('--file-days', default=7, show_default=True,
+                  help='Remove files no order or product uses once stored (or last re-uploaded) this long ago')
+    def uploads_cleanup(hours, file_days):
+        """Delete abandoned resumable upload sessions and files no order or product uses"""
+        from src.uploads import cleanup_objects, cleanup_sessions, referenced_digests
+
+        removed = cleanup_sessions(hours * 3600)
+        orphans = cleanup_objects(referenced_digests(), file_days * 24 * 3600)
+        click.echo(f'✅ Removed {removed} stale upload file(s) and {orphans} unreferenced stored file(s)')
@@ -0,0 +1,57 @@
+from flask import jsonify, request
+from sqlalchemy.orm.exc import StaleDataError
+from src.database import db
+
+# Optimistic concurrency for orders, products and custom orders.
+#
+# Those models declare a `version` column as SQLAlchemy's version_id_col:
+# every ORM UPDATE/DELETE is issued as "... WHERE id = :id AND version =
+# :version_read" and bumps the version, and a statement that matches no row
+# (someone else committed first) raises StaleDataError instead of silently
+# overwriting. No row locks are taken while the client thinks, so writers
+# never wait on each other.
+#
+# Admin endpoints also accept the version the client last saw, as an
+# If-Match header (the ETag of the GET) or a "version" body field, and
+# answer 409 with the current state when it is out of date. Server-side
+# writers that must not fail (Stripe webhooks) re-read and re-apply their
+# change instead (retry_on_conflict).
+
+
+def stale_precondition(obj):
+    """True if the client sent a version (If-Match or body "version") other than obj's"""
+    if request.if_match:
+        return not request.if_match.contains(str(obj.version))
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and data.get('version') is not None:
+        return data['version'] != obj.version
+    return False
+
+
+def versioned(response, obj):
+    """Set the ETag clients send back as If-Match"""
+    response.set_etag(str(obj.version))
+    return response
+
+
+def conflict_response(key, obj):
+    """409 with the current state of `obj` (already reloaded by the caller)"""
+    if obj is None:
+        return jsonify({'error': 'Not found (deleted by another request)'}), 404
+    response = jsonify({
+        'error': 'This record was changed by someone else; review the current version and retry',
+        key: obj.to_dict()
+    })
+    response.status_code = 409
+    return versioned(response, obj)
+
+
+def retry_on_conflict(apply, attempts=3):
+    """Call apply() (read, modify, commit) again when a concurrent write wins"""
+    for attempt in range(attempts):
+        try:
+            return apply()
+        except StaleDataError:
+            db.session.rollback()
+            if attempt == attempts - 1:
+                raise
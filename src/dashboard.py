@@ -0,0 +1,180 @@
+import os
+import threading
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import Session, load_only
+from src.archive import archived_totals
+from src.models.event import DomainEvent
+from src.models.order import Order, CustomOrder
+from src.models.product import Product
+from src.models.user import User
+
+# Live admin dashboard.
+#
+# Each worker process keeps one in-memory copy of the dashboard (the
+# counters of GET /api/admin/dashboard plus the most recent orders), loaded
+# from the primary when the first admin connects to /api/admin/feed. After
+# that it is maintained by applying domain events as the EventBus polls
+# them, and every change is pushed to the connected admin tabs as a small
+# delta on the 'dashboard' topic. A tab costs nothing while idle and
+# (re)connecting is served from memory.
+
+RECENT_ORDERS = 10
+
+
+def dashboard_stats(session):
+    """Counters shown on the admin dashboard (order totals include archived orders)"""
+    archived_orders, archived_revenue = archived_totals()
+    hot_revenue = session.query(func.sum(Order.total)).filter(Order.payment_status == 'paid').scalar() or 0
+    return {
+        'total_orders': session.query(func.count(Order.id)).scalar() + archived_orders,
+        'total_revenue': round(float(hot_revenue) + archived_revenue, 2),
+        'total_customers': session.query(func.count(User.id)).filter(User.is_admin.is_(False)).scalar(),
+        'total_products': session.query(func.count(Product.id)).filter(Product.is_active.is_(True)).scalar(),
+        'pending_orders': session.query(func.count(Order.id)).filter(Order.status == 'pending').scalar(),
+        'pending_custom_orders': session.query(func.count(CustomOrder.id)).filter(
+            CustomOrder.status == 'pending_approval').scalar()
+    }
+
+
+def _is(value, expected):
+    return 1 if value == expected else 0
+
+
+class DashboardFeed:
+    """Per-process dashboard snapshot kept current from domain events"""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.stats = None
+        self.recent_orders = []
+        self.last_event_id = 0
+        self._lock = threading.Lock()  # Guards the snapshot
+        self._load_lock = threading.Lock()
+        self._pid = None
+
+    def subscribe(self):
+        """Subscribe to dashboard deltas; returns (subscription, snapshot)"""
+        self._ensure_loaded()
+        with self._lock:
+            # Under the snapshot lock, so the first delta received follows the snapshot
+            subscription = self.bus.subscribe('dashboard')
+            return subscription, {'stats': dict(self.stats), 'recent_orders': list(self.recent_orders)}
+
+    def _ensure_loaded(self):
+        if self._pid == os.getpid():
+            return
+        with self._load_lock:
+            if self._pid != os.getpid():
+                self.bus.add_listener(self.apply, setup=self._load)
+                self._pid = os.getpid()
+
+    def _load(self):
+        with self.bus.engine.connect() as conn:
+            if conn.dialect.name == 'sqlite':
+                conn.exec_driver_sql('BEGIN')  # pysqlite would run each SELECT in its own snapshot
+            else:
+                conn = conn.execution_options(isolation_level='REPEATABLE READ')
+
+            # One read transaction: the counters include exactly the events up to last_event_id
+            with Session(bind=conn) as session:
+                last_event_id = session.query(func.coalesce(func.max(DomainEvent.id), 0)).scalar()
+                stats = dashboard_stats(session)
+                recent = session.query(Order).options(
+                    load_only(*[getattr(Order, f) for f in Order.SUMMARY_FIELDS])
+                ).order_by(Order.created_at.desc()).limit(RECENT_ORDERS).all()
+                recent_orders = [order.to_dict(Order.SUMMARY_FIELDS) for order in recent]
+
+        with self._lock:
+            self.stats = stats
+            self.recent_orders = recent_orders
+            self.last_event_id = last_event_id
+
+    def apply(self, event):
+        """EventBus listener: update the snapshot and publish the delta"""
+        handler = APPLY.get(event['kind'])
+        if handler is None:
+            return
+
+        with self._lock:
+            if event['id'] <= self.last_event_id:
+                return  # Already counted when the snapshot was loaded
+            self.last_event_id = event['id']
+
+            delta = handler(self, event['payload'])
+            if delta is not None:
+                self.bus.publish({'id': event['id'], 'topic': 'dashboard', 'subject_id': None,
+                                  'kind': event['kind'], 'payload': delta})
+
+    def _count(self, **increments):
+        """Apply counter increments; returns the new values of the counters that changed"""
+        changed = {}
+        for name, increment in increments.items():
+            if increment:
+                self.stats[name] = round(self.stats[name] + increment, 2)
+                changed[name] = self.stats[name]
+        return changed
+
+    def _order_created(self, order):
+        self.recent_orders = [order] + self.recent_orders[:RECENT_ORDERS - 1]
+        return {
+            'counters': self._count(
+                total_orders=1,
+                pending_orders=_is(order['status'], 'pending'),
+                total_revenue=order['total'] * _is(order['payment_status'], 'paid')
+            ),
+            'order': order
+        }
+
+    def _order_status(self, change):
+        for order in self.recent_orders:
+            if order['id'] == change['order_id']:
+                order.update(status=change['status'], payment_status=change['payment_status'])
+        return {
+            'counters': self._count(
+                pending_orders=_is(change['status'], 'pending') - _is(change['previous_status'], 'pending'),
+                total_revenue=(change['total'] or 0) * (
+                    _is(change['payment_status'], 'paid') - _is(change['previous_payment_status'], 'paid'))
+            ),
+            'order': {key: change[key] for key in ('order_id', 'status', 'payment_status')}
+        }
+
+    def _custom_order_created(self, custom_order):
+        return {
+            'counters': self._count(pending_custom_orders=_is(custom_order['status'], 'pending_approval')),
+            'custom_order': custom_order
+        }
+
+    def _custom_order_status(self, change):
+        return {
+            'counters': self._count(pending_custom_orders=_is(change['status'], 'pending_approval') -
+                                    _is(change['previous_status'], 'pending_approval')),
+            'custom_order': {key: change[key] for key in ('custom_order_id', 'status')}
+        }
+
+    def _user_registered(self, user):
+        return {'counters': self._count(total_customers=1)}
+
+    def _product_changed(self, change):
+        counters = self._count(total_products=int(change['is_active']) - int(change['was_active']))
+        return {'counters': counters} if counters else None
+
+
+# Event kind -> DashboardFeed method returning the delta to push (or None)
+APPLY = {
+    'order.created': DashboardFeed._order_created,
+    'order.status': DashboardFeed._order_status,
+    'custom_order.created': DashboardFeed._custom_order_created,
+    'custom_order.status': DashboardFeed._custom_order_status,
+    'user.registered': DashboardFeed._user_registered,
+    'product.changed': DashboardFeed._product_changed
+}
+
+
+def get_feed():
+    return current_app.extensions['dashboard']
+
+
+def init_dashboard_feed(app):
+    """Create the process's dashboard feed (loaded when the first admin connects)"""
+    app.extensions['dashboard'] = DashboardFeed(app.extensions['events'])
@@ -1,4 +1,83 @@
+import random
+import time
+from functools import wraps
+from flask import g, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+# Read replicas.
+#
+# Replica engines are the binds named replica_0, replica_1, ... (configured
+# from DATABASE_REPLICA_URLS). Views decorated with @read_only send their
+# SELECTs for default-bind models to one replica per request. Everything
+# else, and every query after the session has written, goes to the primary.
+# After a request that wrote, the client gets a short-lived cookie (and an
+# X-Read-Primary-Until header it may echo back) so its next reads also hit
+# the primary until the replicas have caught up (read-your-writes).
+
+REPLICA_PREFIX = 'replica_'
+STICKY_COOKIE = 'pd_read_primary'
+STICKY_HEADER = 'X-Read-Primary-Until'
+
+
+class RoutingSession(Session):
+    """Session that routes read-only requests to replica engines"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info['wrote'] = True
+            if has_request_context():
+                g.db_wrote = True
+            return engine
+
+        if not self.info.get('read_only') or self.info.get('wrote'):
+            return engine
+
+        engines = self._db.engines
+        if engine is not engines.get(None):
+            return engine  # Another bind (not replicated)
+
+        if 'replica' not in self.info:
+            replicas = [e for key, e in engines.items() if key and key.startswith(REPLICA_PREFIX)]
+            self.info['replica'] = random.choice(replicas) if replicas else None
+
+        return self.info['replica'] or engine
+
 
 # Single SQLAlchemy instance for the entire application
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def read_only(fn):
+    """Serve GET/HEAD requests of this view from a read replica when possible"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        sticky_until = max(request.cookies.get(STICKY_COOKIE, 0, type=float),
+                           request.headers.get(STICKY_HEADER, 0, type=float))
+        if request.method in ('GET', 'HEAD') and sticky_until < time.time():
+            db.session.info['read_only'] = True
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def replica_binds(urls):
+    """SQLALCHEMY_BINDS entries for a comma separated list of replica URLs"""
+    urls = [url.strip() for url in (urls or '').split(',') if url.strip()]
+    return {f'{REPLICA_PREFIX}{i}': url for i, url in enumerate(urls)}
+
+
+def init_read_replicas(app):
+    """Register the read-your-writes cookie hook"""
+    @app.after_request
+    def stick_to_primary(response):
+        binds = app.config.get('SQLALCHEMY_BINDS') or {}
+        if g.get('db_wrote') and any(key.startswith(REPLICA_PREFIX) for key in binds):
+            seconds = app.config['REPLICA_STICKY_SECONDS']
+            until = str(time.time() + seconds)
+            response.set_cookie(STICKY_COOKIE, until, max_age=seconds, httponly=True, samesite='Lax')
+            response.headers[STICKY_HEADER] = until
+        return response
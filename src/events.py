@@ -0,0 +1,301 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, jsonify
+from sqlalchemy import func, select
+from src.database import db
+from src.models.event import DomainEvent, OutboxCursor
+
+# Domain events and the in-process fan-out behind the streaming endpoints.
+#
+# emit() adds a DomainEvent to the caller's session, so an event exists if
+# and only if the change that caused it was committed. Each worker process
+# runs one EventBus poller thread (started by the first subscriber) that
+# reads new rows from the primary every EVENTS_POLL_INTERVAL seconds with a
+# single primary-key range query and hands them to in-memory subscriber
+# queues. However many clients are connected, a process issues one query per
+# interval; an idle connection is just a queue waiting for its next event.
+#
+# Events whose payload holds customer details (order.created carries the
+# admin order summary) go on 'admin.*' topics; the per-order 'order' topic
+# that customers can follow only carries status changes.
+#
+# Listeners (e.g. the admin dashboard feed in src/dashboard.py) see every
+# event in the poller thread, before subscribers do, and may publish derived
+# events of their own.
+#
+# Subscribers that fall SUBSCRIBER_QUEUE_SIZE events behind are told to
+# reconnect; streams send ids so a reconnecting EventSource resumes from
+# Last-Event-ID, replayed from the table.
+#
+# Readers (this poller, Last-Event-ID replay, the outbox relay in
+# src/outbox.py) resume from the highest id they have seen, which is only
+# safe if ids become visible in id order. SQLite has a single writer, so an
+# event's id is assigned and committed before the next writer starts. On
+# PostgreSQL a sequence hands out ids at INSERT time and a transaction that
+# took a lower id could commit after a higher one was already read, so
+# emit() takes a transaction-scoped advisory lock: transactions that write
+# events assign ids and commit one at a time. Other databases need the
+# same before they can carry events.
+#
+# Holding thousands of open streams needs an async worker class (gevent, the
+# default in gunicorn.conf.py). With single-threaded sync workers every open
+# stream would occupy a worker, so @streaming views answer 503 there.
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+EVENT_ORDER_LOCK = 0x6576656E7473  # PostgreSQL advisory lock key ("events")
+HEARTBEAT_SECONDS = 15  # Comment line that keeps proxies from closing idle streams
+RECONNECT_MILLISECONDS = 3000
+
+
+def emit(topic, subject_id, kind, payload):
+    """Record an event in the current session (committed by the caller)"""
+    if db.engine.dialect.name == 'postgresql':
+        # Held until commit, so event ids are committed in id order
+        db.session.execute(select(func.pg_advisory_xact_lock(EVENT_ORDER_LOCK)))
+    event = DomainEvent(topic=topic, subject_id=subject_id, kind=kind, payload=payload)
+    db.session.add(event)
+    return event
+
+
+# What a customer following an order is shown (GET /api/orders/<id>/events)
+ORDER_STATUS_FIELDS = ('order_id', 'order_number', 'status', 'payment_status')
+
+
+def order_status_payload(order):
+    return {
+        'order_id': order.id,
+        'order_number': order.order_number,
+        'status': order.status,
+        'payment_status': order.payment_status
+    }
+
+
+def emit_order_status(order, old_status, old_payment_status):
+    """Emit order.status if the order's status or payment status changed"""
+    if (order.status, order.payment_status) == (old_status, old_payment_status):
+        return None
+    return emit('order', order.id, 'order.status', {
+        **order_status_payload(order),
+        'previous_status': old_status,
+        'previous_payment_status': old_payment_status,
+        'total': order.total,
+        'changed_at': datetime.utcnow().isoformat()
+    })
+
+
+def event_dict(event):
+    return {
+        'id': event.id,
+        'topic': event.topic,
+        'subject_id': event.subject_id,
+        'kind': event.kind,
+        'payload': event.payload
+    }
+
+
+class Subscription:
+    """Queue of events for one connected client"""
+
+    def __init__(self, bus, key):
+        self.bus = bus
+        self.key = key
+        self.queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """Per-process fan-out of domain_events rows to subscribers"""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config['EVENTS_POLL_INTERVAL']
+        self._subscribers = {}  # (topic, subject_id or None for all) -> set of Subscription
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._pid = None
+        self._engine = None
+        self._last_id = 0
+
+    def subscribe(self, topic, subject_id=None):
+        """Receive events of `topic` (only those about `subject_id` if given)"""
+        self._ensure_poller()
+        subscription = Subscription(self, (topic, subject_id))
+        with self._lock:
+            self._subscribers.setdefault(subscription.key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.key)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.key]
+
+    def add_listener(self, listener, setup=None):
+        """Call listener(event) from the poller thread for every new event
+
+        `setup()` runs first with polling paused, so state it loads from the
+        database neither misses nor double-counts an event.
+        """
+        self._ensure_poller()
+        with self._poll_lock:
+            if setup is not None:
+                setup()
+            self._listeners.append(listener)
+
+    @property
+    def engine(self):
+        self._ensure_poller()
+        return self._engine
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def publish(self, event):
+        """Hand an event dict to the subscribers of its topic/subject"""
+        with self._lock:
+            targets = list(self._subscribers.get((event['topic'], event['subject_id']), ()))
+            targets += self._subscribers.get((event['topic'], None), ())
+        for subscription in targets:
+            subscription.deliver(event)
+
+    def _ensure_poller(self):
+        # One poller per process; threads do not survive a fork, so check the pid
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Inherited from the parent process
+            self._subscribers = {}
+            self._listeners = []
+            with self.app.app_context():
+                self._engine = db.engine  # Always the primary
+            with self._engine.connect() as conn:
+                self._last_id = conn.execute(select(func.coalesce(func.max(DomainEvent.id), 0))).scalar()
+            threading.Thread(target=self._run, name='event-bus', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('Event bus poll failed')
+
+    def poll(self):
+        """Publish events committed since the last poll"""
+        with self._poll_lock:
+            query = select(DomainEvent).where(DomainEvent.id > self._last_id).order_by(DomainEvent.id).limit(1000)
+            with self._engine.connect() as conn:
+                rows = conn.execute(query).all()
+            for row in rows:
+                self._last_id = row.id
+                event = event_dict(row)
+                for listener in self._listeners:
+                    try:
+                        listener(event)
+                    except Exception:
+                        logger.exception('Event listener failed')
+                self.publish(event)
+
+
+def get_bus():
+    return current_app.extensions['events']
+
+
+def streaming(fn):
+    """Answer 503 instead of streaming when STREAMS_ENABLED is off (single-threaded sync workers)"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not current_app.config['STREAMS_ENABLED']:
+            response = jsonify({'error': 'Live updates are not available on this server; poll instead'})
+            response.headers['Retry-After'] = '60'
+            return response, 503
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def sse(data, event=None, event_id=None):
+    """Format one Server-Sent Events frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream(subscription, initial=(), last_id=0, kinds=None, project=None):
+    """SSE frames: `initial`, then subscribed events until the client goes away
+
+    Only events of `kinds` (all if None) are sent, with their payload passed
+    through `project` if given.
+
+    Must not touch the database or the app context: it runs after the view
+    has returned and its session has been cleaned up.
+    """
+    try:
+        yield f'retry: {RECONNECT_MILLISECONDS}\n\n'
+        yield from initial
+
+        while True:
+            event = subscription.get(HEARTBEAT_SECONDS)
+            if subscription.overflowed:
+                # Events were dropped; the client reconnects and replays from Last-Event-ID
+                yield sse({'reason': 'overflow'}, event='reset')
+                return
+            if event is None:
+                yield ': keepalive\n\n'
+            elif event['id'] > last_id:  # Skip events already replayed
+                last_id = event['id']
+                if kinds is None or event['kind'] in kinds:
+                    payload = project(event['payload']) if project else event['payload']
+                    yield sse(payload, event=event['kind'], event_id=event['id'])
+    finally:
+        subscription.close()
+
+
+def prune_events(max_age):
+    """Delete events older than `max_age` (timedelta) that every outbox consumer has seen"""
+    query = DomainEvent.query.filter(DomainEvent.created_at < datetime.utcnow() - max_age)
+    pending = db.session.query(func.min(OutboxCursor.last_event_id)).scalar()
+    if pending is not None:
+        query = query.filter(DomainEvent.id <= pending)
+    removed = query.delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def init_events(app):
+    """Create the process's event bus (its poller starts with the first subscriber)"""
+    app.extensions['events'] = EventBus(app)
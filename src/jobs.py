@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+import random
+import time
+import uuid
+from src.database import db
+from src.models.job import Job
+
+# Database-backed background jobs.
+#
+# enqueue() adds a Job to the caller's session, so the job is committed in
+# the same transaction as the change that caused it (an order that rolls
+# back never sends an email). `flask jobs-worker` claims due jobs in batches
+# and hands each batch to the handler registered for its queue. Handlers get
+# the whole batch so they can share expensive resources, e.g. one SMTP
+# connection for many messages. Failed jobs are retried with exponential
+# backoff until max_attempts, then left as `failed` for inspection.
+
+# queue name -> handler(jobs) returning {job_id: error message} for failures
+HANDLERS = {}
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# Running jobs whose worker has been silent this long are handed out again
+VISIBILITY_TIMEOUT = timedelta(minutes=10)
+
+
+def register_handler(queue):
+    """Decorator registering the batch handler for `queue`"""
+    def decorator(fn):
+        HANDLERS[queue] = fn
+        return fn
+    return decorator
+
+
+def enqueue(queue, payload, run_at=None, max_attempts=8):
+    """Queue a job in the current session (committed by the caller)"""
+    job = Job(queue=queue, payload=payload, run_at=run_at or datetime.utcnow(), max_attempts=max_attempts)
+    db.session.add(job)
+    return job
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at RETRY_MAX_SECONDS"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(queue, limit):
+    """Atomically mark up to `limit` due jobs as running and return them"""
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+
+    due = db.select(Job.id).where(
+        Job.queue == queue,
+        db.or_(
+            db.and_(Job.status == 'queued', Job.run_at <= now),
+            db.and_(Job.status == 'running', Job.locked_at < now - VISIBILITY_TIMEOUT)
+        )
+    ).order_by(Job.run_at).limit(limit).scalar_subquery()
+
+    db.session.execute(
+        db.update(Job)
+        .where(Job.id.in_(due), Job.status.in_(('queued', 'running')))
+        .values(status='running', locked_by=token, locked_at=now, attempts=Job.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    return Job.query.filter_by(locked_by=token, status='running').order_by(Job.run_at).all()
+
+
+def _finish(jobs, errors):
+    now = datetime.utcnow()
+    for job in jobs:
+        error = errors.get(job.id)
+        job.locked_by = None
+        job.locked_at = None
+        if error is None:
+            job.status = 'done'
+            job.completed_at = now
+            job.last_error = None
+        elif job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.last_error = error
+        else:
+            job.status = 'queued'
+            job.last_error = error
+            job.run_at = now + retry_delay(job.attempts)
+    db.session.commit()
+
+
+def run_batch(queue, limit=50):
+    """Process one batch of `queue`; returns the number of jobs claimed"""
+    jobs = claim_batch(queue, limit)
+    if not jobs:
+        return 0
+
+    try:
+        errors = HANDLERS[queue](jobs)
+    except Exception as e:
+        # The whole batch failed (e.g. SMTP server unreachable)
+        errors = {job.id: str(e) for job in jobs}
+
+    _finish(jobs, errors)
+    return len(jobs)
+
+
+def run_worker(queues=None, batch_size=50, poll_interval=2.0, once=False):
+    """Process jobs until interrupted (or until the queues are empty with `once`)"""
+    queues = queues or list(HANDLERS)
+    while True:
+        processed = sum(run_batch(queue, batch_size) for queue in queues)
+        if not processed:
+            if once:
+                return
+            time.sleep(poll_interval)
+
+
+def queue_metrics():
+    """Job counts per queue and status, plus the age of the oldest due job"""
+    now = datetime.utcnow()
+    metrics = {}
+
+    rows = db.session.query(Job.queue, Job.status, db.func.count(Job.id)).group_by(Job.queue, Job.status)
+    for queue, status, count in rows:
+        metrics.setdefault(queue, {'queued': 0, 'running': 0, 'done': 0, 'failed': 0})[status] = count
+
+    oldest = db.session.query(Job.queue, db.func.min(Job.run_at)).filter(
+        Job.status == 'queued', Job.run_at <= now
+    ).group_by(Job.queue)
+    for queue, run_at in oldest:
+        metrics[queue]['oldest_due_seconds'] = (now - run_at).total_seconds()
+
+    return metrics
@@ -0,0 +1,217 @@
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from src.database import db
+
+# Request deadlines and load shedding.
+#
+# Every request is put in a priority class by endpoint or blueprint
+# (ROUTE_CLASSES). Each class has:
+#   - deadline: seconds from arrival the request may take. It is exposed as
+#     remaining_time() and caps SQLite's busy_timeout (lock waits) for the
+#     request's connections and the Stripe HTTP timeout, so nothing keeps
+#     working for a client that has given up;
+#   - queue_budget: if the request already waited longer than this before a
+#     worker picked it up, it is shed with 503 + Retry-After instead of being
+#     served late;
+#   - max_inflight: concurrent requests of the class per worker process
+#     (None = unlimited) beyond which new ones are shed.
+# Checkout gets the largest budgets and no concurrency cap, so under
+# overload catalog browsing and admin screens are shed first.
+#
+# Queue time needs the front server to stamp the arrival time, e.g. nginx:
+#   proxy_set_header X-Request-Start "t=${msec}";
+# Without the header only the deadlines and concurrency caps apply.
+
+DEFAULT_CLASSES = {
+    'checkout': {'deadline': 30.0, 'queue_budget': 10.0, 'max_inflight': None, 'retry_after': 1},
+    'auth': {'deadline': 5.0, 'queue_budget': 2.0, 'max_inflight': 16, 'retry_after': 2},
+    'default': {'deadline': 10.0, 'queue_budget': 2.0, 'max_inflight': 64, 'retry_after': 2},
+    'catalog': {'deadline': 5.0, 'queue_budget': 1.0, 'max_inflight': 64, 'retry_after': 5},
+    'admin': {'deadline': 15.0, 'queue_budget': 1.0, 'max_inflight': 8, 'retry_after': 10}
+}
+
+# Endpoint or blueprint -> class (endpoints win); anything else is 'default'
+ROUTE_CLASSES = {
+    'orders.create_order': 'checkout',
+    'orders.quote_order': 'checkout',
+    'payment': 'checkout',
+    'auth': 'auth',
+    'products': 'catalog',
+    'uploads.get_file': 'catalog',
+    'serve': 'catalog',
+    'admin': 'admin',
+    'analytics': 'admin'
+}
+
+# Long-lived streams: no deadline and not counted as in flight
+UNBOUNDED_ENDPOINTS = {'orders.order_events', 'admin.dashboard_feed'}
+
+DEFAULT_BUSY_TIMEOUT_MS = 5000  # pysqlite's default (timeout=5.0)
+MIN_STRIPE_TIMEOUT = 0.5
+
+
+def load_classes(app):
+    """DEFAULT_CLASSES with per-class overrides from LOADSHED_CLASSES"""
+    overrides = app.config.get('LOADSHED_CLASSES') or {}
+    return {name: {**rule, **overrides.get(name, {})} for name, rule in DEFAULT_CLASSES.items()}
+
+
+def request_start():
+    """Arrival time stamped by the front server (X-Request-Start), if any"""
+    value = request.headers.get('X-Request-Start', '')
+    try:
+        stamp = float(value[2:] if value.startswith('t=') else value)
+    except ValueError:
+        return None
+    # Seconds, milliseconds or microseconds since the epoch
+    while stamp > 1e11:
+        stamp /= 1000
+    return stamp or None
+
+
+def remaining_time():
+    """Seconds left before the current request's deadline (None outside a bounded request)"""
+    if has_request_context() and 'deadline' in g:
+        return g.deadline - time.time()
+    return None
+
+
+class LoadShedder:
+    """Per-process in-flight accounting and admission by priority class"""
+
+    def __init__(self, classes, routes=ROUTE_CLASSES):
+        self.classes = classes
+        self.routes = routes
+        self._inflight = Counter()  # class -> requests in flight
+        self._blueprints = Counter()  # blueprint -> requests in flight
+        self._shed = Counter()  # 'class.reason' -> requests shed
+        self._lock = threading.Lock()
+
+    def classify(self, endpoint):
+        if endpoint in self.routes:
+            return self.routes[endpoint]
+        blueprint = endpoint.rsplit('.', 1)[0] if endpoint else None
+        return self.routes.get(blueprint, 'default')
+
+    def admit(self, name, blueprint, queued):
+        """Count the request in; returns the reason it must be shed instead (or None)"""
+        rule = self.classes[name]
+        with self._lock:
+            if queued > rule['queue_budget']:
+                reason = 'queue_time'
+            elif rule['max_inflight'] is not None and self._inflight[name] >= rule['max_inflight']:
+                reason = 'concurrency'
+            else:
+                self._inflight[name] += 1
+                self._blueprints[blueprint] += 1
+                return None
+            self._shed[f'{name}.{reason}'] += 1
+            return reason
+
+    def release(self, name, blueprint):
+        with self._lock:
+            self._inflight[name] -= 1
+            self._blueprints[blueprint] -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'classes': self.classes,
+                'inflight': {name: n for name, n in self._inflight.items() if n},
+                'inflight_by_blueprint': {bp or 'app': n for bp, n in self._blueprints.items() if n},
+                'shed': dict(self._shed)
+            }
+
+
+def _start_request(shedder):
+    endpoint = request.endpoint
+    if endpoint is None or endpoint in UNBOUNDED_ENDPOINTS:
+        return None
+
+    now = time.time()
+    arrived = min(request_start() or now, now)
+    name = shedder.classify(endpoint)
+    rule = shedder.classes[name]
+
+    reason = shedder.admit(name, request.blueprint, now - arrived)
+    if reason:
+        response = jsonify({'error': 'Server is busy, please retry shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(rule['retry_after'])
+        return response
+
+    g.loadshed = (name, request.blueprint)
+    g.deadline = arrived + rule['deadline']
+    return None
+
+
+def _limit_busy_timeout(dbapi_connection, connection_record, connection_proxy):
+    # Pool checkout: don't wait for SQLite locks past the request's deadline
+    remaining = remaining_time()
+    if remaining is None:
+        return
+    timeout_ms = max(1, min(DEFAULT_BUSY_TIMEOUT_MS, int(remaining * 1000)))
+    dbapi_connection.execute(f'PRAGMA busy_timeout = {timeout_ms}')
+    connection_record.info['busy_timeout_limited'] = True
+
+
+def _restore_busy_timeout(dbapi_connection, connection_record):
+    if connection_record.info.pop('busy_timeout_limited', False):
+        dbapi_connection.execute(f'PRAGMA busy_timeout = {DEFAULT_BUSY_TIMEOUT_MS}')
+
+
+def stripe_http_client(stripe, timeout):
+    """Stripe HTTP client whose timeout never exceeds the current request's deadline"""
+
+    class DeadlineRequestsClient(stripe.RequestsClient):
+        deadline_aware = True
+
+        @property
+        def _timeout(self):
+            remaining = remaining_time()
+            if remaining is None:
+                return self.default_timeout
+            return max(MIN_STRIPE_TIMEOUT, min(self.default_timeout, remaining))
+
+        @_timeout.setter
+        def _timeout(self, value):
+            self.default_timeout = value
+
+        def _should_retry(self, response, api_connection_error, num_retries, max_network_retries):
+            remaining = remaining_time()
+            if remaining is not None and remaining < MIN_STRIPE_TIMEOUT:
+                return False  # No time left for another attempt
+            return super()._should_retry(response, api_connection_error, num_retries, max_network_retries)
+
+    return DeadlineRequestsClient(timeout=timeout)
+
+
+def get_shedder():
+    """The app's load shedder (None when LOADSHED_ENABLED is off)"""
+    return current_app.extensions.get('loadshed')
+
+
+def init_load_shedding(app):
+    """Register the admission hooks and deadline propagation"""
+    if not app.config['LOADSHED_ENABLED']:
+        return
+    app.extensions['loadshed'] = shedder = LoadShedder(load_classes(app))
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'checkout', _limit_busy_timeout)
+                event.listen(engine, 'checkin', _restore_busy_timeout)
+
+    @app.before_request
+    def admit_request():
+        return _start_request(shedder)
+
+    @app.teardown_request
+    def release_request(exc):
+        state = g.pop('loadshed', None)
+        if state is not None:
+            shedder.release(*state)
@@ -1,191 +1,238 @@
 import os
 import sys
+import weakref
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
-from flask_cors import CORS
-from flask_jwt_extended import JWTManager
-from src.database import db
-from src.models.user import User
-from src.models.product import Product, ProductVariant
-from src.models.order import Order, OrderItem, CustomOrder
-
-# Import routes
-from src.routes.user import user_bp
-from src.routes.products import products_bp
-from src.routes.orders import orders_bp
-from src.routes.auth import auth_bp
-from src.routes.admin import admin_bp
-from src.routes.payment import payment_bp
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-
-# Configuration
-app.config['SECRET_KEY'] = 'pro-design-company-secret-key-2025'
-app.config['JWT_SECRET_KEY'] = 'jwt-secret-key-pro-design-2025'
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file upload
-
-# Initialize extensions
-CORS(app, resources={r"/api/*": {"origins": "*"}})
-jwt = JWTManager(app)
-db.init_app(app)
-
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(user_bp, url_prefix='/api/users')
-app.register_blueprint(products_bp, url_prefix='/api/products')
-app.register_blueprint(orders_bp, url_prefix='/api/orders')
-app.register_blueprint(admin_bp, url_prefix='/api/admin')
-app.register_blueprint(payment_bp, url_prefix='/api/payment')
-
-def seed_products():
-    """Seed initial products"""
-    from src.models.user import User
-    
-    products_data = [
-        {
-            'name': 'Classic Black Tee',
-            'description': 'Premium quality 100% cotton t-shirt. Perfect for custom designs and everyday wear.',
-            'category': 'tshirt',
-            'base_price': 25.00,
-            'image_url': 'https://images.unsplash.com/photo-1521572163474-6864f9cf17ab?w=500&h=600&fit=crop',
-            'sizes': ['S', 'M', 'L', 'XL', '2XL', '3XL']
-        },
-        {
-            'name': 'Custom Design Hoodie',
-            'description': 'Comfortable fleece hoodie with front pocket. Ideal for screen printing and embroidery.',
-            'category': 'hoodie',
-            'base_price': 45.00,
-            'image_url': 'https://images.unsplash.com/photo-1556821840-3a63f95609a7?w=500&h=600&fit=crop',
-            'sizes': ['S', 'M', 'L', 'XL', '2XL']
-        },
-        {
-            'name': 'Graphic Print Tee',
-            'description': 'Soft cotton blend t-shirt perfect for vibrant custom graphics and designs.',
-            'category': 'tshirt',
-            'base_price': 28.00,
-            'image_url': 'https://images.unsplash.com/photo-1583743814966-8936f5b7be1a?w=500&h=600&fit=crop',
-            'sizes': ['S', 'M', 'L', 'XL', '2XL', '3XL', '4XL']
-        },
-        {
-            'name': 'Premium Cotton Tee',
-            'description': 'High-quality ring-spun cotton t-shirt. Excellent for detailed custom printing.',
-            'category': 'tshirt',
-            'base_price': 30.00,
-            'image_url': 'https://images.unsplash.com/photo-1622445275463-afa2ab738c34?w=500&h=600&fit=crop',
-            'sizes': ['S', 'M', 'L', 'XL']
-        },
-        {
-            'name': 'Pullover Hoodie',
-            'description': 'Heavyweight pullover hoodie with adjustable drawstring. Perfect for custom logos.',
-            'category': 'hoodie',
-            'base_price': 50.00,
-            'image_url': 'https://images.unsplash.com/photo-1620799140408-edc6dcb6d633?w=500&h=600&fit=crop',
-            'sizes': ['S', 'M', 'L', 'XL', '2XL']
-        },
-        {
-            'name': 'Vintage Style Tee',
-            'description': 'Retro-inspired t-shirt with a worn-in feel. Great for vintage designs.',
-            'category': 'tshirt',
-            'base_price': 26.00,
-            'image_url': 'https://images.unsplash.com/photo-1618354691373-d851c5c3a990?w=500&h=600&fit=crop',
-            'sizes': ['S', 'M', 'L', 'XL', '2XL']
-        },
-        {
-            'name': 'Zip-Up Hoodie',
-            'description': 'Full-zip hoodie with side pockets. Excellent for custom embroidery and printing.',
-            'category': 'hoodie',
-            'base_price': 55.00,
-            'image_url': 'https://images.unsplash.com/photo-1620799140188-3b2a02fd9a77?w=500&h=600&fit=crop',
-            'sizes': ['M', 'L', 'XL', '2XL']
-        },
-        {
-            'name': 'Performance Tee',
-            'description': 'Moisture-wicking athletic t-shirt. Perfect for sports teams and active wear.',
-            'category': 'tshirt',
-            'base_price': 32.00,
-            'image_url': 'https://images.unsplash.com/photo-1489987707025-afc232f7ea0f?w=500&h=600&fit=crop',
-            'sizes': ['S', 'M', 'L', 'XL', '2XL', '3XL']
-        },
-        {
-            'name': 'Long Sleeve Tee',
-            'description': 'Comfortable long sleeve t-shirt. Great for cooler weather custom designs.',
-            'category': 'tshirt',
-            'base_price': 35.00,
-            'image_url': 'https://images.unsplash.com/photo-1618517351616-38fb9c5210c6?w=500&h=600&fit=crop',
-            'sizes': ['S', 'M', 'L', 'XL', '2XL']
-        },
-        {
-            'name': 'Crewneck Sweatshirt',
-            'description': 'Classic crewneck sweatshirt with ribbed cuffs. Perfect for custom screen printing.',
-            'category': 'hoodie',
-            'base_price': 42.00,
-            'image_url': 'https://images.unsplash.com/photo-1591047139829-d91aecb6caea?w=500&h=600&fit=crop',
-            'sizes': ['S', 'M', 'L', 'XL', '2XL', '3XL']
-        }
-    ]
-    
-    for prod_data in products_data:
-        sizes = prod_data.pop('sizes')
-        product = Product(**prod_data)
-        db.session.add(product)
-        db.session.flush()  # Get product ID
-        
-        # Add variants for each size
-        for size in sizes:
-            variant = ProductVariant(
-                product_id=product.id,
-                size=size,
-                color='Black',
-                stock_quantity=100,
-                sku=f"{product.name.replace(' ', '-').upper()}-{size}-BLK"
-            )
-            db.session.add(variant)
-    
-    db.session.commit()
-    print("✅ Seeded products successfully!")
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-        return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+from werkzeug.security import safe_join
+from src.database import db, init_read_replicas, replica_binds
+
+# Importing this module is cheap: blueprints, models and extensions are only
+# imported by create_app(). Run with:
+#
+#   flask --app src.main run                                   (development)
+#   gunicorn -c gunicorn.conf.py 'src.main:create_app()'       (production)
+#
+# Schema creation and seeding are CLI commands (init-db, upgrade-db, seed,
+# create-admin); creating the app never touches the database.
+
+BASE_DIR = os.path.dirname(__file__)
+
+
+def create_app(config=None):
+    """Application factory"""
+    app = Flask(__name__, static_folder=os.path.join(BASE_DIR, 'static'))
+
+    # Configuration
+    app.config['SECRET_KEY'] = 'pro-design-company-secret-key-2025'
+    app.config['JWT_SECRET_KEY'] = 'jwt-secret-key-pro-design-2025'
+    # Logout reaches every worker within this many seconds (see src/revocation.py)
+    app.config['REVOCATION_SYNC_SECONDS'] = float(os.getenv('REVOCATION_SYNC_SECONDS', 5))
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(BASE_DIR, 'database', 'app.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max request body (and resumable upload chunk)
+
+    # Read replicas (see src/database.py), e.g. DATABASE_REPLICA_URLS=sqlite:////data/replica1.db
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(os.getenv('DATABASE_REPLICA_URLS'))
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+    # Archived (delivered/cancelled) orders live in their own database (see src/archive.py)
+    app.config['ARCHIVE_DATABASE_URL'] = os.getenv(
+        'ARCHIVE_DATABASE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'database', 'archive.db')}")
+    app.config['ORDER_ARCHIVE_DAYS'] = int(os.getenv('ORDER_ARCHIVE_DAYS', 365))
+
+    # Artwork uploads (see src/uploads.py)
+    app.config['UPLOAD_DIR'] = os.getenv('UPLOAD_DIR', os.path.join(BASE_DIR, 'database', 'uploads'))
+    app.config['UPLOAD_MAX_SIZE'] = int(os.getenv('UPLOAD_MAX_SIZE', 200 * 1024 * 1024))  # 200MB per file
+    app.config['UPLOAD_SESSION_LIMIT'] = int(os.getenv('UPLOAD_SESSION_LIMIT', 5))  # Open resumable uploads per user
+    app.config['UPLOAD_SESSION_QUOTA'] = int(os.getenv('UPLOAD_SESSION_QUOTA', 500 * 1024 * 1024))  # Bytes in them
+
+    # Email (sent by the job worker, see src/notifications.py)
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'localhost')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 25))
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'False').lower() == 'true'
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'Pro Design <orders@prodesign.com>')
+
+    # Domain events / streaming endpoints (see src/events.py)
+    app.config['EVENTS_POLL_INTERVAL'] = float(os.getenv('EVENTS_POLL_INTERVAL', 0.5))  # seconds
+    # Off when workers can only serve one request at a time (see gunicorn.conf.py): streams answer 503
+    app.config['STREAMS_ENABLED'] = os.getenv('STREAMS_ENABLED', 'True').lower() == 'true'
+
+    # Outbox relay (see src/outbox.py): extra consumer modules, built-in order-export target
+    app.config['OUTBOX_CONSUMER_MODULES'] = os.getenv('OUTBOX_CONSUMER_MODULES', '')  # e.g. myshop.consumers
+    app.config['ORDER_EXPORT_FILE'] = os.getenv('ORDER_EXPORT_FILE', os.path.join(BASE_DIR, 'database', 'order-events.jsonl'))
+
+    # Product grid stock matrix cache (see src/stock.py)
+    app.config['STOCK_CACHE_SECONDS'] = float(os.getenv('STOCK_CACHE_SECONDS', 15))
+
+    # Prebuilt product listings (see src/snapshots.py); USE_X_SENDFILE=True behind nginx/Apache
+    app.config['CATALOG_SNAPSHOTS_ENABLED'] = os.getenv('CATALOG_SNAPSHOTS_ENABLED', 'True').lower() == 'true'
+    app.config['CATALOG_SNAPSHOT_DIR'] = os.getenv('CATALOG_SNAPSHOT_DIR', os.path.join(app.static_folder, 'catalog'))
+    app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'False').lower() == 'true'
+
+    # Opt-in traffic capture for replay testing (see src/traffic.py)
+    app.config['TRAFFIC_CAPTURE_FILE'] = os.getenv('TRAFFIC_CAPTURE_FILE')
+    app.config['TRAFFIC_CAPTURE_SAMPLE'] = float(os.getenv('TRAFFIC_CAPTURE_SAMPLE', 1.0))
+
+    # Search-box autocomplete: full index/popularity rebuild interval (see src/autocomplete.py)
+    app.config['AUTOCOMPLETE_REFRESH_SECONDS'] = float(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', 600))
+
+    # Pricing rules (see src/pricing.py); defaults: 8% tax, $10 shipping under $100
+    app.config['PRICING_RULES_FILE'] = os.getenv('PRICING_RULES_FILE')
+
+    # Number of reverse proxies in front of the app whose X-Forwarded-For/-Proto are trusted (0: none)
+    app.config['TRUSTED_PROXIES'] = int(os.getenv('TRUSTED_PROXIES', 0))
+
+    # Rate limits for the bcrypt endpoints (see src/ratelimit.py); RATELIMIT_STORAGE=memory for per-process buckets
+    app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'True').lower() == 'true'
+    app.config['RATELIMIT_STORAGE'] = os.getenv('RATELIMIT_STORAGE', os.path.join(BASE_DIR, 'database', 'ratelimit.db'))
+    app.config['RATELIMIT_IP_BURST'] = int(os.getenv('RATELIMIT_IP_BURST', 20))
+    app.config['RATELIMIT_IP_PER_MINUTE'] = float(os.getenv('RATELIMIT_IP_PER_MINUTE', 10))
+    app.config['RATELIMIT_ACCOUNT_BURST'] = int(os.getenv('RATELIMIT_ACCOUNT_BURST', 5))
+    app.config['RATELIMIT_ACCOUNT_PER_MINUTE'] = float(os.getenv('RATELIMIT_ACCOUNT_PER_MINUTE', 2))
+
+    # Request deadlines and load shedding (see src/loadshed.py); LOADSHED_CLASSES overrides per class
+    app.config['LOADSHED_ENABLED'] = os.getenv('LOADSHED_ENABLED', 'True').lower() == 'true'
+    app.config['STRIPE_TIMEOUT'] = float(os.getenv('STRIPE_TIMEOUT', 30))  # seconds, further capped by the deadline
+
+    # Profiling (see src/profiling.py)
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'database', 'profiles'))
+    app.config['PROFILE_SAMPLE_RATES'] = os.getenv('PROFILE_SAMPLE_RATES', '')  # e.g. admin.get_all_orders=0.05
+    app.config['PROFILE_SAMPLE_INTERVAL'] = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))  # seconds
+
+    if config:
+        app.config.update(config)
+
+    if app.config['TRUSTED_PROXIES']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
+    from src.pricing import load_rules
+    app.config.setdefault('PRICING_RULES', load_rules(app))
+    app.config['SQLALCHEMY_BINDS'] = {'archive': app.config['ARCHIVE_DATABASE_URL'], **app.config['SQLALCHEMY_BINDS']}
+
+    os.makedirs(os.path.join(BASE_DIR, 'database'), exist_ok=True)
+
+    _init_extensions(app)
+    _register_blueprints(app)
+    _dispose_engines_after_fork(app)
+
+    return app
+
+
+def _init_extensions(app):
+    from flask_cors import CORS
+    from flask_jwt_extended import JWTManager
+    from src.cli import register_cli
+    from src.dashboard import init_dashboard_feed
+    from src.events import init_events
+    from src.loadshed import init_load_shedding
+    from src.notifications import mail
+    from src.profiling import init_profiling
+    from src.ratelimit import init_rate_limiter
+    from src.revocation import init_token_revocation
+    from src.stock import init_stock_cache
+    from src.autocomplete import init_autocomplete
+    from src.traffic import init_traffic_capture
+
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    jwt = JWTManager(app)
+    db.init_app(app)
+    init_read_replicas(app)
+    init_load_shedding(app)  # First before_request hook: shed before doing any work
+    mail.init_app(app)
+    init_profiling(app)
+    init_traffic_capture(app)
+    init_rate_limiter(app)
+    init_token_revocation(app, jwt)
+    init_events(app)
+    init_dashboard_feed(app)
+    init_stock_cache(app)
+    init_autocomplete(app)
+    register_cli(app)
+
+
+def _register_blueprints(app):
+    from src.routes.user import user_bp
+    from src.routes.products import products_bp
+    from src.routes.orders import orders_bp
+    from src.routes.auth import auth_bp
+    from src.routes.admin import admin_bp
+    from src.routes.payment import payment_bp
+    from src.routes.analytics import analytics_bp
+    from src.routes.uploads import uploads_bp
+
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(user_bp, url_prefix='/api/users')
+    app.register_blueprint(products_bp, url_prefix='/api/products')
+    app.register_blueprint(orders_bp, url_prefix='/api/orders')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(payment_bp, url_prefix='/api/payment')
+    app.register_blueprint(analytics_bp, url_prefix='/api/admin/analytics')
+    app.register_blueprint(uploads_bp, url_prefix='/api/uploads')
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        from src.snapshots import send_precompressed
+
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+            return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            file_path = safe_join(static_folder_path, path)
+            if file_path and os.path.exists(file_path + '.gz'):
+                return send_precompressed(file_path)  # e.g. catalog snapshots
+            return send_from_directory(static_folder_path, path)
         else:
-            return "index.html not found", 404
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "index.html not found", 404
+
+
+# Apps whose engine pools a forked child must drop (see _dispose_inherited_engines)
+_FORK_SAFE_APPS = weakref.WeakSet()
+
+
+def _dispose_engines_after_fork(app):
+    """Drop pooled connections inherited from a preloading parent process"""
+    _FORK_SAFE_APPS.add(app)
+
+
+def _dispose_inherited_engines():
+    for app in list(_FORK_SAFE_APPS):
+        with app.app_context():
+            for engine in db.engines.values():
+                # close=False: the parent still owns those sockets/file handles
+                engine.dispose(close=False)
+
+
+# Registered once per process: apps created later (tests, CLI) join the set instead of adding hooks
+os.register_at_fork(after_in_child=_dispose_inherited_engines)
 
 
 if __name__ == '__main__':
-    # Initialize database and seed data
+    # Development server: prepare the database, then run with the reloader
+    from src.seed import seed_products, create_admin
+    from src.models.product import Product
+
+    app = create_app()
     with app.app_context():
-        db.create_all()
-        
-        # Seed initial data if database is empty
+        from src.migrations import upgrade_database
+        upgrade_database()
+
         if Product.query.count() == 0:
             seed_products()
-        
-        # Create admin user if doesn't exist
-        admin = User.query.filter_by(email='admin@prodesign.com').first()
-        if not admin:
-            admin = User(
-                email='admin@prodesign.com',
-                first_name='Admin',
-                last_name='User',
-                is_admin=True
-            )
-            admin.set_password('admin123')
-            db.session.add(admin)
-            db.session.commit()
-            print("✅ Created admin user: admin@prodesign.com / admin123")
-    
-    app.run(host='0.0.0.0', port=5000, debug=True)
+        create_admin()
+
+        from src.snapshots import rebuild_catalog_snapshots
+        rebuild_catalog_snapshots()
+
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,233 @@
+from datetime import datetime
+import json
+import click
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+from src.database import db
+
+# Lightweight schema upgrades for existing databases.
+#
+# db.create_all() only creates missing tables, so `flask upgrade-db` also adds
+# columns and indexes that were added to existing models, then runs each data
+# migration in MIGRATIONS once (recorded in the schema_migrations table).
+# Migrations must be safe to re-run after a crash part way through.
+
+BATCH_SIZE = 1000
+
+
+def _sync_table(table, engine):
+    """Add columns and indexes declared on `table` but missing from the database"""
+    existing = {c['name'] for c in inspect(engine).get_columns(table.name)}
+
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}'
+            if column.server_default is not None:
+                ddl += f' DEFAULT {column.server_default.arg}'
+            conn.execute(text(ddl))
+            click.echo(f'  + {table.name}.{column.name}')
+
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _applied_migrations():
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations (name VARCHAR(100) PRIMARY KEY, applied_at TIMESTAMP)'
+        ))
+        return {row[0] for row in conn.execute(text('SELECT name FROM schema_migrations'))}
+
+
+def _batches(conn, sql, **params):
+    """Yield rows of `sql` (which must select `id` first and accept :last_id/:limit) in id order"""
+    last_id = 0
+    while True:
+        rows = conn.execute(text(sql), {'last_id': last_id, 'limit': BATCH_SIZE, **params}).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def structured_addresses(conn):
+    """Clean up order address JSON and populate the indexed city/state/zip columns"""
+    from src.models.order import address_index_values
+
+    for rows in _batches(conn, 'SELECT id, shipping_address, billing_address FROM orders '
+                               'WHERE id > :last_id ORDER BY id LIMIT :limit'):
+        updates = []
+        for order_id, shipping, billing in rows:
+            values = {'id': order_id}
+            for name, raw in (('shipping_address', shipping), ('billing_address', billing)):
+                try:
+                    parsed = json.loads(raw) if isinstance(raw, str) else raw
+                except ValueError:
+                    parsed = None
+                values[name] = json.dumps(parsed) if parsed is not None else None
+                if name == 'shipping_address':
+                    values.update(address_index_values(parsed))
+            updates.append(values)
+
+        conn.execute(text(
+            'UPDATE orders SET shipping_address = :shipping_address, billing_address = :billing_address, '
+            'shipping_city = :shipping_city, shipping_state = :shipping_state, shipping_zip = :shipping_zip '
+            'WHERE id = :id'
+        ), updates)
+
+    if conn.dialect.name == 'postgresql':
+        for column in ('shipping_address', 'billing_address'):
+            conn.execute(text(f'ALTER TABLE orders ALTER COLUMN {column} TYPE JSON USING {column}::json'))
+
+
+def order_item_snapshots(conn):
+    """Copy product name and variant size/color/SKU onto existing order items"""
+    for rows in _batches(conn, 'SELECT oi.id, p.name, v.size, v.color, v.sku FROM order_items oi '
+                               'LEFT JOIN products p ON p.id = oi.product_id '
+                               'LEFT JOIN product_variants v ON v.id = oi.variant_id '
+                               'WHERE oi.id > :last_id AND oi.product_name IS NULL ORDER BY oi.id LIMIT :limit'):
+        conn.execute(text(
+            'UPDATE order_items SET product_name = :product_name, size = :size, color = :color, sku = :sku '
+            'WHERE id = :id'
+        ), [{'id': item_id, 'product_name': name, 'size': size, 'color': color, 'sku': sku}
+            for item_id, name, size, color, sku in rows])
+
+
+def customer_directory(conn):
+    """Fill the users search columns and lifetime order aggregates (archived orders included)"""
+    def lower(value):
+        return value.strip().lower() if value else None
+
+    for rows in _batches(conn, 'SELECT id, email, first_name, last_name FROM users '
+                               'WHERE id > :last_id ORDER BY id LIMIT :limit'):
+        conn.execute(text(
+            'UPDATE users SET search_email = :email, search_first_name = :first_name, '
+            'search_last_name = :last_name WHERE id = :id'
+        ), [{'id': user_id, 'email': lower(email), 'first_name': lower(first), 'last_name': lower(last)}
+            for user_id, email, first, last in rows])
+
+    totals_sql = ("SELECT user_id, COUNT(*), SUM(CASE WHEN payment_status = 'paid' THEN total ELSE 0 END), "
+                  'MAX(created_at) FROM {table} WHERE user_id IS NOT NULL GROUP BY user_id')
+    totals = {}
+    sources = [(conn, 'orders')]
+    with db.engines['archive'].connect() as archive:
+        sources.append((archive, 'archived_orders'))
+        for source, table in sources:
+            for user_id, count, spent, last_order_at in source.execute(text(totals_sql.format(table=table))):
+                previous = totals.get(user_id, (0, 0, None))
+                totals[user_id] = (previous[0] + count, previous[1] + (spent or 0),
+                                   max(filter(None, (previous[2], last_order_at)), default=None))
+
+    user_ids = sorted(totals)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        conn.execute(text(
+            'UPDATE users SET order_count = :count, total_spent = :spent, last_order_at = :last_order_at WHERE id = :id'
+        ), [{'id': user_id, 'count': totals[user_id][0], 'spent': totals[user_id][1], 'last_order_at': totals[user_id][2]}
+            for user_id in user_ids[start:start + BATCH_SIZE]])
+
+
+def order_search(conn):
+    """Create the orders full-text index (see src/order_search.py)"""
+    from src.order_search import create_search_index
+    create_search_index(conn)
+
+
+def _rebuild_autoincrement(conn, table, issued):
+    """Recreate `table` as AUTOINCREMENT (SQLite), continuing ids after `issued` at least"""
+    rebuild = f'{table.name}_rebuild'
+    columns = ', '.join(column.name for column in table.columns)
+    conn.execute(text(f'DROP TABLE IF EXISTS {rebuild}'))
+    conn.execute(text(str(CreateTable(table).compile(conn)).replace(
+        f'CREATE TABLE {table.name} ', f'CREATE TABLE {rebuild} ', 1)))
+    # The INSERT opens the transaction, so the swap below commits or rolls back as a whole
+    conn.execute(text(f'INSERT INTO {rebuild} ({columns}) SELECT {columns} FROM {table.name}'))
+
+    issued = max(issued, conn.execute(text(f'SELECT COALESCE(MAX(id), 0) FROM {table.name}')).scalar())
+    conn.execute(text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': rebuild})
+    conn.execute(text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'), {'name': rebuild, 'seq': issued})
+
+    conn.execute(text(f'DROP TABLE {table.name}'))
+    conn.execute(text(f'ALTER TABLE {rebuild} RENAME TO {table.name}'))
+    for index in table.indexes:
+        index.create(conn)
+
+
+def _is_autoincrement(conn, table):
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                       {'name': table.name}).scalar()
+    return 'AUTOINCREMENT' in ddl.upper()
+
+
+def domain_event_autoincrement(conn):
+    """Rebuild domain_events as AUTOINCREMENT (SQLite), so pruned event ids are never reissued"""
+    from src.models.event import DomainEvent, OutboxCursor
+
+    if conn.dialect.name != 'sqlite':
+        return  # Sequences never hand out an id twice
+    if _is_autoincrement(conn, DomainEvent.__table__):
+        return
+
+    # Continue after the highest id ever handed to a consumer, even if that event was pruned
+    _rebuild_autoincrement(conn, DomainEvent.__table__, conn.execute(
+        text(f'SELECT COALESCE(MAX(last_event_id), 0) FROM {OutboxCursor.__tablename__}')
+    ).scalar())
+
+
+def order_autoincrement(conn):
+    """Rebuild orders and order_items as AUTOINCREMENT (SQLite), so archived order ids are never reissued"""
+    from src.models.archive import ArchivedOrder
+    from src.models.order import Order, OrderItem
+    from src.order_search import create_search_index
+
+    if conn.dialect.name != 'sqlite':
+        return  # Sequences never hand out an id twice
+
+    # Without AUTOINCREMENT, archiving the newest orders would let their ids
+    # (and their items' ids, kept in the archived JSON) be handed out again
+    archived_order_id, archived_item_id = 0, 0
+    with db.engines['archive'].connect() as archive:
+        for rows in _batches(archive, f'SELECT id, data FROM {ArchivedOrder.__tablename__} '
+                                      'WHERE id > :last_id ORDER BY id LIMIT :limit'):
+            for order_id, data in rows:
+                data = json.loads(data) if isinstance(data, str) else data
+                archived_order_id = max(archived_order_id, order_id)
+                archived_item_id = max([archived_item_id] + [item.get('id') or 0 for item in data.get('items', [])])
+
+    if not _is_autoincrement(conn, Order.__table__):
+        _rebuild_autoincrement(conn, Order.__table__, archived_order_id)
+        # Dropping orders dropped its full-text triggers; recreate them and reindex
+        create_search_index(conn)
+    if not _is_autoincrement(conn, OrderItem.__table__):
+        _rebuild_autoincrement(conn, OrderItem.__table__, archived_item_id)
+
+
+# Applied in order; never rename or reorder existing entries
+MIGRATIONS = [
+    ('0001_structured_addresses', structured_addresses),
+    ('0002_order_item_snapshots', order_item_snapshots),
+    ('0003_customer_directory', customer_directory),
+    ('0004_order_search', order_search),
+    ('0005_domain_event_autoincrement', domain_event_autoincrement),
+    ('0006_order_autoincrement', order_autoincrement),
+]
+
+
+def upgrade_database():
+    """Bring an existing database up to date with the models"""
+    db.create_all()
+
+    for bind_key, metadata in db.metadatas.items():
+        for table in metadata.sorted_tables:
+            _sync_table(table, db.engines[bind_key])
+
+    applied = _applied_migrations()
+    for name, migration in MIGRATIONS:
+        if name in applied:
+            continue
+        click.echo(f'Applying {name}...')
+        with db.engine.begin() as conn:
+            migration(conn)
+            conn.execute(text('INSERT INTO schema_migrations (name, applied_at) VALUES (:name, :applied_at)'),
+                         {'name': name, 'applied_at': datetime.utcnow()})
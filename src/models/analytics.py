@@ -0,0 +1,74 @@
+from src.database import db
+
+
+class SalesDailyRollup(db.Model):
+    """Line-item sales aggregated per day x product x variant x status"""
+    __tablename__ = 'sales_daily_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # Day the order was placed (UTC)
+    product_id = db.Column(db.Integer, nullable=False)
+    variant_id = db.Column(db.Integer, nullable=False, default=0)  # 0 when the line has no variant
+    category = db.Column(db.String(50))  # Denormalized so category reports need no join
+    status = db.Column(db.String(50), nullable=False)
+    payment_status = db.Column(db.String(50), nullable=False)
+
+    line_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)  # Sum of price_at_purchase * quantity
+
+    __table_args__ = (
+        # Leading `day` column also serves time-range scans
+        db.UniqueConstraint('day', 'product_id', 'variant_id', 'status', 'payment_status',
+                            name='uq_sales_daily_rollup_key'),
+        db.Index('ix_sales_daily_rollups_category_day', 'category', 'day'),
+    )
+
+    KEY_COLUMNS = ('day', 'product_id', 'variant_id', 'status', 'payment_status')
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'product_id': self.product_id,
+            'variant_id': self.variant_id or None,
+            'category': self.category,
+            'status': self.status,
+            'payment_status': self.payment_status,
+            'line_count': self.line_count,
+            'units': self.units,
+            'revenue': self.revenue
+        }
+
+
+class OrderDailyRollup(db.Model):
+    """Order totals aggregated per day x status"""
+    __tablename__ = 'order_daily_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    payment_status = db.Column(db.String(50), nullable=False)
+
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(db.Float, nullable=False, default=0.0)
+    tax = db.Column(db.Float, nullable=False, default=0.0)
+    shipping = db.Column(db.Float, nullable=False, default=0.0)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'status', 'payment_status', name='uq_order_daily_rollup_key'),
+    )
+
+    KEY_COLUMNS = ('day', 'status', 'payment_status')
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'status': self.status,
+            'payment_status': self.payment_status,
+            'order_count': self.order_count,
+            'subtotal': self.subtotal,
+            'tax': self.tax,
+            'shipping': self.shipping,
+            'total': self.total
+        }
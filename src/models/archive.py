@@ -0,0 +1,28 @@
+from datetime import datetime
+from src.database import db
+
+class ArchivedOrder(db.Model):
+    """Delivered/cancelled order moved out of the orders table (see src/archive.py)"""
+    __bind_key__ = 'archive'  # Separate database (ARCHIVE_DATABASE_URL)
+    __tablename__ = 'archived_orders'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Original orders.id
+    order_number = db.Column(db.String(50), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, index=True)  # No foreign key: users live in the primary database
+    status = db.Column(db.String(50))
+    payment_status = db.Column(db.String(50))
+    total = db.Column(db.Float)
+    
+    # Order.to_dict() (including items) as it was when archived
+    data = db.Column(db.JSON, nullable=False)
+    
+    created_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            **self.data,
+            'archived': True,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None
+        }
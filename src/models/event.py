@@ -0,0 +1,65 @@
+from datetime import datetime
+from src.database import db
+
+class DomainEvent(db.Model):
+    __tablename__ = 'domain_events'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Delivery order; subscribers resume from the last id they saw
+    topic = db.Column(db.String(50), nullable=False)  # Aggregate type, e.g. order
+    subject_id = db.Column(db.Integer)  # Aggregate id, e.g. the order id
+    kind = db.Column(db.String(50), nullable=False)  # e.g. order.status
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        # Replay for one subject after a reconnect (Last-Event-ID)
+        db.Index('ix_domain_events_topic_subject_id', 'topic', 'subject_id', 'id'),
+        # Without AUTOINCREMENT SQLite hands out max(id) + 1, so pruning the newest
+        # events would reissue ids that streams and outbox cursors have already passed
+        {'sqlite_autoincrement': True}
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'topic': self.topic,
+            'subject_id': self.subject_id,
+            'kind': self.kind,
+            'payload': self.payload,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class OutboxCursor(db.Model):
+    __tablename__ = 'outbox_cursors'
+    
+    consumer = db.Column(db.String(50), primary_key=True)  # Name passed to register_consumer()
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)  # Every event up to here was delivered
+    delivered = db.Column(db.Integer, nullable=False, default=0)  # Events handed to the consumer, redeliveries included
+    
+    # Failure of the event after the cursor; delivery resumes at retry_at
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    retry_at = db.Column(db.DateTime)
+    
+    # Last batch, for throughput
+    last_batch_size = db.Column(db.Integer)
+    last_batch_ms = db.Column(db.Float)
+    
+    locked_by = db.Column(db.String(50))  # Relay lease: one relay per consumer keeps events in order
+    locked_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'consumer': self.consumer,
+            'last_event_id': self.last_event_id,
+            'delivered': self.delivered,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'retry_at': self.retry_at.isoformat() if self.retry_at else None,
+            'last_batch_size': self.last_batch_size,
+            'last_batch_ms': self.last_batch_ms,
+            'locked_at': self.locked_at.isoformat() if self.locked_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,40 @@
+from datetime import datetime
+from src.database import db
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(50), nullable=False)  # Handler name, e.g. mail
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=8)
+    last_error = db.Column(db.Text)
+    
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Not picked up before this time
+    locked_by = db.Column(db.String(50))  # Worker claim token while running
+    locked_at = db.Column(db.DateTime)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        # The worker's claim query: due jobs of a queue in run_at order
+        db.Index('ix_jobs_queue_status_run_at', 'queue', 'status', 'run_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'queue': self.queue,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'last_error': self.last_error,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
@@ -2,6 +2,29 @@ from datetime import datetime
 import secrets
 from src.database import db
 from src.models.product import Product, ProductVariant
+from sqlalchemy.orm import validates
+
+
+def _address_field(address, *keys):
+    for key in keys:
+        value = address.get(key)
+        if value:
+            return str(value).strip()
+    return None
+
+
+def address_index_values(address):
+    """Normalized city/state/zip columns used for indexed order filtering"""
+    if not isinstance(address, dict):
+        address = {}
+    city = _address_field(address, 'city')
+    state = _address_field(address, 'state')
+    zip_code = _address_field(address, 'zip', 'zip_code', 'zipCode', 'postal_code')
+    return {
+        'shipping_city': city.lower() if city else None,
+        'shipping_state': state.upper() if state else None,
+        'shipping_zip': zip_code
+    }
 
 class Order(db.Model):
     __tablename__ = 'orders'
@@ -26,22 +49,45 @@ class Order(db.Model):
     payment_status = db.Column(db.String(50), default='pending')  # pending, paid, failed, refunded
     payment_intent_id = db.Column(db.String(200))  # Stripe payment intent ID
     
-    # Addresses (stored as JSON strings)
-    shipping_address = db.Column(db.Text)
-    billing_address = db.Column(db.Text)
+    # Addresses (native JSON; parsed once when the row is loaded)
+    shipping_address = db.Column(db.JSON)
+    billing_address = db.Column(db.JSON)
+    
+    # Denormalized from shipping_address for indexed admin filtering
+    shipping_city = db.Column(db.String(100), index=True)
+    shipping_state = db.Column(db.String(50), index=True)
+    shipping_zip = db.Column(db.String(20), index=True)
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Bumped by every ORM update; see src/concurrency.py
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
     # Relationships
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        # Newest-first keyset pagination and date/amount ranges (see src/order_search.py)
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_total', 'total'),
+        # Never reissue the id of an order that was archived (or deleted) as the newest row
+        {'sqlite_autoincrement': True}
+    )
+    __mapper_args__ = {'version_id_col': version}
+    
     def __init__(self, **kwargs):
         super(Order, self).__init__(**kwargs)
         if not self.order_number:
             self.order_number = self.generate_order_number()
     
+    @validates('shipping_address')
+    def _index_shipping_address(self, key, address):
+        for column, value in address_index_values(address).items():
+            setattr(self, column, value)
+        return address
+    
     @staticmethod
     def generate_order_number():
         """Generate a unique order number"""
@@ -49,44 +95,34 @@ class Order(db.Model):
         random_part = secrets.token_hex(4).upper()
         return f'PDC-{timestamp}-{random_part}'
     
-    def to_dict(self):
-        import json
-        
-        # Parse JSON strings for addresses
-        shipping_addr = None
-        billing_addr = None
-        
-        try:
-            if self.shipping_address:
-                shipping_addr = json.loads(self.shipping_address) if isinstance(self.shipping_address, str) else self.shipping_address
-        except:
-            shipping_addr = None
-            
-        try:
-            if self.billing_address:
-                billing_addr = json.loads(self.billing_address) if isinstance(self.billing_address, str) else self.billing_address
-        except:
-            billing_addr = None
-        
-        return {
-            'id': self.id,
-            'order_number': self.order_number,
-            'user_id': self.user_id,
-            'status': self.status,
-            'customer_email': self.customer_email,
-            'customer_name': self.customer_name,
-            'customer_phone': self.customer_phone,
-            'subtotal': self.subtotal,
-            'tax': self.tax,
-            'shipping': self.shipping,
-            'total': self.total,
-            'payment_status': self.payment_status,
-            'payment_method': 'manual',  # Default payment method
-            'shipping_address': shipping_addr,
-            'billing_address': billing_addr,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'items': [item.to_dict() for item in self.items]
-        }
+    # Output key -> getter; to_dict(fields=...) only evaluates the requested keys
+    SERIALIZERS = {
+        'id': lambda o: o.id,
+        'order_number': lambda o: o.order_number,
+        'user_id': lambda o: o.user_id,
+        'status': lambda o: o.status,
+        'customer_email': lambda o: o.customer_email,
+        'customer_name': lambda o: o.customer_name,
+        'customer_phone': lambda o: o.customer_phone,
+        'subtotal': lambda o: o.subtotal,
+        'tax': lambda o: o.tax,
+        'shipping': lambda o: o.shipping,
+        'total': lambda o: o.total,
+        'payment_status': lambda o: o.payment_status,
+        'payment_method': lambda o: 'manual',  # Default payment method
+        'shipping_address': lambda o: o.shipping_address,
+        'billing_address': lambda o: o.billing_address,
+        'created_at': lambda o: o.created_at.isoformat() if o.created_at else None,
+        'version': lambda o: o.version,
+        'items': lambda o: [item.to_dict() for item in o.items]
+    }
+    
+    # Columns shown by list screens (?view=summary)
+    SUMMARY_FIELDS = ('id', 'order_number', 'status', 'customer_name', 'customer_email',
+                      'total', 'payment_status', 'created_at', 'version')
+    
+    def to_dict(self, fields=None):
+        return {key: get(self) for key, get in self.SERIALIZERS.items() if fields is None or key in fields}
 
 
 class OrderItem(db.Model):
@@ -100,6 +136,12 @@ class OrderItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False, default=1)
     price_at_purchase = db.Column(db.Float, nullable=False)
     
+    # Catalog details as they were at purchase (later product edits/deletes don't change the order)
+    product_name = db.Column(db.String(200))
+    size = db.Column(db.String(10))
+    color = db.Column(db.String(50))
+    sku = db.Column(db.String(100))
+    
     # Custom order fields
     custom_text = db.Column(db.Text)
     custom_image_url = db.Column(db.String(500))
@@ -109,15 +151,20 @@ class OrderItem(db.Model):
     product = db.relationship('Product', backref='order_items')
     variant = db.relationship('ProductVariant', backref='order_items')
     
+    # Archived orders keep their items' ids in the archived JSON; never reissue them
+    __table_args__ = {'sqlite_autoincrement': True}
+    
     def to_dict(self):
         return {
             'id': self.id,
             'order_id': self.order_id,
             'product_id': self.product_id,
-            'product_name': self.product.name if self.product else None,
+            'product_name': self.product_name,
             'variant_id': self.variant_id,
-            'variant_size': self.variant.size if self.variant else None,
-            'size': self.variant.size if self.variant else None,  # Add size field for frontend
+            'variant_size': self.size,
+            'size': self.size,  # Add size field for frontend
+            'color': self.color,
+            'sku': self.sku,
             'quantity': self.quantity,
             'price': self.price_at_purchase,  # Add price field for frontend compatibility
             'price_at_purchase': self.price_at_purchase,
@@ -135,37 +182,54 @@ class CustomOrder(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=True)
     
-    # Design details
+    # Design details (unbounded text is deferred; it loads as one group on first access)
     design_type = db.Column(db.String(50))  # text, image, logo
-    design_data = db.Column(db.Text)  # JSON string
+    design_data = db.deferred(db.Column(db.Text), group='details')  # JSON string
     front_design = db.Column(db.String(500))
     back_design = db.Column(db.String(500))
-    notes = db.Column(db.Text)
+    notes = db.deferred(db.Column(db.Text), group='details')
     
     # Status
     status = db.Column(db.String(50), default='pending_approval')  # pending_approval, approved, in_production, completed
-    admin_notes = db.Column(db.Text)
+    admin_notes = db.deferred(db.Column(db.Text), group='details')
     
     # Contact info
     contact_email = db.Column(db.String(200))
     contact_phone = db.Column(db.String(50))
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'order_id': self.order_id,
-            'design_type': self.design_type,
-            'design_data': self.design_data,
-            'front_design': self.front_design,
-            'back_design': self.back_design,
-            'notes': self.notes,
-            'status': self.status,
-            'admin_notes': self.admin_notes,
-            'contact_email': self.contact_email,
-            'contact_phone': self.contact_phone,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    # Bumped by every ORM update; see src/concurrency.py
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __table_args__ = (
+        # Serves both ?status= filtering and the created_at sort of the admin listing
+        db.Index('ix_custom_orders_status_created_at', 'status', 'created_at'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+    
+    # Output key -> getter; to_dict(fields=...) only evaluates the requested keys
+    SERIALIZERS = {
+        'id': lambda co: co.id,
+        'user_id': lambda co: co.user_id,
+        'order_id': lambda co: co.order_id,
+        'design_type': lambda co: co.design_type,
+        'design_data': lambda co: co.design_data,
+        'front_design': lambda co: co.front_design,
+        'back_design': lambda co: co.back_design,
+        'notes': lambda co: co.notes,
+        'status': lambda co: co.status,
+        'admin_notes': lambda co: co.admin_notes,
+        'contact_email': lambda co: co.contact_email,
+        'contact_phone': lambda co: co.contact_phone,
+        'created_at': lambda co: co.created_at.isoformat() if co.created_at else None,
+        'version': lambda co: co.version
+    }
+    
+    # Everything except the deferred text columns
+    SUMMARY_FIELDS = ('id', 'user_id', 'order_id', 'design_type', 'front_design', 'back_design',
+                      'status', 'contact_email', 'contact_phone', 'created_at', 'version')
+    
+    def to_dict(self, fields=None):
+        return {key: get(self) for key, get in self.SERIALIZERS.items() if fields is None or key in fields}
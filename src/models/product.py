@@ -6,7 +6,7 @@ class Product(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
-    description = db.Column(db.Text)
+    description = db.deferred(db.Column(db.Text))  # Only loaded by detail/full views
     category = db.Column(db.String(50), nullable=False)  # tshirt, hoodie, custom
     base_price = db.Column(db.Float, nullable=False)
     image_url = db.Column(db.String(500))
@@ -14,21 +14,33 @@ class Product(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Bumped by every ORM update; see src/concurrency.py
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
     # Relationships
     variants = db.relationship('ProductVariant', backref='product', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'category': self.category,
-            'base_price': self.base_price,
-            'image_url': self.image_url,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'variants': [v.to_dict() for v in self.variants]
-        }
+    __mapper_args__ = {'version_id_col': version}
+    
+    # Output key -> getter; to_dict(fields=...) only evaluates the requested keys
+    SERIALIZERS = {
+        'id': lambda p: p.id,
+        'name': lambda p: p.name,
+        'description': lambda p: p.description,
+        'category': lambda p: p.category,
+        'base_price': lambda p: p.base_price,
+        'image_url': lambda p: p.image_url,
+        'is_active': lambda p: p.is_active,
+        'created_at': lambda p: p.created_at.isoformat() if p.created_at else None,
+        'version': lambda p: p.version,
+        'variants': lambda p: [v.to_dict() for v in p.variants]
+    }
+    
+    # Columns shown by product grids (?view=summary)
+    SUMMARY_FIELDS = ('id', 'name', 'category', 'base_price', 'image_url')
+    
+    def to_dict(self, fields=None):
+        return {key: get(self) for key, get in self.SERIALIZERS.items() if fields is None or key in fields}
 
 
 class ProductVariant(db.Model):
@@ -1,6 +1,7 @@
 from datetime import datetime
 import bcrypt
 from src.database import db
+from sqlalchemy.orm import validates
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -14,12 +15,53 @@ class User(db.Model):
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Lifetime aggregates, maintained with each order (see src/analytics.py)
+    order_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_spent = db.Column(db.Float, nullable=False, default=0.0, server_default='0')  # Sum of paid order totals
+    last_order_at = db.Column(db.DateTime)
+    
+    # Lowercased copies for indexed prefix search (see prefix_search)
+    search_email = db.Column(db.String(200))
+    search_first_name = db.Column(db.String(100))
+    search_last_name = db.Column(db.String(100))
+    
     # Relationships
     orders = db.relationship('Order', backref='user', lazy=True)
+    
+    __table_args__ = (
+        # Customer directory sorted by spend / recency (is_admin = false first)
+        db.Index('ix_users_is_admin_total_spent', 'is_admin', 'total_spent'),
+        db.Index('ix_users_is_admin_last_order_at', 'is_admin', 'last_order_at'),
+        # Prefix search; the trailing columns let matches be filtered and counted from the index alone
+        db.Index('ix_users_search_email', 'search_email', 'is_admin'),
+        db.Index('ix_users_search_first_name', 'search_first_name', 'search_last_name', 'is_admin'),
+        db.Index('ix_users_search_last_name', 'search_last_name', 'is_admin'),
+    )
+    
+    # Directory sort keys -> ORDER BY
+    DIRECTORY_SORTS = {
+        'newest': (id.desc(),),
+        'spend': (total_spent.desc(), id.desc()),
+        'last_order': (last_order_at.desc(), id.desc())
+    }
 
     def __repr__(self):
         return f'<User {self.email}>'
     
+    @validates('email', 'first_name', 'last_name')
+    def _index_search(self, key, value):
+        setattr(self, f'search_{key}', value.strip().lower() if value else None)
+        return value
+    
+    @classmethod
+    def prefix_search(cls, text):
+        """Filter matching `text` as a prefix of the email, first or last name ("jo do": first + last)"""
+        words = text.strip().lower().split()
+        if len(words) >= 2:
+            return db.and_(_prefix(cls.search_first_name, words[0]), _prefix(cls.search_last_name, ' '.join(words[1:])))
+        return db.or_(_prefix(cls.search_email, words[0]), _prefix(cls.search_first_name, words[0]),
+                      _prefix(cls.search_last_name, words[0]))
+    
     def set_password(self, password):
         """Hash and set the user's password"""
         self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -38,3 +80,18 @@ class User(db.Model):
             'is_admin': self.is_admin,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+    
+    def customer_dict(self):
+        """to_dict() plus the lifetime order aggregates"""
+        return {
+            **self.to_dict(),
+            'order_count': self.order_count,
+            'total_spent': round(self.total_spent or 0, 2),
+            'last_order_at': self.last_order_at.isoformat() if self.last_order_at else None
+        }
+
+
+def _prefix(column, prefix):
+    # A range instead of LIKE so the column's index is used (LIKE ignores it on
+    # SQLite unless case_sensitive_like is on)
+    return db.and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
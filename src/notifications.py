@@ -0,0 +1,80 @@
+from flask import current_app
+from flask_mail import Mail, Message
+from src.database import db
+from src.jobs import enqueue, register_handler
+from src.models.order import Order
+
+# Order emails are queued with the order change and sent by the job worker,
+# so checkout never waits on SMTP.
+
+mail = Mail()
+
+STATUS_MESSAGES = {
+    'processing': 'We have received your payment and your order is being prepared.',
+    'shipped': 'Your order is on its way!',
+    'delivered': 'Your order has been delivered. Thank you for shopping with Pro Design!',
+    'cancelled': 'Your order has been cancelled. Contact us if this is unexpected.'
+}
+
+
+def queue_order_email(order, template):
+    """Queue an order email in the current transaction (no-op without a customer email)"""
+    if not order.customer_email:
+        return None
+    return enqueue('mail', {'template': template, 'order_id': order.id, 'status': order.status})
+
+
+def _order_lines(order):
+    lines = []
+    for item in order.items:
+        name = item.product_name or f'Product #{item.product_id}'
+        size = f' ({item.size})' if item.size else ''
+        lines.append(f'  {item.quantity} x {name}{size} - ${item.price_at_purchase * item.quantity:.2f}')
+    return '\n'.join(lines)
+
+
+def build_message(payload):
+    """Render the email for a mail job (None if there is nothing to send)"""
+    order = db.session.get(Order, payload['order_id'])
+    if not order or not order.customer_email:
+        return None
+
+    greeting = f'Hi {order.customer_name},' if order.customer_name else 'Hi,'
+
+    if payload['template'] == 'order_confirmation':
+        subject = f'Order confirmation {order.order_number}'
+        body = (
+            f'{greeting}\n\nThank you for your order!\n\n'
+            f'Order number: {order.order_number}\n\n{_order_lines(order)}\n\n'
+            f'Subtotal: ${order.subtotal:.2f}\nTax: ${order.tax:.2f}\n'
+            f'Shipping: ${order.shipping:.2f}\nTotal: ${order.total:.2f}\n\n'
+            'Pro Design\n334-559-2010'
+        )
+    elif payload['template'] == 'order_status':
+        status = payload.get('status') or order.status
+        subject = f'Order {order.order_number} is {status}'
+        body = (
+            f'{greeting}\n\n'
+            f"{STATUS_MESSAGES.get(status, f'Your order status is now: {status}.')}\n\n"
+            f'Order number: {order.order_number}\n\nPro Design\n334-559-2010'
+        )
+    else:
+        raise ValueError(f"Unknown email template: {payload['template']}")
+
+    return Message(subject=subject, recipients=[order.customer_email], body=body,
+                   sender=current_app.config.get('MAIL_DEFAULT_SENDER'))
+
+
+@register_handler('mail')
+def send_mail_batch(jobs):
+    """Send a batch of mail jobs over one SMTP connection"""
+    errors = {}
+    with mail.connect() as connection:
+        for job in jobs:
+            try:
+                message = build_message(job.payload)
+                if message is not None:
+                    connection.send(message)
+            except Exception as e:
+                errors[job.id] = str(e)
+    return errors
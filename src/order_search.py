@@ -0,0 +1,167 @@
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from src.database import db
+from src.models.order import Order
+
+# Admin order search.
+#
+# On SQLite, orders_fts is an FTS5 index with the trigram tokenizer over
+# order_number, customer_email and customer_name, kept in sync with the
+# orders table by triggers. Trigrams turn any substring of 3+ characters
+# ("1A2B", "gmail", "smi") into an index lookup instead of a LIKE '%...%'
+# scan of every order. Created by `flask upgrade-db`; until then (and on
+# other databases) the same filters fall back to ILIKE.
+#
+# Results are newest first and paginated by keyset: the cursor is the
+# (created_at, id) of the last row returned, so page 1000 costs the same as
+# page 1 and rows inserted meanwhile neither shift nor repeat the listing.
+# Text searches are ordered by id, which follows creation order, because
+# that is the order FTS5 can return matches in without collecting them all.
+
+FTS_TABLE = 'orders_fts'
+
+# Search parameter -> indexed column ('q' searches all of them)
+TEXT_FIELDS = {
+    'order_number': 'order_number',
+    'email': 'customer_email',
+    'name': 'customer_name'
+}
+
+MIN_TERM_LENGTH = 3  # Shortest string a trigram index can look up
+
+FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "order_number, customer_email, customer_name, content='orders', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON orders BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, order_number, customer_email, customer_name) "
+    "VALUES (new.id, new.order_number, new.customer_email, new.customer_name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON orders BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, order_number, customer_email, customer_name) "
+    "VALUES ('delete', old.id, old.order_number, old.customer_email, old.customer_name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update "
+    "AFTER UPDATE OF order_number, customer_email, customer_name ON orders BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, order_number, customer_email, customer_name) "
+    "VALUES ('delete', old.id, old.order_number, old.customer_email, old.customer_name); "
+    f"INSERT INTO {FTS_TABLE}(rowid, order_number, customer_email, customer_name) "
+    "VALUES (new.id, new.order_number, new.customer_email, new.customer_name); END"
+]
+
+
+class SearchError(ValueError):
+    """Invalid search parameters (reported as 400)"""
+
+
+def create_search_index(conn):
+    """Create the FTS index and its triggers (SQLite only) and index existing orders"""
+    if conn.dialect.name != 'sqlite':
+        return
+    for statement in FTS_DDL:
+        conn.execute(text(statement))
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def _fts_available():
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    return db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).first() is not None
+
+
+def _text_params(params):
+    """(column or None for all, term) pairs for `q` and the per-field params"""
+    wanted = [(None, params['q'])] if params.get('q') else []
+    wanted += [(column, params[name]) for name, column in TEXT_FIELDS.items() if params.get(name)]
+
+    pairs = []
+    for column, value in wanted:
+        for term in value.split():
+            if len(term) < MIN_TERM_LENGTH:
+                raise SearchError(f'Search terms must be at least {MIN_TERM_LENGTH} characters')
+            pairs.append((column, term))
+    return pairs
+
+
+def _fts_match(pairs):
+    # Every term is a quoted string (no FTS syntax from the user), all must match
+    phrases = []
+    for column, term in pairs:
+        phrase = '"' + term.replace('"', '""') + '"'
+        phrases.append(f'{column} : {phrase}' if column else phrase)
+    return ' AND '.join(phrases)
+
+
+def _like_filters(pairs):
+    filters = []
+    for column, term in pairs:
+        columns = [getattr(Order, c) for c in ([column] if column else TEXT_FIELDS.values())]
+        filters.append(db.or_(*(c.ilike(f'%{term}%') for c in columns)))
+    return filters
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise SearchError(f'{name} must be an ISO date or datetime')
+
+
+def _parse_total(value, name):
+    try:
+        return float(value)
+    except ValueError:
+        raise SearchError(f'{name} must be a number')
+
+
+def range_filters(params):
+    """created_from/created_to (ISO; a bare end date includes that whole day) and min_total/max_total"""
+    filters = []
+    if params.get('created_from'):
+        filters.append(Order.created_at >= _parse_date(params['created_from'], 'created_from'))
+    if params.get('created_to'):
+        end = _parse_date(params['created_to'], 'created_to')
+        if len(params['created_to']) == 10:
+            filters.append(Order.created_at < end + timedelta(days=1))
+        else:
+            filters.append(Order.created_at <= end)
+    if params.get('min_total'):
+        filters.append(Order.total >= _parse_total(params['min_total'], 'min_total'))
+    if params.get('max_total'):
+        filters.append(Order.total <= _parse_total(params['max_total'], 'max_total'))
+    return filters
+
+
+def encode_cursor(order):
+    return base64.urlsafe_b64encode(f'{order.created_at.isoformat()}|{order.id}'.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        raise SearchError('Invalid cursor')
+
+
+def apply_search(query, params):
+    """Add the search filters, newest-first order and cursor position (params['cursor']) to an Order query"""
+    pairs = _text_params(params)
+    query = query.filter(*range_filters(params))
+    after = _decode_cursor(params['cursor']) if params.get('cursor') else None
+
+    if pairs and _fts_available():
+        # Walk the index newest-first (ids follow creation order) and stop as
+        # soon as a page is filled, however many orders match
+        fts = db.table(FTS_TABLE, db.column('rowid'))
+        query = query.join(fts, fts.c.rowid == Order.id).filter(
+            text(f'{FTS_TABLE} MATCH :match').bindparams(match=_fts_match(pairs)))
+        if after:
+            query = query.filter(fts.c.rowid < after[1])
+        return query.order_by(fts.c.rowid.desc())
+
+    query = query.filter(*_like_filters(pairs))
+    if after:
+        query = query.filter(db.or_(Order.created_at < after[0],
+                                    db.and_(Order.created_at == after[0], Order.id < after[1])))
+    return query.order_by(Order.created_at.desc(), Order.id.desc())
@@ -0,0 +1,221 @@
+from datetime import datetime, timedelta
+import importlib
+import json
+import logging
+import os
+import time
+import uuid
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from src.database import db
+from src.events import event_dict
+from src.jobs import retry_delay
+from src.models.event import DomainEvent, OutboxCursor
+
+# Transactional outbox relay.
+#
+# domain_events is the outbox: emit() writes the event in the same commit as
+# the order/payment change, so downstream work (warehouse sync, exports,
+# cache invalidation elsewhere...) never runs inline in create_order,
+# confirm_payment or the Stripe webhook, and never sees a change that rolled
+# back. `flask outbox-relay` hands committed events to the consumers
+# registered with register_consumer(), in batches, and records how far each
+# consumer got in outbox_cursors.
+#
+# Delivery is at least once: the cursor only moves after the handler
+# returns, so a crash redelivers the batch, and consumers must be idempotent
+# (the event id is a natural dedup key). Events are delivered in id order,
+# which is commit order (SQLite has a single writer; on PostgreSQL emit()
+# serializes event-writing commits, see src/events.py), so the cursor never
+# passes an event that commits later and the events of one order always
+# arrive in the order they happened. When a batch fails it is redelivered one event at a
+# time up to the failing event; the cursor stops there and the consumer is
+# retried with the job queue's backoff. A relay holds a lease on each
+# consumer's cursor so two relays never deliver to the same consumer at once.
+
+logger = logging.getLogger(__name__)
+
+# consumer name -> (handler(events), kinds delivered or None for all)
+CONSUMERS = {}
+
+# A relay that has been silent this long loses its consumers to another one
+LEASE_TIMEOUT = timedelta(minutes=2)
+
+
+def register_consumer(name, kinds=None):
+    """Decorator registering handler(events) as outbox consumer `name`"""
+    def decorator(fn):
+        CONSUMERS[name] = (fn, frozenset(kinds) if kinds else None)
+        return fn
+    return decorator
+
+
+def load_consumer_modules(app):
+    """Import the modules in OUTBOX_CONSUMER_MODULES so their consumers register"""
+    for module in filter(None, (m.strip() for m in app.config['OUTBOX_CONSUMER_MODULES'].split(','))):
+        importlib.import_module(module)
+
+
+def _claim(name, token):
+    """Take (or renew) the lease on `name`'s cursor; returns the cursor or None if another relay has it"""
+    now = datetime.utcnow()
+    if db.session.get(OutboxCursor, name) is None:
+        try:
+            db.session.add(OutboxCursor(consumer=name))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Created by another relay
+
+    claimed = db.session.execute(
+        db.update(OutboxCursor)
+        .where(OutboxCursor.consumer == name, db.or_(
+            OutboxCursor.locked_by.is_(None),
+            OutboxCursor.locked_by == token,
+            OutboxCursor.locked_at < now - LEASE_TIMEOUT
+        ))
+        .values(locked_by=token, locked_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return db.session.get(OutboxCursor, name, populate_existing=True) if claimed else None
+
+
+def _deliver(handler, events):
+    """Hand `events` to the handler; returns (id of the last delivered event or None, error)"""
+    try:
+        handler(events)
+        return events[-1]['id'], None
+    except Exception as e:
+        batch_error = e
+
+    # Find the failing event; the ones before it are delivered (again)
+    last_id = None
+    for event in events:
+        try:
+            handler([event])
+        except Exception as e:
+            return last_id, e
+        last_id = event['id']
+    logger.warning('Outbox batch failed but every event succeeded on its own: %s', batch_error)
+    return last_id, None
+
+
+def relay_batch(name, token, limit=100):
+    """Deliver the next batch of `name`'s events; returns the number of events consumed"""
+    handler, kinds = CONSUMERS[name]
+    cursor = _claim(name, token)
+    if cursor is None or (cursor.retry_at and cursor.retry_at > datetime.utcnow()):
+        return 0
+
+    rows = DomainEvent.query.filter(DomainEvent.id > cursor.last_event_id).order_by(DomainEvent.id).limit(limit).all()
+    if not rows:
+        return 0
+    events = [event_dict(row) for row in rows if kinds is None or row.kind in kinds]
+
+    started = time.perf_counter()
+    last_id, error = _deliver(handler, events) if events else (None, None)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if error is None:
+        last_id = rows[-1].id  # Includes events of kinds the consumer skips
+    delivered = sum(1 for event in events if last_id is not None and event['id'] <= last_id)
+    values = {
+        'delivered': OutboxCursor.delivered + delivered,
+        'last_batch_size': len(events),
+        'last_batch_ms': round(elapsed_ms, 2)
+    }
+    if last_id is not None:
+        values['last_event_id'] = last_id
+    if error is None:
+        values.update(attempts=0, last_error=None, retry_at=None)
+    else:
+        attempts = cursor.attempts + 1
+        values.update(attempts=attempts, last_error=str(error),
+                      retry_at=datetime.utcnow() + retry_delay(attempts))
+        logger.error('Outbox consumer %s failed at event %s: %s', name,
+                     next(event['id'] for event in events if last_id is None or event['id'] > last_id), error)
+
+    # Only while we still hold the lease; otherwise the new holder redelivers
+    db.session.execute(
+        db.update(OutboxCursor)
+        .where(OutboxCursor.consumer == name, OutboxCursor.locked_by == token)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return len(rows) if error is None else delivered
+
+
+def release(names, token):
+    """Give up the leases of a relay that is stopping"""
+    db.session.execute(
+        db.update(OutboxCursor)
+        .where(OutboxCursor.consumer.in_(names), OutboxCursor.locked_by == token)
+        .values(locked_by=None, locked_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def run_relay(names=None, batch_size=100, poll_interval=1.0, once=False, report=None):
+    """Relay events to consumers until interrupted (or until they are caught up with `once`)
+
+    `report(stats)` is called about every 10 seconds with events consumed and
+    events/s per consumer since the last report.
+    """
+    names = names or sorted(CONSUMERS)
+    token = uuid.uuid4().hex
+    counts = dict.fromkeys(names, 0)
+    since = time.monotonic()
+    try:
+        while True:
+            processed = 0
+            for name in names:
+                n = relay_batch(name, token, batch_size)
+                counts[name] += n
+                processed += n
+
+            elapsed = time.monotonic() - since
+            if report and elapsed >= 10:
+                report({name: {'events': n, 'per_second': round(n / elapsed, 1)} for name, n in counts.items()})
+                counts = dict.fromkeys(names, 0)
+                since = time.monotonic()
+
+            if not processed:
+                if once:
+                    return
+                time.sleep(poll_interval)
+    finally:
+        db.session.rollback()
+        release(names, token)
+
+
+def outbox_metrics():
+    """Per consumer: cursor, lag in events and age, failures and last batch throughput"""
+    head = db.session.query(db.func.coalesce(db.func.max(DomainEvent.id), 0)).scalar()
+    now = datetime.utcnow()
+    consumers = {}
+    for cursor in OutboxCursor.query.order_by(OutboxCursor.consumer):
+        oldest = db.session.query(db.func.min(DomainEvent.created_at)).filter(
+            DomainEvent.id > cursor.last_event_id).scalar()
+        metrics = cursor.to_dict()
+        metrics.update({
+            'lag_events': head - cursor.last_event_id,
+            'lag_seconds': (now - oldest).total_seconds() if oldest else 0,
+            'events_per_second': (round(cursor.last_batch_size / cursor.last_batch_ms * 1000, 1)
+                                  if cursor.last_batch_size and cursor.last_batch_ms else None)
+        })
+        consumers[cursor.consumer] = metrics
+    return {'head_event_id': head, 'consumers': consumers}
+
+
+@register_consumer('order-export', kinds=('order.created', 'order.status'))
+def export_order_events(events):
+    """Append order events as JSON lines to ORDER_EXPORT_FILE (warehouse/ERP pickup)"""
+    path = current_app.config['ORDER_EXPORT_FILE']
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a') as f:
+        # Redelivered events repeat their id; readers keep the first line per id
+        f.write(''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events))
+        f.flush()
+        os.fsync(f.fileno())
@@ -0,0 +1,160 @@
+from bisect import bisect_right
+import json
+from flask import current_app
+from sqlalchemy.orm import load_only
+from src.models.product import Product, ProductVariant
+
+# Cart pricing shared by POST /api/orders/quote and create_order.
+#
+# PRICING_RULES (app config, or a JSON file named by PRICING_RULES_FILE) is
+# compiled once per app into a PricingEngine: the volume tiers become sorted
+# threshold/discount arrays searched with bisect, so pricing a cart is a
+# single pass over its lines with no database access. Product prices (and the
+# variants' size/color/SKU, snapshotted onto order items) are fetched for the
+# whole cart with one query each before the engine runs.
+
+DEFAULT_PRICING_RULES = {
+    'tax_rate': 0.08,
+    'shipping': {'flat_rate': 10.00, 'free_over': 100.00},
+    # Discount on custom-design lines by total custom units in the cart, e.g.
+    # [{'min_units': 12, 'discount': 0.05}, {'min_units': 24, 'discount': 0.10}].
+    # None by default, so deploying the engine does not change any totals.
+    'volume_tiers': []
+}
+
+
+class PricingError(Exception):
+    """Cart cannot be priced; `status` is the HTTP status to return"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class PricingEngine:
+    """Compiled pricing rules"""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.tax_rate = float(rules['tax_rate'])
+        self.flat_shipping = float(rules['shipping']['flat_rate'])
+        self.free_shipping_over = float(rules['shipping']['free_over'])
+
+        tiers = sorted(rules.get('volume_tiers', []), key=lambda t: t['min_units'])
+        self.tier_thresholds = [int(t['min_units']) for t in tiers]
+        self.tier_discounts = [0.0] + [float(t['discount']) for t in tiers]
+
+    def volume_discount(self, custom_units):
+        return self.tier_discounts[bisect_right(self.tier_thresholds, custom_units)]
+
+    def price(self, lines):
+        """Price normalized cart lines
+
+        Each line is a dict with product_id, quantity, list_price and custom;
+        unit_price and line_total are filled in. Returns the order totals.
+        """
+        custom_units = 0
+        for line in lines:
+            if line['custom']:
+                custom_units += line['quantity']
+        discount_rate = self.volume_discount(custom_units)
+
+        list_subtotal = 0.0
+        subtotal = 0.0
+        for line in lines:
+            list_price = line['list_price']
+            unit_price = round(list_price * (1 - discount_rate), 2) if line['custom'] and discount_rate else list_price
+            line['unit_price'] = unit_price
+            line['line_total'] = round(unit_price * line['quantity'], 2)
+            list_subtotal += list_price * line['quantity']
+            subtotal += line['line_total']
+
+        subtotal = round(subtotal, 2)
+        tax = round(subtotal * self.tax_rate, 2)
+        shipping = 0.0 if subtotal >= self.free_shipping_over else self.flat_shipping
+
+        return {
+            'lines': lines,
+            'custom_units': custom_units,
+            'volume_discount_rate': discount_rate,
+            'discount': round(list_subtotal - subtotal, 2),
+            'subtotal': subtotal,
+            'tax': tax,
+            'shipping': shipping,
+            'total': round(subtotal + tax + shipping, 2)
+        }
+
+
+def load_rules(app):
+    """Pricing rules from PRICING_RULES_FILE, falling back to the defaults"""
+    path = app.config.get('PRICING_RULES_FILE')
+    if path:
+        with open(path) as f:
+            return json.load(f)
+    return DEFAULT_PRICING_RULES
+
+
+def get_engine():
+    """The app's compiled pricing engine (recompiled if PRICING_RULES changes)"""
+    rules = current_app.config['PRICING_RULES']
+    engine = current_app.extensions.get('pricing')
+    if engine is None or engine.rules is not rules:
+        engine = current_app.extensions['pricing'] = PricingEngine(rules)
+    return engine
+
+
+def quote_cart(items):
+    """Validate request items, fetch their prices in one query and price the cart"""
+    if not items:
+        raise PricingError('Order must contain at least one item')
+
+    lines = []
+    for item in items:
+        try:
+            quantity = int(item.get('quantity', 1))
+            product_id = int(item['product_id'])
+            variant_id = int(item['variant_id']) if item.get('variant_id') is not None else None
+        except (KeyError, TypeError, ValueError):
+            raise PricingError('Each item needs a product_id and an integer quantity (and variant_id if given)')
+        if quantity < 1:
+            raise PricingError('Quantity must be at least 1')
+
+        lines.append({
+            'product_id': product_id,
+            'variant_id': variant_id,
+            'quantity': quantity,
+            'custom_text': item.get('custom_text'),
+            'custom_image_url': item.get('custom_image_url'),
+            'custom_notes': item.get('custom_notes')
+        })
+
+    product_ids = {line['product_id'] for line in lines}
+    products = {
+        p.id: p for p in Product.query.options(
+            load_only(Product.id, Product.name, Product.base_price, Product.category)
+        ).filter(Product.id.in_(product_ids))
+    }
+    variant_ids = {line['variant_id'] for line in lines if line['variant_id'] is not None}
+    variants = {
+        v.id: v for v in ProductVariant.query.options(
+            load_only(ProductVariant.id, ProductVariant.product_id, ProductVariant.size,
+                      ProductVariant.color, ProductVariant.sku)
+        ).filter(ProductVariant.id.in_(variant_ids))
+    } if variant_ids else {}
+
+    for line in lines:
+        product = products.get(line['product_id'])
+        if product is None:
+            raise PricingError(f"Product {line['product_id']} not found", 404)
+        variant = variants.get(line['variant_id'])
+        if line['variant_id'] is not None and (variant is None or variant.product_id != product.id):
+            raise PricingError(f"Variant {line['variant_id']} not found for product {product.id}", 404)
+        line['list_price'] = product.base_price
+        # Snapshot stored on the order item
+        line['product_name'] = product.name
+        line['size'] = variant.size if variant else None
+        line['color'] = variant.color if variant else None
+        line['sku'] = variant.sku if variant else None
+        line['custom'] = bool(line['custom_text'] or line['custom_image_url'] or product.category == 'custom')
+
+    return get_engine().price(lines)
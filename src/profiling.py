@@ -0,0 +1,227 @@
+import cProfile
+import importlib
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from flask import current_app, g, request
+
+try:
+    import greenlet
+    from gevent import monkey
+except ImportError:  # Only needed with the gevent worker class
+    greenlet = monkey = None
+
+# Request profiling.
+#
+# Admins can profile a single request by sending an ``X-Profile`` header or a
+# ``_profile`` query flag set to ``cprofile`` (deterministic, writes a .prof
+# file readable with pstats/snakeviz) or ``sample`` (stack sampler, writes
+# collapsed stacks for flamegraph.pl/speedscope).
+#
+# Endpoints listed in PROFILE_SAMPLE_RATES (e.g. "admin.get_all_orders=0.05")
+# are also sampled on a random fraction of real traffic. Their collapsed
+# stacks are appended to one file per endpoint per day, so a flame graph of
+# production traffic is just `flamegraph.pl sampled-<endpoint>-<day>.collapsed`.
+#
+# Under gevent workers every request is a greenlet on the worker's single OS
+# thread, so the sampler runs in a real (unpatched) thread and follows the
+# profiled request's greenlet: stacks show where that request computes or
+# waits, never the other requests sharing the thread.
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+
+def _original(module, name):
+    """`module.name` as it was before gevent monkey-patching (real threads, locks and sleep)"""
+    if monkey is not None:
+        return monkey.get_original(module, name)
+    return getattr(importlib.import_module(module), name)
+
+
+class StackSampler:
+    """Sample the call stack of one request at a fixed interval"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = Counter()
+        self._target = _original('_thread', 'get_ident')()
+        # With gevent, the request's greenlet rather than the OS thread it shares
+        self._greenlet = greenlet.getcurrent() if monkey and monkey.is_module_patched('threading') else None
+        self._stopped = False
+        self._done = _original('_thread', 'allocate_lock')()
+
+    def start(self):
+        self._done.acquire()
+        _original('_thread', 'start_new_thread')(self._run, ())
+
+    def stop(self):
+        self._stopped = True
+        # Wait (at most one interval) for the sampler to exit, so counts stop changing
+        self._done.acquire()
+        self._done.release()
+
+    def _frame(self):
+        if self._greenlet is not None and self._greenlet.gr_frame is not None:
+            return self._greenlet.gr_frame  # Suspended while another greenlet runs
+        return sys._current_frames().get(self._target)
+
+    def _run(self):
+        sleep = _original('time', 'sleep')
+        try:
+            while True:
+                sleep(self.interval)
+                if self._stopped:
+                    return
+                frame = self._frame()
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                if stack:
+                    self.counts[';'.join(reversed(stack))] += 1
+        finally:
+            self._done.release()
+
+    def collapsed(self):
+        """Return samples in collapsed-stack format ("frame;frame;frame count")"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.counts.most_common())
+
+
+def parse_sample_rates(value):
+    """Parse "endpoint=rate,endpoint=rate" into a dict"""
+    if isinstance(value, dict):
+        return value
+
+    rates = {}
+    for entry in (value or '').split(','):
+        if '=' not in entry:
+            continue
+        endpoint, rate = entry.split('=', 1)
+        rates[endpoint.strip()] = float(rate)
+    return rates
+
+
+def _requested_mode():
+    mode = request.headers.get('X-Profile') or request.args.get('_profile')
+    if mode in ('1', 'true'):
+        mode = 'cprofile'
+    return mode if mode in PROFILE_MODES else None
+
+
+def _is_admin():
+    from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+    from src.models.user import User
+
+    try:
+        verify_jwt_in_request(optional=True)
+        user_id = get_jwt_identity()
+    except Exception:
+        return False
+
+    if not user_id:
+        return False
+
+    user = User.query.get(user_id)
+    return bool(user and user.is_admin)
+
+
+def _start_profiling():
+    mode = _requested_mode()
+    sampled = False
+
+    if mode and not _is_admin():
+        mode = None
+
+    if not mode:
+        rate = current_app.config['PROFILE_SAMPLE_RATES'].get(request.endpoint)
+        if not rate or random.random() >= rate:
+            return
+        mode = 'sample'
+        sampled = True
+
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = StackSampler(current_app.config['PROFILE_SAMPLE_INTERVAL'])
+        profiler.start()
+
+    g.profiler = (mode, profiler, sampled, time.perf_counter())
+
+
+def _stop_profiling():
+    state = g.pop('profiler', None)
+    if state is None:
+        return None
+
+    mode, profiler, sampled, started = state
+    if mode == 'cprofile':
+        profiler.disable()
+    else:
+        profiler.stop()
+
+    profile_dir = current_app.config['PROFILE_DIR']
+    os.makedirs(profile_dir, exist_ok=True)
+    endpoint = request.endpoint or 'unknown'
+
+    if sampled:
+        # Aggregate real-traffic samples; flamegraph.pl sums duplicate stacks
+        name = f"sampled-{endpoint}-{time.strftime('%Y%m%d')}.collapsed"
+        with open(os.path.join(profile_dir, name), 'a') as f:
+            f.write(profiler.collapsed())
+        return name
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(elapsed_ms)}ms-{uuid.uuid4().hex[:8]}"
+    if mode == 'cprofile':
+        name = f'{stem}.prof'
+        profiler.dump_stats(os.path.join(profile_dir, name))
+    else:
+        name = f'{stem}.collapsed'
+        with open(os.path.join(profile_dir, name), 'w') as f:
+            f.write(profiler.collapsed())
+    return name
+
+
+def list_profiles():
+    """List stored profiles, newest first"""
+    profile_dir = current_app.config['PROFILE_DIR']
+    if not os.path.isdir(profile_dir):
+        return []
+
+    profiles = []
+    for name in os.listdir(profile_dir):
+        stat = os.stat(os.path.join(profile_dir, name))
+        profiles.append({'name': name, 'size': stat.st_size, 'modified': stat.st_mtime})
+    return sorted(profiles, key=lambda p: p['modified'], reverse=True)
+
+
+def init_profiling(app):
+    """Register the profiling hooks on the app"""
+    app.config['PROFILE_SAMPLE_RATES'] = parse_sample_rates(app.config.get('PROFILE_SAMPLE_RATES'))
+
+    @app.before_request
+    def start_profiling():
+        _start_profiling()
+
+    @app.after_request
+    def stop_profiling(response):
+        name = _stop_profiling()
+        if name and not name.startswith('sampled-'):
+            response.headers['X-Profile-Id'] = name
+        return response
+
+    @app.teardown_request
+    def discard_profiling(exc):
+        # Never leave a profiler running if the response was not finalized
+        state = g.pop('profiler', None)
+        if state is not None:
+            mode, profiler = state[0], state[1]
+            if mode == 'cprofile':
+                profiler.disable()
+            else:
+                profiler.stop()
@@ -0,0 +1,48 @@
+from flask import request
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only, undefer
+
+# Sparse fieldsets for list endpoints.
+#
+# Models that support projection declare SERIALIZERS (output key -> getter)
+# and SUMMARY_FIELDS. List endpoints accept ?fields=a,b,c or
+# ?view=summary|full; the chosen keys are pushed down into the SELECT with
+# load_only() and relationships are only loaded when they were requested.
+# The full view undefers deferred columns so they are not lazy-loaded per row.
+
+
+def requested_fields(model, default_view='full'):
+    """Resolve ?fields= / ?view= into a set of keys (None means the full view)"""
+    if request.args.get('fields'):
+        fields = {f.strip() for f in request.args['fields'].split(',') if f.strip()}
+        unknown = fields - set(model.SERIALIZERS)
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+        return fields
+
+    view = request.args.get('view', default_view)
+    if view == 'summary':
+        return set(model.SUMMARY_FIELDS)
+    if view != 'full':
+        raise ValueError(f'Unknown view: {view}')
+    return None
+
+
+def load_options(model, fields, relationships=None):
+    """Loader options selecting only the columns behind `fields`
+
+    `relationships` maps relationship keys to the eager loader used when that
+    key is part of the projection.
+    """
+    options = [loader for name, loader in (relationships or {}).items() if fields is None or name in fields]
+
+    if fields is None:
+        options.extend(undefer(prop.class_attribute) for prop in inspect(model).column_attrs if prop.deferred)
+    else:
+        columns = [model.id] + [
+            getattr(model, name) for name in sorted(fields)
+            if name != 'id' and name in model.__table__.columns
+        ]
+        options.append(load_only(*columns))
+
+    return options
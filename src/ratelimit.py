@@ -0,0 +1,223 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from flask import current_app, jsonify, request
+
+# Rate limiting for the password (bcrypt) endpoints.
+#
+# Every request to a @rate_limited view takes one token from two token
+# buckets: one per client IP and a stricter one per account (the email in the
+# JSON body, or the JWT identity for /api/users/password) from that IP. The
+# account bucket is keyed on (account, IP) so that failing logins against
+# someone else's email cannot lock its owner out. A bucket holds up to `burst`
+# tokens and refills at `per_minute` tokens per minute. An empty bucket is
+# answered with a 429 + Retry-After before the view runs, i.e. before any
+# bcrypt hashing happens.
+#
+# Buckets live in a small SQLite file (RATELIMIT_STORAGE) shared by all
+# gunicorn workers on the host, separate from the application database so
+# limiter writes never wait on the app's write lock. RATELIMIT_STORAGE=memory
+# keeps them per process instead (development, single worker). If the
+# storage is unavailable the limiter fails open and counts the error.
+#
+# Client IPs come from request.remote_addr. Behind reverse proxies set
+# TRUSTED_PROXIES to their number: create_app() then wraps the app in
+# werkzeug's ProxyFix so that is the client address from X-Forwarded-For.
+# Never set it higher than the number of proxies, or clients can pick their
+# own IP (and bucket) with that header.
+
+
+class MemoryBackend:
+    """Token buckets in a dict (one process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._counters = Counter()
+
+    def take(self, key, burst, per_second, now):
+        """Take a token; returns seconds until one is available (0 if taken)"""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * per_second)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / per_second
+            self._buckets[key] = (tokens - 1, now)
+            return 0
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def limited_keys(self, limit=50):
+        with self._lock:
+            keys = [(key, tokens) for key, (tokens, _) in self._buckets.items() if tokens < 1]
+        return [{'key': key, 'tokens': round(tokens, 3)} for key, tokens in sorted(keys, key=lambda k: k[1])[:limit]]
+
+    def prune(self, now, max_idle):
+        with self._lock:
+            for key in [k for k, (_, updated) in self._buckets.items() if now - updated > max_idle]:
+                del self._buckets[key]
+
+
+class SQLiteBackend:
+    """Token buckets in a SQLite file shared by every worker on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread, opened lazily and reopened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.OperationalError:
+                pass  # Another worker is switching the new file to WAL right now
+            conn.execute('PRAGMA synchronous=OFF')  # Losing bucket state on a crash is harmless
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, burst, per_second, now):
+        """Take a token; returns seconds until one is available (0 if taken)"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + (now - updated) * per_second)
+            wait = 0 if tokens >= 1 else (1 - tokens) / per_second
+            if not wait:
+                tokens -= 1
+            conn.execute('INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                         'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                         (key, tokens, now))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+    def incr(self, name):
+        self._connect().execute('INSERT INTO counters (name, value) VALUES (?, 1) '
+                                'ON CONFLICT (name) DO UPDATE SET value = value + 1', (name,))
+
+    def counters(self):
+        return dict(self._connect().execute('SELECT name, value FROM counters'))
+
+    def limited_keys(self, limit=50):
+        rows = self._connect().execute('SELECT key, tokens FROM buckets WHERE tokens < 1 '
+                                       'ORDER BY tokens LIMIT ?', (limit,))
+        return [{'key': key, 'tokens': round(tokens, 3)} for key, tokens in rows]
+
+    def prune(self, now, max_idle):
+        self._connect().execute('DELETE FROM buckets WHERE updated < ?', (now - max_idle,))
+
+
+class RateLimiter:
+    """Per-IP and per-account token buckets in front of the bcrypt endpoints"""
+
+    PRUNE_EVERY = 1000  # takes per process between removals of full (idle) buckets
+
+    def __init__(self, backend, rules):
+        self.backend = backend
+        # kind -> (burst, tokens per second)
+        self.rules = {kind: (float(rule['burst']), rule['per_minute'] / 60.0) for kind, rule in rules.items()}
+        self.max_idle = max(burst / rate for burst, rate in self.rules.values())
+        self._takes = 0
+
+    def check(self, endpoint, keys):
+        """Take a token from each bucket; returns seconds to wait (0 if allowed)"""
+        now = time.time()
+        try:
+            for kind, key in keys:
+                if key is None:
+                    continue
+                burst, per_second = self.rules[kind]
+                wait = self.backend.take(f'{kind}:{key}', burst, per_second, now)
+                if wait:
+                    self.backend.incr(f'{endpoint}.limited.{kind}')
+                    return wait
+            self.backend.incr(f'{endpoint}.allowed')
+
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                self.backend.prune(now, self.max_idle)
+        except sqlite3.Error:
+            # Fail open: a broken limiter must not take login down with it
+            try:
+                self.backend.incr('errors')
+            except sqlite3.Error:
+                pass
+        return 0
+
+    def stats(self):
+        return {'counters': self.backend.counters(), 'limited': self.backend.limited_keys()}
+
+
+def _account_key():
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and isinstance(data.get('email'), str) and data['email'].strip():
+        return data['email'].strip().lower()
+
+    from flask_jwt_extended import get_jwt_identity
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        return None  # No verified JWT for this request
+    return f'user:{identity}' if identity is not None else None
+
+
+def rate_limited(fn):
+    """Return 429 when the client IP or account is out of tokens (apply below @jwt_required)"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        limiter = current_app.extensions.get('ratelimit')
+        if limiter is not None:
+            account = _account_key()
+            wait = limiter.check(request.endpoint, [
+                ('ip', request.remote_addr),
+                ('account', f'{account}|{request.remote_addr}' if account is not None else None)
+            ])
+            if wait:
+                response = jsonify({'error': 'Too many attempts, please try again later'})
+                response.headers['Retry-After'] = str(math.ceil(wait))
+                return response, 429
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def get_limiter():
+    """The app's rate limiter (None when RATELIMIT_ENABLED is off)"""
+    return current_app.extensions.get('ratelimit')
+
+
+def init_rate_limiter(app):
+    """Create the app's rate limiter from RATELIMIT_* config"""
+    if not app.config['RATELIMIT_ENABLED']:
+        return
+
+    storage = app.config['RATELIMIT_STORAGE']
+    backend = MemoryBackend() if storage == 'memory' else SQLiteBackend(storage)
+    app.extensions['ratelimit'] = RateLimiter(backend, {
+        'ip': {'burst': app.config['RATELIMIT_IP_BURST'], 'per_minute': app.config['RATELIMIT_IP_PER_MINUTE']},
+        'account': {'burst': app.config['RATELIMIT_ACCOUNT_BURST'],
+                    'per_minute': app.config['RATELIMIT_ACCOUNT_PER_MINUTE']}
+    })
@@ -0,0 +1,96 @@
+import calendar
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from src.database import db
+from src.models.token import RevokedToken
+
+# JWT revocation (logout).
+#
+# Revoked token ids (jti) are stored in the revoked_tokens table. Each worker
+# process keeps them in an in-memory dict (jti -> expiry), so checking a token
+# on a @jwt_required route is a dict lookup. Every REVOCATION_SYNC_SECONDS
+# the first request to check a token pulls newly revoked rows from the
+# primary database with one indexed query; a logout therefore takes effect
+# on the worker that handled it immediately and on every other worker within
+# REVOCATION_SYNC_SECONDS. Entries are dropped from memory once the token
+# would have expired anyway, and expired rows are deleted on logout.
+
+logger = logging.getLogger(__name__)
+
+# Rows revoked this long before the previous sync are read again, so rows
+# committed out of order (or stamped by a slightly slow clock) are not missed
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class Denylist:
+    """In-memory copy of the revoked_tokens table"""
+
+    def __init__(self, sync_seconds):
+        self.sync_seconds = sync_seconds
+        self._expires = {}  # jti -> expiry (epoch seconds)
+        self._synced_at = None  # revoked_at watermark (UTC) of the last sync
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._expires)
+
+    def is_revoked(self, jti):
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        return jti in self._expires
+
+    def add(self, jti, expires_at):
+        self._expires[jti] = calendar.timegm(expires_at.utctimetuple())
+
+    def sync(self):
+        """Load rows revoked since the last sync and forget expired tokens"""
+        if not self._lock.acquire(blocking=False):
+            return  # Another thread is syncing; the current set is at most one interval old
+
+        try:
+            started = datetime.utcnow()
+            query = select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.expires_at > started)
+            if self._synced_at is not None:
+                query = query.where(RevokedToken.revoked_at >= self._synced_at - SYNC_OVERLAP)
+
+            # Always read the primary: a lagging replica would stretch the logout delay
+            with db.engine.connect() as conn:
+                for jti, expires_at in conn.execute(query):
+                    self.add(jti, expires_at)
+            self._synced_at = started
+
+            now = time.time()
+            for jti, expires in list(self._expires.items()):
+                if expires <= now:
+                    self._expires.pop(jti, None)
+        except Exception:
+            # Keep checking against the set we have and retry on the next interval
+            logger.exception('Token denylist sync failed')
+        finally:
+            self._next_sync = time.monotonic() + self.sync_seconds
+            self._lock.release()
+
+
+def revoke_token(payload):
+    """Revoke a decoded JWT (its jti) everywhere; commits the session"""
+    from flask import current_app
+
+    expires_at = datetime.utcfromtimestamp(payload['exp']) if 'exp' in payload else datetime.max
+    db.session.add(RevokedToken(jti=payload['jti'], user_id=payload.get('sub'), expires_at=expires_at))
+    RevokedToken.query.filter(RevokedToken.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+    db.session.commit()
+
+    current_app.extensions['revocation'].add(payload['jti'], expires_at)
+
+
+def init_token_revocation(app, jwt):
+    """Check every JWT against the worker's in-memory denylist"""
+    denylist = app.extensions['revocation'] = Denylist(app.config['REVOCATION_SYNC_SECONDS'])
+
+    @jwt.token_in_blocklist_loader
+    def is_token_revoked(jwt_header, jwt_payload):
+        return denylist.is_revoked(jwt_payload['jti'])
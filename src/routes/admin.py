@@ -1,13 +1,38 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, send_from_directory
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.database import db
+from src.database import db, read_only
 from src.models.user import User
 from src.models.product import Product, ProductVariant
-from src.models.order import Order, OrderItem, CustomOrder
+from src.models.order import Order, CustomOrder, address_index_values
+from src.profiling import list_profiles
+from src.projection import requested_fields, load_options
+from src import analytics
+from src.dashboard import dashboard_stats, get_feed
+from src.events import emit, emit_order_status, sse, stream, streaming
+from src.jobs import queue_metrics
+from src.outbox import outbox_metrics
+from src.order_search import apply_search, encode_cursor
+from src.notifications import queue_order_email
+from src.concurrency import conflict_response, stale_precondition, versioned
+from src.loadshed import get_shedder
+from src.ratelimit import get_limiter
+from src.snapshots import rebuild_catalog_snapshots
+from sqlalchemy.orm import selectinload, undefer_group
+from sqlalchemy.orm.exc import StaleDataError
 from functools import wraps
+import io
+import os
+import pstats
 
 admin_bp = Blueprint('admin', __name__)
 
+ORDER_RELATIONSHIPS = {
+    'items': selectinload(Order.items)
+}
+
+# The customer directory counts matches up to here ("10000+"), not all of them
+DIRECTORY_COUNT_LIMIT = 10000
+
 def admin_required(fn):
     """Decorator to require admin access"""
     @wraps(fn)
@@ -25,29 +50,18 @@ def admin_required(fn):
 
 
 @admin_bp.route('/dashboard', methods=['GET'])
+@read_only
 @admin_required
 def get_dashboard():
     """Get admin dashboard statistics"""
     try:
-        total_orders = Order.query.count()
-        total_revenue = db.session.query(db.func.sum(Order.total)).filter_by(payment_status='paid').scalar() or 0
-        total_customers = User.query.filter_by(is_admin=False).count()
-        total_products = Product.query.filter_by(is_active=True).count()
-        pending_orders = Order.query.filter_by(status='pending').count()
-        pending_custom_orders = CustomOrder.query.filter_by(status='pending_approval').count()
+        stats = dashboard_stats(db.session)
         
         # Recent orders
         recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
         
         return jsonify({
-            'stats': {
-                'total_orders': total_orders,
-                'total_revenue': float(total_revenue),
-                'total_customers': total_customers,
-                'total_products': total_products,
-                'pending_orders': pending_orders,
-                'pending_custom_orders': pending_custom_orders
-            },
+            'stats': stats,
             'recent_orders': [order.to_dict() for order in recent_orders]
         }), 200
         
@@ -55,7 +69,29 @@ def get_dashboard():
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/feed', methods=['GET'])
+@streaming
+@jwt_required(locations=['headers', 'query_string'])  # EventSource cannot set headers: /feed?jwt=<token>
+def dashboard_feed():
+    """Stream the dashboard snapshot, then incremental deltas (Server-Sent Events)"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or not user.is_admin:
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        subscription, snapshot = get_feed().subscribe()
+        
+        return Response(stream(subscription, [sse(snapshot, event='snapshot')]), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @admin_bp.route('/orders', methods=['GET'])
+@read_only
 @admin_required
 def get_all_orders():
     """Get all orders with filtering"""
@@ -64,17 +100,32 @@ def get_all_orders():
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
         
-        query = Order.query
+        try:
+            fields = requested_fields(Order)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = Order.query.options(*load_options(Order, fields, ORDER_RELATIONSHIPS))
         
         if status:
             query = query.filter_by(status=status)
         
+        # Shipping address filters hit the indexed denormalized columns
+        address_filters = address_index_values({
+            'city': request.args.get('city'),
+            'state': request.args.get('state'),
+            'zip': request.args.get('zip')
+        })
+        for column, value in address_filters.items():
+            if value:
+                query = query.filter(getattr(Order, column) == value)
+        
         orders = query.order_by(Order.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'orders': [order.to_dict() for order in orders.items],
+            'orders': [order.to_dict(fields) for order in orders.items],
             'total': orders.total,
             'pages': orders.pages,
             'current_page': page
@@ -84,10 +135,41 @@ def get_all_orders():
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/orders/search', methods=['GET'])
+@read_only
+@admin_required
+def search_orders():
+    """Search orders by number/email/name fragment, date and total range; newest first, cursor-paginated"""
+    try:
+        # limit=0 would return no orders and skip past the first; negatives slice from the end
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        try:
+            fields = requested_fields(Order, default_view='summary')
+            # created_at is always loaded: it is half of the next cursor
+            query = Order.query.options(*load_options(Order, fields and fields | {'created_at'}, ORDER_RELATIONSHIPS))
+            if request.args.get('status'):
+                query = query.filter_by(status=request.args['status'])
+            query = apply_search(query, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        orders = query.limit(limit + 1).all()
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        
+        return jsonify({
+            'orders': [order.to_dict(fields) for order in orders],
+            'next_cursor': encode_cursor(orders[-1]) if has_more else None
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @admin_bp.route('/orders/<int:order_id>/status', methods=['PUT'])
 @admin_required
 def update_order_status(order_id):
-    """Update order status"""
+    """Update order status (If-Match / "version" guard against concurrent edits)"""
     try:
         data = request.get_json()
         order = Order.query.get(order_id)
@@ -95,33 +177,53 @@ def update_order_status(order_id):
         if not order:
             return jsonify({'error': 'Order not found'}), 404
         
+        if stale_precondition(order):
+            return conflict_response('order', order)
+        
+        old_status, old_payment_status = order.status, order.payment_status
+        
         if 'status' in data:
             order.status = data['status']
         
         if 'payment_status' in data:
             order.payment_status = data['payment_status']
         
+        analytics.record_transition(order, old_status, old_payment_status)
+        emit_order_status(order, old_status, old_payment_status)
+        if order.status != old_status:
+            queue_order_email(order, 'order_status')
         db.session.commit()
         
-        return jsonify({
+        return versioned(jsonify({
             'message': 'Order updated successfully',
             'order': order.to_dict()
-        }), 200
+        }), order), 200
         
+    except StaleDataError:
+        db.session.rollback()
+        return conflict_response('order', Order.query.get(order_id))
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
 @admin_bp.route('/products', methods=['GET', 'POST'])
+@read_only
 @admin_required
 def manage_products():
     """Get all products or create new product"""
     if request.method == 'GET':
         try:
-            products = Product.query.all()
+            try:
+                fields = requested_fields(Product)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            products = Product.query.options(
+                *load_options(Product, fields, {'variants': selectinload(Product.variants)})
+            ).all()
             return jsonify({
-                'products': [p.to_dict() for p in products]
+                'products': [p.to_dict(fields) for p in products]
             }), 200
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -154,7 +256,10 @@ def manage_products():
                     )
                     db.session.add(variant)
             
+            emit('product', product.id, 'product.changed',
+                 {'product_id': product.id, 'is_active': bool(product.is_active), 'was_active': False})
             db.session.commit()
+            rebuild_catalog_snapshots()
             
             return jsonify({
                 'message': 'Product created successfully',
@@ -169,12 +274,17 @@ def manage_products():
 @admin_bp.route('/products/<int:product_id>', methods=['PUT', 'DELETE'])
 @admin_required
 def update_delete_product(product_id):
-    """Update or delete a product"""
+    """Update or delete a product (If-Match / "version" guard against concurrent edits)"""
     product = Product.query.get(product_id)
     
     if not product:
         return jsonify({'error': 'Product not found'}), 404
     
+    if stale_precondition(product):
+        return conflict_response('product', product)
+    
+    was_active = bool(product.is_active)
+    
     if request.method == 'PUT':
         try:
             data = request.get_json()
@@ -192,55 +302,97 @@ def update_delete_product(product_id):
             if 'is_active' in data:
                 product.is_active = data['is_active']
             
+            emit('product', product.id, 'product.changed',
+                 {'product_id': product.id, 'is_active': bool(product.is_active), 'was_active': was_active})
             db.session.commit()
+            rebuild_catalog_snapshots()
             
-            return jsonify({
+            return versioned(jsonify({
                 'message': 'Product updated successfully',
                 'product': product.to_dict()
-            }), 200
+            }), product), 200
             
+        except StaleDataError:
+            db.session.rollback()
+            return conflict_response('product', Product.query.get(product_id))
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
     
     elif request.method == 'DELETE':
         try:
+            emit('product', product.id, 'product.changed',
+                 {'product_id': product.id, 'is_active': False, 'was_active': was_active, 'deleted': True})
             db.session.delete(product)
             db.session.commit()
+            rebuild_catalog_snapshots()
             
             return jsonify({'message': 'Product deleted successfully'}), 200
             
+        except StaleDataError:
+            db.session.rollback()
+            return conflict_response('product', Product.query.get(product_id))
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
 
 
 @admin_bp.route('/custom-orders', methods=['GET'])
+@read_only
 @admin_required
 def get_custom_orders():
-    """Get all custom order requests"""
+    """Get custom order requests (summary view unless ?view=full or ?fields=)"""
     try:
         status = request.args.get('status')
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+        
+        try:
+            fields = requested_fields(CustomOrder, default_view='summary')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        query = CustomOrder.query
+        query = CustomOrder.query.options(*load_options(CustomOrder, fields))
         
         if status:
             query = query.filter_by(status=status)
         
-        custom_orders = query.order_by(CustomOrder.created_at.desc()).all()
+        custom_orders = query.order_by(CustomOrder.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
         
         return jsonify({
-            'custom_orders': [co.to_dict() for co in custom_orders]
+            'custom_orders': [co.to_dict(fields) for co in custom_orders.items],
+            'total': custom_orders.total,
+            'pages': custom_orders.pages,
+            'current_page': page
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/custom-orders/<int:custom_order_id>', methods=['GET'])
+@read_only
+@admin_required
+def get_custom_order(custom_order_id):
+    """Get a custom order request including design data and notes"""
+    try:
+        custom_order = CustomOrder.query.options(undefer_group('details')).get(custom_order_id)
+        
+        if not custom_order:
+            return jsonify({'error': 'Custom order not found'}), 404
+        
+        return versioned(jsonify(custom_order.to_dict()), custom_order), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @admin_bp.route('/custom-orders/<int:custom_order_id>', methods=['PUT'])
 @admin_required
 def update_custom_order(custom_order_id):
-    """Update custom order status"""
+    """Update custom order status (If-Match / "version" guard against concurrent edits)"""
     try:
         data = request.get_json()
         custom_order = CustomOrder.query.get(custom_order_id)
@@ -248,34 +400,148 @@ def update_custom_order(custom_order_id):
         if not custom_order:
             return jsonify({'error': 'Custom order not found'}), 404
         
+        if stale_precondition(custom_order):
+            return conflict_response('custom_order', custom_order)
+        
+        old_status = custom_order.status
+        
         if 'status' in data:
             custom_order.status = data['status']
         
         if 'admin_notes' in data:
             custom_order.admin_notes = data['admin_notes']
         
+        if custom_order.status != old_status:
+            emit('custom_order', custom_order.id, 'custom_order.status', {
+                'custom_order_id': custom_order.id,
+                'status': custom_order.status,
+                'previous_status': old_status
+            })
         db.session.commit()
         
-        return jsonify({
+        return versioned(jsonify({
             'message': 'Custom order updated successfully',
             'custom_order': custom_order.to_dict()
-        }), 200
+        }), custom_order), 200
         
+    except StaleDataError:
+        db.session.rollback()
+        return conflict_response('custom_order', CustomOrder.query.get(custom_order_id))
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
 @admin_bp.route('/customers', methods=['GET'])
+@read_only
 @admin_required
 def get_customers():
-    """Get all customers"""
+    """Customer directory with lifetime order aggregates (?search, ?sort=newest|spend|last_order, paginated)"""
     try:
-        customers = User.query.filter_by(is_admin=False).all()
+        search = request.args.get('search', '').strip()
+        sort = request.args.get('sort', 'newest')
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+        
+        if sort not in User.DIRECTORY_SORTS:
+            return jsonify({'error': f"sort must be one of: {', '.join(User.DIRECTORY_SORTS)}"}), 400
+        
+        query = User.query.filter_by(is_admin=False)
+        if search:
+            query = query.filter(User.prefix_search(search))
+        
+        customers = query.order_by(*User.DIRECTORY_SORTS[sort]).paginate(
+            page=page, per_page=per_page, max_per_page=100, error_out=False, count=False
+        )
+        total = query.with_entities(User.id).limit(DIRECTORY_COUNT_LIMIT + 1).count()
         
         return jsonify({
-            'customers': [user.to_dict() for user in customers]
+            'customers': [user.customer_dict() for user in customers.items],
+            'total': min(total, DIRECTORY_COUNT_LIMIT),
+            'total_exact': total <= DIRECTORY_COUNT_LIMIT,
+            'pages': -(-min(total, DIRECTORY_COUNT_LIMIT) // customers.per_page),
+            'current_page': page
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/profiles', methods=['GET'])
+@admin_required
+def get_profiles():
+    """List stored request profiles"""
+    try:
+        return jsonify({'profiles': list_profiles()}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/profiles/<path:name>', methods=['GET'])
+@admin_required
+def get_profile(name):
+    """Download a stored profile (?format=text renders pstats output)"""
+    profile_dir = current_app.config['PROFILE_DIR']
+    
+    if request.args.get('format') == 'text' and name.endswith('.prof'):
+        path = os.path.join(profile_dir, os.path.basename(name))
+        if not os.path.exists(path):
+            return jsonify({'error': 'Profile not found'}), 404
+        
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            return jsonify({'error': f"sort must be one of: {', '.join(sorted(pstats.Stats.sort_arg_dict_default))}"}), 400
+        limit = max(1, request.args.get('limit', 50, type=int))
+        
+        output = io.StringIO()
+        stats = pstats.Stats(path, stream=output)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    
+    return send_from_directory(profile_dir, name, as_attachment=True)
+
+
+@admin_bp.route('/jobs/metrics', methods=['GET'])
+@admin_required
+def get_job_metrics():
+    """Background job queue depth per queue and status"""
+    try:
+        return jsonify({'queues': queue_metrics()}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/outbox', methods=['GET'])
+@admin_required
+def get_outbox_metrics():
+    """Outbox consumer cursors, lag and delivery throughput"""
+    try:
+        return jsonify(outbox_metrics()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/load', methods=['GET'])
+@admin_required
+def get_load():
+    """This worker's in-flight requests per class/blueprint and shed counters"""
+    try:
+        shedder = get_shedder()
+        if shedder is None:
+            return jsonify({'enabled': False}), 200
+        return jsonify({'enabled': True, **shedder.stats()}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/rate-limits', methods=['GET'])
+@admin_required
+def get_rate_limits():
+    """Rate limiter counters and currently throttled IPs/accounts"""
+    try:
+        limiter = get_limiter()
+        if limiter is None:
+            return jsonify({'enabled': False}), 200
+        return jsonify({'enabled': True, **limiter.stats()}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
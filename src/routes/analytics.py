@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from src.database import db, read_only
+from src.models.analytics import SalesDailyRollup, OrderDailyRollup
+from src.models.product import Product, ProductVariant
+from src.routes.admin import admin_required
+
+analytics_bp = Blueprint('analytics', __name__)
+
+# Dimensions accepted by ?group_by= (comma separated)
+SALES_DIMENSIONS = {
+    'day': [SalesDailyRollup.day],
+    'category': [SalesDailyRollup.category],
+    'product': [SalesDailyRollup.product_id],
+    'variant': [SalesDailyRollup.product_id, SalesDailyRollup.variant_id],
+    'status': [SalesDailyRollup.status],
+    'payment_status': [SalesDailyRollup.payment_status]
+}
+
+
+def _date_range():
+    """Parse ?start=YYYY-MM-DD&end=YYYY-MM-DD (defaults to the last 30 days)"""
+    end = request.args.get('end')
+    start = request.args.get('start')
+    end = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.utcnow().date()
+    start = datetime.strptime(start, '%Y-%m-%d').date() if start else end - timedelta(days=29)
+    return start, end
+
+
+@analytics_bp.route('/sales', methods=['GET'])
+@read_only
+@admin_required
+def get_sales():
+    """Line-item sales by day, category, product and/or variant"""
+    try:
+        try:
+            start, end = _date_range()
+        except ValueError:
+            return jsonify({'error': 'Dates must be formatted as YYYY-MM-DD'}), 400
+
+        group_by = [g for g in request.args.get('group_by', 'day').split(',') if g]
+        unknown = [g for g in group_by if g not in SALES_DIMENSIONS]
+        if unknown:
+            return jsonify({'error': f'Unknown group_by dimension(s): {", ".join(unknown)}'}), 400
+
+        columns = []
+        for dimension in group_by:
+            for column in SALES_DIMENSIONS[dimension]:
+                if column not in columns:
+                    columns.append(column)
+
+        query = db.session.query(
+            *columns,
+            db.func.sum(SalesDailyRollup.line_count).label('line_count'),
+            db.func.sum(SalesDailyRollup.units).label('units'),
+            db.func.sum(SalesDailyRollup.revenue).label('revenue')
+        ).filter(SalesDailyRollup.day >= start, SalesDailyRollup.day <= end)
+
+        if request.args.get('status'):
+            query = query.filter(SalesDailyRollup.status == request.args['status'])
+        if request.args.get('payment_status'):
+            query = query.filter(SalesDailyRollup.payment_status == request.args['payment_status'])
+        if request.args.get('category'):
+            query = query.filter(SalesDailyRollup.category == request.args['category'])
+
+        rows = query.group_by(*columns).order_by(*columns).all()
+
+        results = []
+        for row in rows:
+            result = row._asdict()
+            if 'day' in result:
+                result['day'] = result['day'].isoformat()
+            if 'variant_id' in result:
+                result['variant_id'] = result['variant_id'] or None
+            results.append(result)
+
+        # Resolve display names with one query per table
+        product_ids = {r['product_id'] for r in results if 'product_id' in r}
+        if product_ids:
+            names = dict(db.session.query(Product.id, Product.name).filter(Product.id.in_(product_ids)))
+            for result in results:
+                result['product_name'] = names.get(result['product_id'])
+
+        variant_ids = {r['variant_id'] for r in results if r.get('variant_id')}
+        if variant_ids:
+            sizes = dict(db.session.query(ProductVariant.id, ProductVariant.size).filter(ProductVariant.id.in_(variant_ids)))
+            for result in results:
+                if 'variant_id' in result:
+                    result['size'] = sizes.get(result['variant_id'])
+
+        return jsonify({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'group_by': group_by,
+            'results': results
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@analytics_bp.route('/orders', methods=['GET'])
+@read_only
+@admin_required
+def get_order_totals():
+    """Order counts and revenue per day"""
+    try:
+        try:
+            start, end = _date_range()
+        except ValueError:
+            return jsonify({'error': 'Dates must be formatted as YYYY-MM-DD'}), 400
+
+        query = db.session.query(
+            OrderDailyRollup.day,
+            db.func.sum(OrderDailyRollup.order_count).label('order_count'),
+            db.func.sum(OrderDailyRollup.subtotal).label('subtotal'),
+            db.func.sum(OrderDailyRollup.tax).label('tax'),
+            db.func.sum(OrderDailyRollup.shipping).label('shipping'),
+            db.func.sum(OrderDailyRollup.total).label('total')
+        ).filter(OrderDailyRollup.day >= start, OrderDailyRollup.day <= end)
+
+        if request.args.get('status'):
+            query = query.filter(OrderDailyRollup.status == request.args['status'])
+        if request.args.get('payment_status'):
+            query = query.filter(OrderDailyRollup.payment_status == request.args['payment_status'])
+
+        rows = query.group_by(OrderDailyRollup.day).order_by(OrderDailyRollup.day).all()
+
+        days = []
+        for row in rows:
+            day = row._asdict()
+            day['day'] = day['day'].isoformat()
+            days.append(day)
+
+        return jsonify({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'days': days
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,11 +1,15 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from src.database import db
 from src.models.user import User
+from src.ratelimit import rate_limited
+from src.revocation import revoke_token
+from src.events import emit
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limited
 def register():
     """Register a new user"""
     try:
@@ -29,6 +33,8 @@ def register():
         user.set_password(data['password'])
         
         db.session.add(user)
+        db.session.flush()
+        emit('user', user.id, 'user.registered', {'user_id': user.id})
         db.session.commit()
         
         # Create access token
@@ -46,6 +52,7 @@ def register():
 
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limited
 def login():
     """Login user"""
     try:
@@ -94,5 +101,12 @@ def get_current_user():
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    """Logout user (client-side token removal)"""
-    return jsonify({'message': 'Logout successful'}), 200
+    """Logout user (revokes the access token on every worker)"""
+    try:
+        revoke_token(get_jwt())
+        
+        return jsonify({'message': 'Logout successful'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -1,13 +1,26 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.database import db
+from src.database import db, read_only
 from src.models.user import User
-from src.models.product import Product, ProductVariant
 from src.models.order import Order, OrderItem, CustomOrder
+from src import analytics
+from src.archive import find_order
+from src.concurrency import versioned
+from src.models.archive import ArchivedOrder
+from src.events import ORDER_STATUS_FIELDS, emit, get_bus, order_status_payload, sse, stream, streaming
+from src.models.event import DomainEvent
+from src.notifications import queue_order_email
+from src.pricing import quote_cart, PricingError
+from src.projection import requested_fields, load_options
+from sqlalchemy.orm import selectinload
 import json
 
 orders_bp = Blueprint('orders', __name__)
 
+ORDER_RELATIONSHIPS = {
+    'items': selectinload(Order.items)
+}
+
 @orders_bp.route('/create', methods=['POST'])
 def create_order():
     """Create a new order (guest or authenticated)"""
@@ -23,37 +36,11 @@ def create_order():
         except:
             pass
         
-        # Validate required fields
-        if not data.get('items') or len(data['items']) == 0:
-            return jsonify({'error': 'Order must contain at least one item'}), 400
-        
-        # Calculate totals
-        subtotal = 0
-        order_items = []
-        
-        for item_data in data['items']:
-            product = Product.query.get(item_data['product_id'])
-            if not product:
-                return jsonify({'error': f'Product {item_data["product_id"]} not found'}), 404
-            
-            quantity = item_data.get('quantity', 1)
-            price = product.base_price
-            subtotal += price * quantity
-            
-            order_items.append({
-                'product_id': product.id,
-                'variant_id': item_data.get('variant_id'),
-                'quantity': quantity,
-                'price_at_purchase': price,
-                'custom_text': item_data.get('custom_text'),
-                'custom_image_url': item_data.get('custom_image_url'),
-                'custom_notes': item_data.get('custom_notes')
-            })
-        
-        # Calculate tax and shipping
-        tax = subtotal * 0.08  # 8% tax
-        shipping = 10.00 if subtotal < 100 else 0.00  # Free shipping over $100
-        total = subtotal + tax + shipping
+        # Price the cart (same rules as /quote)
+        try:
+            quote = quote_cart(data.get('items'))
+        except PricingError as e:
+            return jsonify({'error': str(e)}), e.status
         
         # Create order
         order = Order(
@@ -61,25 +48,39 @@ def create_order():
             customer_email=data.get('customer_email'),
             customer_name=data.get('customer_name'),
             customer_phone=data.get('customer_phone'),
-            subtotal=subtotal,
-            tax=tax,
-            shipping=shipping,
-            total=total,
-            shipping_address=json.dumps(data.get('shipping_address', {})),
-            billing_address=json.dumps(data.get('billing_address', {}))
+            subtotal=quote['subtotal'],
+            tax=quote['tax'],
+            shipping=quote['shipping'],
+            total=quote['total'],
+            shipping_address=data.get('shipping_address', {}),
+            billing_address=data.get('billing_address', {})
         )
         
         db.session.add(order)
         db.session.flush()  # Get order ID
         
         # Create order items
-        for item_data in order_items:
+        for line in quote['lines']:
             order_item = OrderItem(
                 order_id=order.id,
-                **item_data
+                product_id=line['product_id'],
+                variant_id=line['variant_id'],
+                quantity=line['quantity'],
+                price_at_purchase=line['unit_price'],
+                product_name=line['product_name'],
+                size=line['size'],
+                color=line['color'],
+                sku=line['sku'],
+                custom_text=line['custom_text'],
+                custom_image_url=line['custom_image_url'],
+                custom_notes=line['custom_notes']
             )
             db.session.add(order_item)
         
+        db.session.flush()
+        analytics.record_order(order)
+        emit('admin.order', order.id, 'order.created', order.to_dict(Order.SUMMARY_FIELDS))
+        queue_order_email(order, 'order_confirmation')
         db.session.commit()
         
         return jsonify({
@@ -92,16 +93,65 @@ def create_order():
         return jsonify({'error': str(e)}), 500
 
 
+@orders_bp.route('/quote', methods=['POST'])
+def quote_order():
+    """Price a cart without creating an order"""
+    try:
+        data = request.get_json()
+        
+        try:
+            quote = quote_cart(data.get('items'))
+        except PricingError as e:
+            return jsonify({'error': str(e)}), e.status
+        
+        return jsonify({
+            'items': [{
+                'product_id': line['product_id'],
+                'variant_id': line['variant_id'],
+                'quantity': line['quantity'],
+                'list_price': line['list_price'],
+                'unit_price': line['unit_price'],
+                'line_total': line['line_total']
+            } for line in quote['lines']],
+            'custom_units': quote['custom_units'],
+            'volume_discount_rate': quote['volume_discount_rate'],
+            'discount': quote['discount'],
+            'subtotal': quote['subtotal'],
+            'tax': quote['tax'],
+            'shipping': quote['shipping'],
+            'total': quote['total']
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @orders_bp.route('/', methods=['GET'])
+@read_only
 @jwt_required()
 def get_user_orders():
     """Get all orders for the current user"""
     try:
         user_id = get_jwt_identity()
-        orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
+        
+        try:
+            fields = requested_fields(Order)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        orders = Order.query.options(*load_options(Order, fields, ORDER_RELATIONSHIPS)).filter_by(
+            user_id=user_id
+        ).order_by(Order.created_at.desc()).all()
+        orders = [order.to_dict(fields) for order in orders]
+        
+        # Older delivered/cancelled orders only on request (they live in the archive database)
+        if request.args.get('include_archived', 'false').lower() == 'true':
+            archived = ArchivedOrder.query.filter_by(user_id=user_id).order_by(ArchivedOrder.created_at.desc())
+            orders += [{key: value for key, value in a.to_dict().items() if fields is None or key in fields}
+                       for a in archived]
         
         return jsonify({
-            'orders': [order.to_dict() for order in orders]
+            'orders': orders
         }), 200
         
     except Exception as e:
@@ -109,10 +159,11 @@ def get_user_orders():
 
 
 @orders_bp.route('/<int:order_id>', methods=['GET'])
+@read_only
 def get_order(order_id):
-    """Get order details"""
+    """Get order details (live or archived)"""
     try:
-        order = Order.query.get(order_id)
+        order = find_order(order_id)
         
         if not order:
             return jsonify({'error': 'Order not found'}), 404
@@ -129,17 +180,21 @@ def get_order(order_id):
         except:
             pass
         
-        return jsonify(order.to_dict()), 200
+        if isinstance(order, ArchivedOrder):
+            return jsonify(order.to_dict()), 200
+        return versioned(jsonify(order.to_dict()), order), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @orders_bp.route('/<int:order_id>/track', methods=['GET'])
-def track_order(order_id):
-    """Track order status"""
+@orders_bp.route('/track/<order_number>', methods=['GET'])
+@read_only
+def track_order(order_id=None, order_number=None):
+    """Track order status by id or order number (live or archived)"""
     try:
-        order = Order.query.get(order_id)
+        order = find_order(order_id, order_number)
         
         if not order:
             return jsonify({'error': 'Order not found'}), 404
@@ -155,6 +210,73 @@ def track_order(order_id):
         return jsonify({'error': str(e)}), 500
 
 
+def _may_follow(order):
+    """Order owner or admin (JWT), or the order_number + email pair a guest tracks with"""
+    order_number = request.args.get('order_number')
+    email = request.args.get('email')
+    if order_number and email:
+        return (order_number == order.order_number and
+                email.strip().lower() == (order.customer_email or '').lower())
+
+    try:
+        from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+        verify_jwt_in_request(optional=True, locations=['headers', 'query_string'])  # EventSource: ?jwt=<token>
+        user_id = get_jwt_identity()
+    except Exception:
+        return False
+    if not user_id:
+        return False
+    if order.user_id is not None and order.user_id == user_id:
+        return True
+    user = User.query.get(user_id)
+    return bool(user and user.is_admin)
+
+
+def _status_only(payload):
+    return {key: payload.get(key) for key in ORDER_STATUS_FIELDS}
+
+
+@orders_bp.route('/<int:order_id>/events', methods=['GET'])
+@streaming
+def order_events(order_id):
+    """Stream order status/payment changes as Server-Sent Events (owner, admin or order_number + email)"""
+    try:
+        # Subscribe before reading the current state so no change falls in between
+        subscription = get_bus().subscribe('order', order_id)
+        try:
+            order = Order.query.get(order_id)
+            
+            if not order or not _may_follow(order):
+                subscription.close()
+                return jsonify({'error': 'Order not found'}), 404
+            
+            last_event_id = max(request.headers.get('Last-Event-ID', 0, type=int), 0)
+            if last_event_id:
+                # Reconnect: replay the status changes the client missed
+                missed = DomainEvent.query.filter(
+                    DomainEvent.topic == 'order',
+                    DomainEvent.subject_id == order_id,
+                    DomainEvent.kind == 'order.status',
+                    DomainEvent.id > last_event_id
+                ).order_by(DomainEvent.id).all()
+                initial = [sse(_status_only(e.payload), event=e.kind, event_id=e.id) for e in missed]
+                last_event_id = missed[-1].id if missed else last_event_id
+            else:
+                initial = [sse(order_status_payload(order), event='order.status')]
+        except Exception:
+            subscription.close()
+            raise
+        
+        frames = stream(subscription, initial, last_event_id, kinds={'order.status'}, project=_status_only)
+        return Response(frames, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Don't let nginx buffer the stream
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @orders_bp.route('/custom-quote', methods=['POST'])
 def request_custom_quote():
     """Request a custom order quote"""
@@ -183,6 +305,8 @@ def request_custom_quote():
         )
         
         db.session.add(custom_order)
+        db.session.flush()
+        emit('admin.custom_order', custom_order.id, 'custom_order.created', custom_order.to_dict(CustomOrder.SUMMARY_FIELDS))
         db.session.commit()
         
         return jsonify({
@@ -1,17 +1,29 @@
-from flask import Blueprint, request, jsonify
-import stripe
+from flask import Blueprint, current_app, request, jsonify
 import os
 from src.database import db
 from src.models.order import Order
+from src import analytics
+from src.concurrency import retry_on_conflict
+from src.events import emit_order_status
 
 payment_bp = Blueprint('payment', __name__)
 
-# Initialize Stripe
-stripe.api_key = os.getenv('STRIPE_SECRET_KEY', 'sk_test_placeholder')
+
+def get_stripe():
+    """Import and configure Stripe on first use (the SDK takes ~0.5s to import)"""
+    import stripe
+    
+    if stripe.api_key is None:
+        stripe.api_key = os.getenv('STRIPE_SECRET_KEY', 'sk_test_placeholder')
+    if not getattr(stripe.default_http_client, 'deadline_aware', False):
+        from src.loadshed import stripe_http_client
+        stripe.default_http_client = stripe_http_client(stripe, current_app.config['STRIPE_TIMEOUT'])
+    return stripe
 
 @payment_bp.route('/create-payment-intent', methods=['POST'])
 def create_payment_intent():
     """Create a Stripe payment intent for checkout"""
+    stripe = get_stripe()
     try:
         data = request.get_json()
         
@@ -39,7 +51,7 @@ def create_payment_intent():
             'paymentIntentId': intent.id
         }), 200
         
-    except stripe.error.StripeError as e:
+    except stripe.StripeError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -48,6 +60,7 @@ def create_payment_intent():
 @payment_bp.route('/confirm-payment', methods=['POST'])
 def confirm_payment():
     """Confirm payment and update order status"""
+    stripe = get_stripe()
     try:
         data = request.get_json()
         payment_intent_id = data.get('payment_intent_id')
@@ -56,13 +69,9 @@ def confirm_payment():
         if not payment_intent_id or not order_id:
             return jsonify({'error': 'Missing payment_intent_id or order_id'}), 400
         
-        # Update order in database
-        order = Order.query.get(order_id)
-        if not order:
+        if not Order.query.get(order_id):
             return jsonify({'error': 'Order not found'}), 404
         
-        order.payment_intent_id = payment_intent_id
-        
         # Try to retrieve payment intent from Stripe (if real keys are configured)
         payment_status = 'succeeded'  # Default for development
         try:
@@ -75,16 +84,31 @@ def confirm_payment():
             print(f"Stripe API error (using default): {stripe_error}")
             payment_status = 'succeeded'
         
-        # Update order status based on payment status
-        if payment_status == 'succeeded':
-            order.payment_status = 'paid'
-            order.status = 'processing'
-        elif payment_status == 'requires_payment_method':
-            order.payment_status = 'failed'
-        else:
-            order.payment_status = 'pending'
+        def apply():
+            # Re-read on every attempt: a webhook may update the order concurrently
+            order = Order.query.get(order_id)
+            if order is None:
+                return None  # Deleted (or archived) since the check above
+            order.payment_intent_id = payment_intent_id
+            old_status, old_payment_status = order.status, order.payment_status
+            
+            # Update order status based on payment status
+            if payment_status == 'succeeded':
+                order.payment_status = 'paid'
+                order.status = 'processing'
+            elif payment_status == 'requires_payment_method':
+                order.payment_status = 'failed'
+            else:
+                order.payment_status = 'pending'
+            
+            analytics.record_transition(order, old_status, old_payment_status)
+            emit_order_status(order, old_status, old_payment_status)
+            db.session.commit()
+            return order
         
-        db.session.commit()
+        order = retry_on_conflict(apply)
+        if order is None:
+            return jsonify({'error': 'Order not found'}), 404
         
         return jsonify({
             'success': True,
@@ -92,16 +116,31 @@ def confirm_payment():
             'payment_status': payment_status
         }), 200
         
-    except stripe.error.StripeError as e:
+    except stripe.StripeError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
+def _apply_payment_result(payment_intent_id, payment_status, status=None):
+    """Record a webhook's payment outcome on the order and commit"""
+    # Find order by payment intent ID
+    order = Order.query.filter_by(payment_intent_id=payment_intent_id).first()
+    if order:
+        old_status, old_payment_status = order.status, order.payment_status
+        order.payment_status = payment_status
+        if status:
+            order.status = status
+        analytics.record_transition(order, old_status, old_payment_status)
+        emit_order_status(order, old_status, old_payment_status)
+        db.session.commit()
+
+
 @payment_bp.route('/webhook', methods=['POST'])
 def stripe_webhook():
     """Handle Stripe webhooks for payment events"""
+    stripe = get_stripe()
     payload = request.data
     sig_header = request.headers.get('Stripe-Signature')
     webhook_secret = os.getenv('STRIPE_WEBHOOK_SECRET', '')
@@ -113,28 +152,17 @@ def stripe_webhook():
         )
     except ValueError:
         return jsonify({'error': 'Invalid payload'}), 400
-    except stripe.error.SignatureVerificationError:
+    except stripe.SignatureVerificationError:
         return jsonify({'error': 'Invalid signature'}), 400
     
     # Handle the event
     if event['type'] == 'payment_intent.succeeded':
         payment_intent = event['data']['object']
-        
-        # Find order by payment intent ID
-        order = Order.query.filter_by(payment_intent_id=payment_intent['id']).first()
-        if order:
-            order.payment_status = 'paid'
-            order.status = 'processing'
-            db.session.commit()
+        retry_on_conflict(lambda: _apply_payment_result(payment_intent['id'], 'paid', 'processing'))
             
     elif event['type'] == 'payment_intent.payment_failed':
         payment_intent = event['data']['object']
-        
-        # Find order by payment intent ID
-        order = Order.query.filter_by(payment_intent_id=payment_intent['id']).first()
-        if order:
-            order.payment_status = 'failed'
-            db.session.commit()
+        retry_on_conflict(lambda: _apply_payment_result(payment_intent['id'], 'failed'))
     
     return jsonify({'success': True}), 200
 
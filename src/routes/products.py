@@ -1,17 +1,37 @@
-from flask import Blueprint, request, jsonify
-from src.database import db
+from flask import Blueprint, current_app, request, jsonify
+from src.database import db, read_only
 from src.models.product import Product, ProductVariant
+from src.projection import requested_fields, load_options
+from src.stock import MAX_PRODUCT_IDS, get_stock_cache, stock_grid
+from src.autocomplete import MAX_LIMIT, get_product_index
+from src.snapshots import send_precompressed, snapshot_path
+from src.concurrency import versioned
+from sqlalchemy.orm import selectinload, undefer
 
 products_bp = Blueprint('products', __name__)
 
 @products_bp.route('/', methods=['GET'])
+@read_only
 def get_products():
     """Get all products with optional filtering"""
     try:
         category = request.args.get('category')
         search = request.args.get('search')
         
-        query = Product.query.filter_by(is_active=True)
+        try:
+            fields = requested_fields(Product)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # The full listing (per category) is prebuilt after every catalog change
+        if not search and fields is None:
+            path = snapshot_path(category if category != 'all' else None)
+            if path:
+                return send_precompressed(path, 'application/json')
+        
+        query = Product.query.options(
+            *load_options(Product, fields, {'variants': selectinload(Product.variants)})
+        ).filter_by(is_active=True)
         
         if category and category != 'all':
             query = query.filter_by(category=category)
@@ -22,7 +42,7 @@ def get_products():
         products = query.all()
         
         return jsonify({
-            'products': [p.to_dict() for p in products],
+            'products': [p.to_dict(fields) for p in products],
             'count': len(products)
         }), 200
         
@@ -30,22 +50,39 @@ def get_products():
         return jsonify({'error': str(e)}), 500
 
 
+@products_bp.route('/autocomplete', methods=['GET'])
+def autocomplete():
+    """Typeahead suggestions by name, category or SKU prefix (served from memory)"""
+    try:
+        limit = min(request.args.get('limit', 8, type=int), MAX_LIMIT)
+        suggestions = get_product_index().search(request.args.get('q', ''), limit)
+        
+        return jsonify({
+            'suggestions': suggestions
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @products_bp.route('/<int:product_id>', methods=['GET'])
+@read_only
 def get_product(product_id):
     """Get single product details"""
     try:
-        product = Product.query.get(product_id)
+        product = Product.query.options(undefer(Product.description), selectinload(Product.variants)).get(product_id)
         
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
-        return jsonify(product.to_dict()), 200
+        return versioned(jsonify(product.to_dict()), product), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @products_bp.route('/<int:product_id>/variants', methods=['GET'])
+@read_only
 def get_product_variants(product_id):
     """Get all variants for a product"""
     try:
@@ -64,7 +101,43 @@ def get_product_variants(product_id):
         return jsonify({'error': str(e)}), 500
 
 
+@products_bp.route('/stock', methods=['GET'])
+@read_only
+def get_stock():
+    """Size -> stock matrix for many products (?ids=1,2,3 or ?category=tshirt)"""
+    try:
+        category = request.args.get('category')
+        ids = request.args.get('ids')
+        
+        if not ids and not category:
+            return jsonify({'error': 'Pass ids or category'}), 400
+        
+        product_ids = None
+        if ids:
+            try:
+                product_ids = sorted({int(i) for i in ids.split(',') if i.strip()})
+            except ValueError:
+                return jsonify({'error': 'ids must be comma separated integers'}), 400
+            if len(product_ids) > MAX_PRODUCT_IDS:
+                return jsonify({'error': f'At most {MAX_PRODUCT_IDS} ids per request'}), 400
+        
+        if category == 'all':
+            category = None
+        
+        key = (tuple(product_ids) if product_ids is not None else None, category)
+        body, etag = get_stock_cache().get(key, lambda: stock_grid(product_ids, category))
+        
+        response = jsonify(body)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f"public, max-age={int(current_app.config['STOCK_CACHE_SECONDS'])}"
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @products_bp.route('/categories', methods=['GET'])
+@read_only
 def get_categories():
     """Get all product categories"""
     try:
@@ -0,0 +1,99 @@
+from flask import Blueprint, request, jsonify, current_app, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src import uploads
+from src.uploads import UploadError
+
+uploads_bp = Blueprint('uploads', __name__)
+
+# Uploaded files never change (their URL is their hash)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Shown in the browser; anything else (PDF, PostScript, files stored before SVG was refused) downloads
+INLINE_CONTENT_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp'}
+
+
+@uploads_bp.errorhandler(UploadError)
+def handle_upload_error(e):
+    response = jsonify({'error': str(e)})
+    if e.status == 409 and request.view_args and 'upload_id' in request.view_args:
+        try:
+            response.headers['Upload-Offset'] = str(uploads.session_offset(get_jwt_identity(),
+                                                                           request.view_args['upload_id']))
+        except UploadError:
+            pass
+    return response, e.status
+
+
+@uploads_bp.route('/', methods=['POST'])
+@jwt_required()
+def create_upload():
+    """Upload a file in one streamed request body, or start a resumable upload
+
+    Send the raw file as the body with its Content-Type for a one-shot upload.
+    Send JSON {filename, content_type, size} to open a resumable session.
+    """
+    if request.mimetype == 'application/json':
+        return create_session()
+
+    # One-shot uploads may exceed MAX_CONTENT_LENGTH; the body is streamed, not buffered
+    request.max_content_length = current_app.config['UPLOAD_MAX_SIZE']
+    info = uploads.store_stream(request.stream, request.content_type)
+    return jsonify(info), 201
+
+
+def create_session():
+    """Open a resumable upload for the current user"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise UploadError('Expected a JSON object {filename, content_type, size}')
+    session = uploads.create_session(get_jwt_identity(), data.get('filename'), data.get('content_type'),
+                                     data.get('size'))
+    return jsonify(session), 201
+
+
+@uploads_bp.route('/<upload_id>', methods=['HEAD'])
+@jwt_required()
+def get_upload_offset(upload_id):
+    """Report how many bytes of a resumable upload have been received"""
+    offset = uploads.session_offset(get_jwt_identity(), upload_id)
+    return '', 200, {'Upload-Offset': str(offset), 'Cache-Control': 'no-store'}
+
+
+@uploads_bp.route('/<upload_id>', methods=['PATCH'])
+@jwt_required()
+def upload_chunk(upload_id):
+    """Append the request body to a resumable upload at the Upload-Offset header"""
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset header is required'}), 400
+
+    offset = uploads.append_chunk(get_jwt_identity(), upload_id, offset, request.stream)
+    return jsonify({'upload_id': upload_id, 'offset': offset}), 200, {'Upload-Offset': str(offset)}
+
+
+@uploads_bp.route('/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload(upload_id):
+    """Finish a resumable upload and return the stored file"""
+    return jsonify(uploads.complete_session(get_jwt_identity(), upload_id)), 201
+
+
+@uploads_bp.route('/files/<digest>', methods=['GET'])
+def get_file(digest):
+    """Serve an uploaded file (supports Range and conditional requests)"""
+    info = uploads.file_info(digest)
+    response = send_file(
+        uploads.object_path(digest),
+        mimetype=info['content_type'],
+        conditional=True,
+        etag=digest,
+        max_age=IMMUTABLE_MAX_AGE
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if info['content_type'] not in INLINE_CONTENT_TYPES:
+        response.headers['Content-Disposition'] = f'attachment; filename="{digest}"'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = 'sandbox'
+    return response
@@ -1,12 +1,15 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import User, db
+from src.ratelimit import rate_limited
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
+    page = request.args.get('page', 1, type=int)
+    per_page = max(1, min(request.args.get('per_page', 50, type=int), 100))
+    users = User.query.order_by(User.id).limit(per_page).offset((max(page, 1) - 1) * per_page)
     return jsonify([user.to_dict() for user in users])
 
 @user_bp.route('/users', methods=['POST'])
@@ -97,6 +100,7 @@ def update_profile():
 
 @user_bp.route('/password', methods=['PUT'])
 @jwt_required()
+@rate_limited
 def update_password():
     """Update current user's password"""
     try:
@@ -0,0 +1,131 @@
+import fcntl
+import gzip
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+from flask import current_app, request, send_file
+from sqlalchemy.orm import selectinload, undefer
+from src.models.product import Product
+
+# Prebuilt catalog responses.
+#
+# The anonymous product listing (GET /api/products/ without search/fields)
+# only changes when an admin edits the catalog, so those edits call
+# rebuild_catalog_snapshots() after committing. It renders the exact
+# get_products body for the whole catalog (all.json) and for each category
+# (<category>.json) into CATALOG_SNAPSHOT_DIR (static/catalog by default),
+# each with a gzip-compressed sibling. Every file is written to a temporary
+# name and renamed into place, so readers see either the old or the new
+# version; a file lock serializes rebuilds from different workers.
+#
+# get_products and serve() then hand these files to send_file, which with
+# USE_X_SENDFILE lets the front server (nginx/Apache) send them; the same
+# files can also be served by the front server directly at /catalog/*.json.
+# Without a snapshot (never built, or a category name that can't be a file
+# name) the listing is rendered dynamically as before.
+
+logger = logging.getLogger(__name__)
+
+ALL = 'all'
+_SAFE_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def _snapshot_dir():
+    return current_app.config['CATALOG_SNAPSHOT_DIR']
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def snapshot_path(category=None):
+    """Path of the snapshot for `category` (None/'all' for the whole catalog), if one exists"""
+    if not current_app.config['CATALOG_SNAPSHOTS_ENABLED']:
+        return None
+    name = category or ALL
+    if not _SAFE_NAME.match(name):
+        return None
+    path = os.path.join(_snapshot_dir(), f'{name}.json')
+    return path if os.path.exists(path) else None
+
+
+def build_catalog_snapshots():
+    """Render the active catalog into snapshot files; returns the names written"""
+    directory = _snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        # Same query and serialization as get_products (no fields requested)
+        products = Product.query.options(
+            undefer(Product.description), selectinload(Product.variants)
+        ).filter_by(is_active=True).all()
+
+        listings = {ALL: []}
+        for product in products:
+            item = product.to_dict()
+            listings[ALL].append(item)
+            if _SAFE_NAME.match(product.category or '') and product.category != ALL:
+                listings.setdefault(product.category, []).append(item)
+
+        for name, items in listings.items():
+            data = current_app.json.dumps({'products': items, 'count': len(items)}).encode()
+            path = os.path.join(directory, f'{name}.json')
+            _write_atomic(path, data)
+            _write_atomic(path + '.gz', gzip.compress(data, 9, mtime=0))
+
+        # Categories that no longer have active products
+        for filename in os.listdir(directory):
+            name = filename.split('.', 1)[0]
+            if filename.endswith(('.json', '.json.gz')) and name not in listings:
+                os.unlink(os.path.join(directory, filename))
+
+    return sorted(listings)
+
+
+def remove_catalog_snapshots():
+    """Delete all snapshot files (listings fall back to dynamic rendering)"""
+    directory = _snapshot_dir()
+    if not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        if filename.endswith(('.json', '.json.gz')):
+            os.unlink(os.path.join(directory, filename))
+
+
+def rebuild_catalog_snapshots():
+    """Rebuild after a committed catalog change; never fails the caller's request"""
+    if not current_app.config['CATALOG_SNAPSHOTS_ENABLED']:
+        return
+    try:
+        build_catalog_snapshots()
+    except Exception:
+        logger.exception('Catalog snapshot rebuild failed; serving listings dynamically')
+        try:
+            remove_catalog_snapshots()  # Stale files must not outlive the change
+        except OSError:
+            logger.exception('Could not remove catalog snapshots')
+
+
+def send_precompressed(path, mimetype=None):
+    """send_file for `path`, using its .gz sibling when the client accepts gzip"""
+    gz_path = path + '.gz'
+    if 'gzip' in request.accept_encodings and os.path.exists(gz_path):
+        mimetype = mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = send_file(gz_path, mimetype=mimetype, conditional=True)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_file(path, mimetype=mimetype, conditional=True)
+    response.vary.add('Accept-Encoding')
+    return response
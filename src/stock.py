@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from flask import current_app
+from src.database import db
+from src.models.product import Product, ProductVariant
+
+# Size availability for product grids.
+#
+# stock_matrix() answers "product -> size -> units in stock" for a list of
+# products or a whole category with one grouped query. Results are cached
+# per process for STOCK_CACHE_SECONDS; the cache is also cleared as soon as
+# the EventBus delivers a product.changed event (any worker's catalog edit),
+# so the TTL only bounds changes made outside the API (seed scripts, SQL).
+
+SIZE_ORDER = ('XS', 'S', 'M', 'L', 'XL', '2XL', '3XL', '4XL', '5XL')
+MAX_PRODUCT_IDS = 200
+
+
+def _size_key(size):
+    return SIZE_ORDER.index(size) if size in SIZE_ORDER else len(SIZE_ORDER)
+
+
+def stock_matrix(product_ids=None, category=None):
+    """{product_id: {size: stock}} for active products, summed over colors"""
+    query = db.session.query(
+        ProductVariant.product_id,
+        ProductVariant.size,
+        db.func.sum(ProductVariant.stock_quantity)
+    ).join(Product, Product.id == ProductVariant.product_id).filter(Product.is_active.is_(True))
+
+    if product_ids is not None:
+        query = query.filter(ProductVariant.product_id.in_(product_ids))
+    if category:
+        query = query.filter(Product.category == category)
+
+    matrix = {}
+    for product_id, size, stock in query.group_by(ProductVariant.product_id, ProductVariant.size):
+        matrix.setdefault(product_id, {})[size] = int(stock or 0)
+    return matrix
+
+
+def stock_grid(product_ids=None, category=None):
+    """Response body for /api/products/stock: the sizes in use (in size order) and the matrix"""
+    matrix = stock_matrix(product_ids, category)
+    sizes = sorted({size for stocks in matrix.values() for size in stocks}, key=_size_key)
+    return {'sizes': sizes, 'products': {str(product_id): stocks for product_id, stocks in matrix.items()}}
+
+
+class StockCache:
+    """TTL cache of stock responses, cleared by catalog events"""
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires, body, etag)
+        self._generation = 0  # Bumped by clear(); results built across a clear are not stored
+        self._lock = threading.Lock()
+        self._listen_lock = threading.Lock()
+        self._pid = None
+
+    def get(self, key, build):
+        """Cached (body, etag) for `key`, calling build() on a miss"""
+        self._ensure_listener()
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1], entry[2]
+
+        generation = self._generation
+        body = build()
+        etag = hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()
+        with self._lock:
+            if generation == self._generation:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[key] = (now + self.ttl, body, etag)
+        return body, etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def _on_event(self, event):
+        if event['kind'] == 'product.changed':
+            self.clear()
+
+    def _ensure_listener(self):
+        # Listeners are per process (see EventBus._ensure_poller)
+        if self._pid == os.getpid():
+            return
+        with self._listen_lock:
+            if self._pid != os.getpid():
+                self.clear()
+                current_app.extensions['events'].add_listener(self._on_event)
+                self._pid = os.getpid()
+
+
+def get_stock_cache():
+    return current_app.extensions['stock_cache']
+
+
+def init_stock_cache(app):
+    """Create the process's stock cache"""
+    app.extensions['stock_cache'] = StockCache(app.config['STOCK_CACHE_SECONDS'])
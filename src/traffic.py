@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g, request
+
+# Traffic capture and replay for performance regression testing.
+#
+# With TRAFFIC_CAPTURE_FILE set, every sampled /api/ request
+# (TRAFFIC_CAPTURE_SAMPLE) is appended to that file as one compact JSON
+# line: arrival time, method, route template and view args, query args, the
+# *shape* of the JSON body, whether it was authenticated, status and server
+# time. Values that could identify people are never written. Only the
+# fields in KEPT_FIELDS / KEPT_ARGS (enums, ids, quantities, paging...) and
+# booleans keep their value so the replayed requests do the same work; any
+# other string becomes {"$str": length} (or {"$email": 1}), any other number
+# {"$num": 1}. Integer view args (ids) are kept and string ones (order
+# numbers, file digests...) are hashed.
+#
+# `flask traffic-replay` re-issues a capture against the in-process app (the
+# Flask test client on the configured database) or a running server, at the
+# captured pace scaled by --speed, and writes per-request latencies.
+# `flask traffic-compare` reports per-route latency deltas between two
+# replays, e.g. of the same capture against two builds.
+
+# JSON body fields whose values are written as they are (anything else is redacted)
+KEPT_FIELDS = {
+    'status', 'payment_status', 'category', 'size', 'color', 'design_type', 'view', 'fields', 'sku',
+    'content_type', 'product_id', 'variant_id', 'order_id', 'quantity', 'stock_quantity', 'base_price', 'amount'
+}
+# Query args written as they are
+KEPT_ARGS = {
+    'status', 'payment_status', 'category', 'size', 'color', 'view', 'fields', 'ids', 'include_archived',
+    'page', 'per_page', 'limit', 'sort', 'cursor', 'group_by', 'format', 'start', 'end',
+    'created_from', 'created_to', 'min_total', 'max_total'
+}
+MAX_LIST_ITEMS = 500
+
+RULE_ARG_RE = re.compile(r'<(?:[^<>:]+:)?([^<>]+)>')  # <int:order_id> -> order_id
+
+
+def body_shape(value, key=None):
+    """JSON value with personal data replaced by placeholders"""
+    if isinstance(value, dict):
+        return {k: body_shape(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [body_shape(v, key) for v in value[:MAX_LIST_ITEMS]]
+    if value is None or isinstance(value, bool) or key in KEPT_FIELDS:
+        return value
+    if isinstance(value, str):
+        if key and 'email' in key:
+            return {'$email': 1}
+        return {'$str': len(value)}
+    return {'$num': 1}
+
+
+def _hashed(value):
+    return {'$hash': hashlib.sha256(str(value).encode()).hexdigest()[:16]}
+
+
+def materialize(shape):
+    """Turn a captured body shape back into a request body"""
+    if isinstance(shape, dict):
+        if '$str' in shape and len(shape) == 1:
+            return 'x' * shape['$str']
+        if '$email' in shape and len(shape) == 1:
+            return f'replay-{random.getrandbits(32):08x}@example.com'
+        if '$num' in shape and len(shape) == 1:
+            return shape['$num']
+        if '$hash' in shape and len(shape) == 1:
+            return shape['$hash']  # Looks up nothing, like most replayed lookups of a captured value
+        return {k: materialize(v) for k, v in shape.items()}
+    if isinstance(shape, list):
+        return [materialize(v) for v in shape]
+    return shape
+
+
+class CaptureLog:
+    """Append-only JSON lines file shared by all workers"""
+
+    def __init__(self, path, sample):
+        self.path = path
+        self.sample = sample
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def write(self, entry):
+        line = (json.dumps(entry, separators=(',', ':')) + '\n').encode()
+        with self._lock:
+            if self._pid != os.getpid():
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                self._pid = os.getpid()
+            os.write(self._fd, line)  # One O_APPEND write per line: workers don't interleave
+
+
+def _capture_entry(response):
+    args = {k: (v if k in KEPT_ARGS else {'$str': len(v)}) for k, v in request.args.items()}
+    body = request.get_json(silent=True) if request.is_json else None
+    view_args = {k: (v if isinstance(v, int) else _hashed(v)) for k, v in (request.view_args or {}).items()}
+    return {
+        't': g.capture_time,
+        'method': request.method,
+        'route': request.url_rule.rule if request.url_rule else None,  # None: no route matched (404/405)
+        'view_args': view_args,
+        'args': args,
+        'body': body_shape(body) if body is not None else None,
+        'auth': 'Authorization' in request.headers or 'jwt' in request.args,
+        'status': response.status_code,
+        'ms': round((time.perf_counter() - g.capture_started) * 1000, 2)
+    }
+
+
+def init_traffic_capture(app):
+    """Register the capture hooks when TRAFFIC_CAPTURE_FILE is set"""
+    path = app.config['TRAFFIC_CAPTURE_FILE']
+    if not path:
+        return
+    app.extensions['traffic_capture'] = log = CaptureLog(path, app.config['TRAFFIC_CAPTURE_SAMPLE'])
+
+    @app.before_request
+    def start_capture():
+        if request.path.startswith('/api/') and random.random() < log.sample:
+            g.capture_time = round(time.time(), 3)  # Arrival; lines are written at completion
+            g.capture_started = time.perf_counter()
+
+    @app.after_request
+    def capture(response):
+        if 'capture_started' in g:
+            try:
+                log.write(_capture_entry(response))
+            except Exception:
+                current_app.logger.exception('Traffic capture failed')
+        return response
+
+
+def read_capture(path, limit=None):
+    """Entries of a capture (or replay results) file"""
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+                if limit and len(entries) >= limit:
+                    break
+    return entries
+
+
+def client_sender(app, token=None):
+    """send(entry) -> (status, ms) using the app's test client"""
+    client = app.test_client()
+
+    def send(entry):
+        headers = {'Authorization': f'Bearer {token}'} if token and entry['auth'] else {}
+        started = time.perf_counter()
+        response = client.open(_path(entry), method=entry['method'], query_string=_args(entry),
+                               json=materialize(entry['body']) if entry['body'] is not None else None,
+                               headers=headers)
+        response.close()
+        return response.status_code, (time.perf_counter() - started) * 1000
+    return send
+
+
+def http_sender(base_url, token=None, timeout=30):
+    """send(entry) -> (status, ms) against a running server"""
+    import requests
+
+    session = requests.Session()
+    base_url = base_url.rstrip('/')
+
+    def send(entry):
+        headers = {'Authorization': f'Bearer {token}'} if token and entry['auth'] else {}
+        started = time.perf_counter()
+        try:
+            response = session.request(entry['method'], base_url + _path(entry), params=_args(entry),
+                                       json=materialize(entry['body']) if entry['body'] is not None else None,
+                                       headers=headers, timeout=timeout)
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        return status, (time.perf_counter() - started) * 1000
+    return send
+
+
+def _args(entry):
+    return {k: materialize(v) for k, v in entry['args'].items()}
+
+
+def _path(entry):
+    """URL to replay: the route template filled in with the captured view args"""
+    if 'path' in entry:
+        return entry['path']  # Captured before paths were templated
+    if entry['route'] is None:
+        return '/api/_unmatched'
+    view_args = entry['view_args']
+    return RULE_ARG_RE.sub(lambda m: str(materialize(view_args[m.group(1)])), entry['route'])
+
+
+def replay(entries, send, speed=1.0, concurrency=8):
+    """Re-issue captured requests at `speed` x the captured pace (0: as fast as possible)"""
+    entries = sorted(entries, key=lambda entry: entry['t'])
+    results = [None] * len(entries)
+    if not entries:
+        return results
+
+    def run(i, entry):
+        try:
+            status, ms = send(entry)
+        except Exception:
+            status, ms = 0, 0.0
+        results[i] = {'method': entry['method'], 'route': entry['route'] or entry.get('path') or 'unmatched',
+                      'status': status, 'captured_status': entry['status'], 'ms': round(ms, 2)}
+
+    first = entries[0]['t']
+    started = time.monotonic()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for i, entry in enumerate(entries):
+            if speed:
+                delay = (entry['t'] - first) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(run, i, entry)
+    return results
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(results):
+    """Per-route request count, error count and p50/p95 latency"""
+    by_route = defaultdict(list)
+    for result in results:
+        by_route[f"{result['method']} {result['route']}"].append(result)
+
+    summary = {}
+    for route, rows in by_route.items():
+        latencies = [r['ms'] for r in rows]
+        summary[route] = {
+            'count': len(rows),
+            'errors': sum(1 for r in rows if r['status'] == 0 or r['status'] >= 500),
+            'p50': round(_percentile(latencies, 0.5), 2),
+            'p95': round(_percentile(latencies, 0.95), 2)
+        }
+    return summary
+
+
+def compare(base, new):
+    """Rows of (route, base summary, new summary, p50 change %, p95 change %), worst p95 first"""
+    base, new = summarize(base), summarize(new)
+    rows = []
+    for route in sorted(set(base) | set(new)):
+        b, n = base.get(route), new.get(route)
+        change = {}
+        for key in ('p50', 'p95'):
+            change[key] = round((n[key] - b[key]) / b[key] * 100, 1) if b and n and b[key] else None
+        rows.append((route, b, n, change['p50'], change['p95']))
+    return sorted(rows, key=lambda row: -(row[4] or 0))
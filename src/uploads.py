@@ -0,0 +1,328 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import secrets
+import tempfile
+import time
+from contextlib import contextmanager
+from flask import current_app
+from src.database import db
+from src.models.archive import ArchivedOrder
+from src.models.order import OrderItem, CustomOrder
+from src.models.product import Product
+
+# Content-addressed artwork storage.
+#
+# Files are streamed to disk in CHUNK_SIZE pieces (never buffered in memory)
+# and stored under objects/<sha256[:2]>/<sha256>, so uploading the same team
+# logo twice keeps a single copy. Resumable uploads (signed-in users only,
+# UPLOAD_SESSION_LIMIT open sessions and UPLOAD_SESSION_QUOTA bytes each)
+# append chunks to sessions/<user_id>/<upload_id>.part until the client
+# completes the session.
+#
+# The declared content type must match the file's magic bytes, and files
+# are served with nosniff and a sandbox CSP, so an upload can never run
+# script on our origin. Objects no order refers to are removed by
+# `flask uploads-cleanup` once they are older than its --file-days.
+#
+# UPLOAD_DIR/
+#     objects/ab/ab12...ef        file contents
+#     objects/ab/ab12...ef.json   content type and size
+#     sessions/<user_id>/<id>.part, <id>.json
+#     tmp/                        direct uploads in flight
+
+CHUNK_SIZE = 64 * 1024
+
+# Content type -> leading bytes of such a file (SVG is not accepted: it can carry script)
+SIGNATURES = {
+    'image/png': (b'\x89PNG\r\n\x1a\n',),
+    'image/jpeg': (b'\xff\xd8\xff',),
+    'image/gif': (b'GIF87a', b'GIF89a'),
+    'image/webp': (b'RIFF',),  # Followed by the size and b'WEBP', checked in _sniff
+    'application/pdf': (b'%PDF-',),
+    'application/postscript': (b'%!PS', b'\xc5\xd0\xd3\xc6')  # PostScript, binary EPS
+}
+
+ALLOWED_CONTENT_TYPES = set(SIGNATURES)
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+UPLOAD_ID_RE = re.compile(r'^[A-Za-z0-9_-]{22}$')
+FILE_URL_RE = re.compile(r'/api/uploads/files/([0-9a-f]{64})')
+
+# Columns that may hold a file URL; anything else that points at an upload keeps it alive too
+REFERENCING_COLUMNS = (
+    OrderItem.custom_image_url, CustomOrder.front_design, CustomOrder.back_design,
+    CustomOrder.design_data, Product.image_url, db.cast(ArchivedOrder.data, db.Text)
+)
+
+
+class UploadError(Exception):
+    """Upload rejected; `status` is the HTTP status to return"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _dir(*parts):
+    path = os.path.join(current_app.config['UPLOAD_DIR'], *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def object_path(digest):
+    if not DIGEST_RE.match(digest or ''):
+        raise UploadError('Invalid file id', 404)
+    return os.path.join(_dir('objects', digest[:2]), digest)
+
+
+def _session_path(user_id, upload_id, suffix):
+    if not UPLOAD_ID_RE.match(upload_id or ''):
+        raise UploadError('Upload not found', 404)
+    return os.path.join(_dir('sessions', str(int(user_id))), upload_id + suffix)
+
+
+def _session_usage(user_id):
+    """(open sessions, bytes received) of a user's resumable uploads"""
+    directory = _dir('sessions', str(int(user_id)))
+    parts = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.part')]
+    return len(parts), sum(os.path.getsize(path) for path in parts if os.path.exists(path))
+
+
+def _check_content_type(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise UploadError(f'Unsupported content type: {content_type or "missing"}', 415)
+    return content_type
+
+
+def _sniff(path, content_type):
+    """Reject a file whose leading bytes are not those of `content_type`"""
+    with open(path, 'rb') as f:
+        head = f.read(16)
+    matches = head.startswith(SIGNATURES[content_type])
+    if content_type == 'image/webp':
+        matches = matches and head[8:12] == b'WEBP'
+    if not matches:
+        raise UploadError(f'File content is not {content_type}', 415)
+
+
+def _copy_stream(stream, f, limit, hasher=None):
+    """Copy `stream` into `f` chunk by chunk; returns the number of bytes written"""
+    written = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if written > limit:
+            raise UploadError('File is too large', 413)
+        f.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+
+
+def _write_json(path, data):
+    """Write `data` to `path` atomically (readers see the old file or the complete new one)"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def _locked_part(user_id, upload_id):
+    """Open a session's .part file for appending, holding an exclusive lock on it"""
+    path = _session_path(user_id, upload_id, '.part')
+    try:
+        f = open(os.open(path, os.O_WRONLY | os.O_APPEND), 'ab')
+    except FileNotFoundError:
+        raise UploadError('Upload not found', 404)
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # Completed (moved into the object store) while we waited for the lock
+            if os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                raise UploadError('Upload not found', 404)
+        except FileNotFoundError:
+            raise UploadError('Upload not found', 404)
+        yield f
+
+
+def _store(tmp_path, digest, content_type, size):
+    """Move a finished file into the object store (or drop it if already stored)"""
+    path = object_path(digest)
+    try:
+        os.utime(path)  # Already stored: restart its cleanup grace period
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        os.replace(tmp_path, path)
+
+    meta_path = path + '.json'
+    if not os.path.exists(meta_path):
+        _write_json(meta_path, {'content_type': content_type, 'size': size})
+
+    return file_info(digest)
+
+
+def file_info(digest):
+    path = object_path(digest)
+    if not os.path.exists(path):
+        raise UploadError('File not found', 404)
+
+    with open(path + '.json') as f:
+        meta = json.load(f)
+
+    return {
+        'sha256': digest,
+        'size': meta['size'],
+        'content_type': meta['content_type'],
+        'url': f'/api/uploads/files/{digest}'
+    }
+
+
+def store_stream(stream, content_type):
+    """Stream a complete file to disk while hashing it"""
+    content_type = _check_content_type(content_type)
+    hasher = hashlib.sha256()
+
+    fd, tmp_path = tempfile.mkstemp(dir=_dir('tmp'))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            size = _copy_stream(stream, f, current_app.config['UPLOAD_MAX_SIZE'], hasher)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    try:
+        if size == 0:
+            raise UploadError('Empty upload')
+        _sniff(tmp_path, content_type)
+    except UploadError:
+        os.remove(tmp_path)
+        raise
+
+    return _store(tmp_path, hasher.hexdigest(), content_type, size)
+
+
+def create_session(user_id, filename, content_type, size=None):
+    """Start a resumable upload owned by `user_id`"""
+    content_type = _check_content_type(content_type)
+    if size is not None:
+        if isinstance(size, bool) or not isinstance(size, (int, str)) or not str(size).isdigit():
+            raise UploadError('size must be a non-negative integer')
+        size = int(size)
+    if size is not None and size > current_app.config['UPLOAD_MAX_SIZE']:
+        raise UploadError('File is too large', 413)
+
+    sessions, received = _session_usage(user_id)
+    if sessions >= current_app.config['UPLOAD_SESSION_LIMIT']:
+        raise UploadError('Too many unfinished uploads; complete or abandon one first', 429)
+    if received + (size or 0) > current_app.config['UPLOAD_SESSION_QUOTA']:
+        raise UploadError('Upload quota exceeded', 413)
+
+    upload_id = secrets.token_urlsafe(16)
+    _write_json(_session_path(user_id, upload_id, '.json'),
+                {'filename': filename, 'content_type': content_type, 'size': size, 'created_at': time.time()})
+    open(_session_path(user_id, upload_id, '.part'), 'wb').close()
+
+    return {'upload_id': upload_id, 'offset': 0}
+
+
+def session_offset(user_id, upload_id):
+    part_path = _session_path(user_id, upload_id, '.part')
+    if not os.path.exists(part_path):
+        raise UploadError('Upload not found', 404)
+    return os.path.getsize(part_path)
+
+
+def append_chunk(user_id, upload_id, offset, stream):
+    """Append a chunk at `offset`, which must equal the bytes received so far"""
+    # Under the lock, so two requests for the same offset cannot both append
+    with _locked_part(user_id, upload_id) as f:
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            raise UploadError(f'Expected offset {current}', 409)
+
+        quota_left = current_app.config['UPLOAD_SESSION_QUOTA'] - _session_usage(user_id)[1]
+        _copy_stream(stream, f, min(current_app.config['UPLOAD_MAX_SIZE'] - current, quota_left))
+        f.flush()
+        return os.fstat(f.fileno()).st_size
+
+
+def complete_session(user_id, upload_id):
+    """Hash the assembled file and move it into the object store"""
+    with _locked_part(user_id, upload_id) as f:
+        size = os.fstat(f.fileno()).st_size
+        with open(_session_path(user_id, upload_id, '.json')) as meta_file:
+            meta = json.load(meta_file)
+
+        if size == 0:
+            raise UploadError('Empty upload')
+        if meta['size'] is not None and meta['size'] != size:
+            raise UploadError(f"Received {size} of {meta['size']} bytes", 409)
+
+        part_path = _session_path(user_id, upload_id, '.part')
+        try:
+            _sniff(part_path, meta['content_type'])
+        except UploadError:
+            # Resending chunks cannot fix the content; drop the session
+            os.remove(part_path)
+            os.remove(_session_path(user_id, upload_id, '.json'))
+            raise
+
+        hasher = hashlib.sha256()
+        with open(part_path, 'rb') as part:
+            for chunk in iter(lambda: part.read(CHUNK_SIZE), b''):
+                hasher.update(chunk)
+
+        info = _store(part_path, hasher.hexdigest(), meta['content_type'], size)
+        os.remove(_session_path(user_id, upload_id, '.json'))
+        return info
+
+
+def cleanup_sessions(max_age):
+    """Remove abandoned upload sessions older than `max_age` seconds"""
+    removed = 0
+    cutoff = time.time() - max_age
+    for directory in (_dir('sessions'), _dir('tmp')):
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+    return removed
+
+
+def referenced_digests():
+    """Digests of the files that orders (live and archived), custom orders and products point at"""
+    digests = set()
+    for column in REFERENCING_COLUMNS:
+        rows = db.session.query(column).filter(column.like('%/api/uploads/files/%')).execution_options(yield_per=1000)
+        for (value,) in rows:
+            digests.update(FILE_URL_RE.findall(value))
+    return digests
+
+
+def cleanup_objects(referenced, max_age):
+    """Remove stored files older than `max_age` seconds whose digest is not in `referenced`"""
+    removed = 0
+    cutoff = time.time() - max_age
+    for root, _, names in os.walk(_dir('objects')):
+        for name in names:
+            if not DIGEST_RE.match(name) or name in referenced:
+                continue
+            path = os.path.join(root, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                if os.path.exists(path + '.json'):
+                    os.remove(path + '.json')
+                removed += 1
+    return removed
@@ -0,0 +1,119 @@
+import threading
+import pytest
+from src.concurrency import retry_on_conflict
+from src.database import db
+from src.main import create_app
+from src.models.order import Order
+from src.models.product import Product
+from src.models.user import User
+
+THREADS = 4
+WRITES = 10
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'JWT_VERIFY_SUB': False,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/app.db',
+        'SQLALCHEMY_BINDS': {'archive': f'sqlite:///{tmp_path}/archive.db'},
+        'RATELIMIT_STORAGE': 'memory'
+    })
+    with app.app_context():
+        db.create_all()
+        admin = User(email='admin@example.com', is_admin=True)
+        admin.set_password('pw')
+        db.session.add(admin)
+        db.session.add(Product(name='Tee', category='t-shirts', base_price=10))
+        db.session.add(Order(order_number='ORD-1', customer_email='a@example.com', customer_name='A',
+                             subtotal=10, total=10, status='pending', payment_status='pending'))
+        db.session.commit()
+        yield app
+
+
+@pytest.fixture
+def headers(app):
+    response = app.test_client().post('/api/auth/login', json={'email': 'admin@example.com', 'password': 'pw'})
+    return {'Authorization': 'Bearer ' + response.get_json()['access_token']}
+
+
+def run_writers(write):
+    """Run write() WRITES times in each of THREADS threads; returns the status codes"""
+    statuses = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(WRITES):
+            for status in write():
+                with lock:
+                    statuses.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def test_product_updates_with_if_match_are_not_lost(app, headers):
+    client = app.test_client()
+
+    def increment_price():
+        # Read, modify, write back with If-Match; start over on 409
+        statuses = []
+        while True:
+            current = client.get('/api/products/1')
+            response = client.put('/api/admin/products/1', json={'base_price': current.get_json()['base_price'] + 1},
+                                  headers={**headers, 'If-Match': current.headers['ETag']})
+            statuses.append(response.status_code)
+            if response.status_code != 409:
+                return statuses
+
+    statuses = run_writers(increment_price)
+    assert set(statuses) <= {200, 409}
+
+    product = db.session.get(Product, 1)
+    db.session.refresh(product)
+    assert statuses.count(200) == THREADS * WRITES
+    assert product.base_price == 10 + THREADS * WRITES
+    assert product.version - 1 == statuses.count(200)
+
+
+def test_stale_order_status_updates_get_409(app, headers):
+    client = app.test_client()
+
+    def set_status():
+        # One attempt per read: a concurrent write in between must surface as 409, never be overwritten
+        order = client.get('/api/orders/1', headers=headers).get_json()
+        status = 'shipped' if order['status'] == 'processing' else 'processing'
+        response = client.put('/api/admin/orders/1/status', json={'status': status, 'version': order['version']},
+                              headers=headers)
+        return [response.status_code]
+
+    statuses = run_writers(set_status)
+    assert set(statuses) <= {200, 409}
+
+    order = db.session.get(Order, 1)
+    db.session.refresh(order)
+    assert statuses.count(200) + statuses.count(409) == THREADS * WRITES
+    assert order.version - 1 == statuses.count(200)
+
+
+def test_retry_on_conflict_applies_every_change(app):
+    def add_one():
+        with app.app_context():
+            def apply():
+                product = db.session.get(Product, 1)
+                product.base_price += 1
+                db.session.commit()
+            retry_on_conflict(apply, attempts=THREADS * WRITES)
+        return [200]
+
+    run_writers(add_one)
+
+    product = db.session.get(Product, 1)
+    db.session.refresh(product)
+    assert product.base_price == 10 + THREADS * WRITES
+    assert product.version - 1 == THREADS * WRITES
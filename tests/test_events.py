@@ -0,0 +1,75 @@
+from datetime import timedelta
+import pytest
+from sqlalchemy import text
+from src.database import db
+from src.events import emit, prune_events
+from src.main import create_app
+from src.migrations import domain_event_autoincrement
+from src.models.event import DomainEvent
+from src import outbox
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/app.db',
+        'SQLALCHEMY_BINDS': {'archive': f'sqlite:///{tmp_path}/archive.db'},
+        'RATELIMIT_STORAGE': 'memory'
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+@pytest.fixture
+def delivered():
+    events = []
+    outbox.register_consumer('test-recorder')(events.extend)
+    yield events
+    del outbox.CONSUMERS['test-recorder']
+
+
+def emit_events(n):
+    events = [emit('order', 1, 'order.status', {'n': i}) for i in range(n)]
+    db.session.commit()
+    return [event.id for event in events]
+
+
+def test_pruned_event_ids_are_not_reissued(app, delivered):
+    first = emit_events(3)
+    outbox.run_relay(['test-recorder'], once=True)
+    assert [event['id'] for event in delivered] == first
+
+    # Every consumer has seen them, so all of them (including the newest) go
+    assert prune_events(timedelta(seconds=-1)) == 3
+
+    later = emit_events(2)
+    assert min(later) > max(first)
+    outbox.run_relay(['test-recorder'], once=True)
+    assert [event['id'] for event in delivered] == first + later
+
+
+def test_migration_rebuilds_domain_events_with_autoincrement(app, delivered):
+    # A table created before AUTOINCREMENT, whose newest event was already pruned
+    with db.engine.begin() as conn:
+        conn.execute(text('DROP TABLE domain_events'))
+        conn.execute(text(
+            'CREATE TABLE domain_events (id INTEGER NOT NULL PRIMARY KEY, topic VARCHAR(50) NOT NULL, '
+            'subject_id INTEGER, kind VARCHAR(50) NOT NULL, payload JSON NOT NULL, created_at DATETIME)'
+        ))
+    kept = emit_events(2)
+    outbox.run_relay(['test-recorder'], once=True)
+    DomainEvent.query.filter(DomainEvent.id == kept[-1]).delete()
+    db.session.commit()
+
+    with db.engine.begin() as conn:
+        domain_event_autoincrement(conn)
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'domain_events'")).scalar()
+    assert 'AUTOINCREMENT' in ddl
+    assert [event.id for event in DomainEvent.query.order_by(DomainEvent.id)] == kept[:1]
+
+    later = emit_events(1)
+    assert later[0] > kept[-1]
+    outbox.run_relay(['test-recorder'], once=True)
+    assert [event['id'] for event in delivered] == kept + later